@@ -1,16 +1,24 @@
 import streamlit as st
 from streamlit_gsheets import GSheetsConnection
-from groq import Groq
+from llm_client import GROQ_BASE_URL, LLMClient, LLMError
 import pandas as pd
-from datetime import datetime
+from prompt import compile_system_prompt
+from catalog_store import compact_catalog
+from retrieval import catalog_version
+from context import build_context
 import json
 
 # Set up the page
 st.set_page_config(page_title="HS Code Lookup System", layout="wide")
 
-# Initialize the Groq client using the API key from Streamlit secrets
+# Initialize the Groq client using the API key from Streamlit secrets, pooled across sessions
 groq_api_key = st.secrets["GROQ_API_KEY"]
-groq_client = Groq(api_key=groq_api_key)
+
+@st.cache_resource
+def get_groq_client():
+    return LLMClient(groq_api_key, base_url=GROQ_BASE_URL)
+
+groq_client = get_groq_client()
 
 # Google Sheets URL and worksheet ID from secrets
 spreadsheet_url = "https://docs.google.com/spreadsheets/d/1wgliY7XyZF-p4FUa1MiELUlQ3v1Tg6KDZzWuyW8AMo4/edit?gid=835818411"
@@ -19,17 +27,18 @@ worksheet_id = "835818411"
 # Set up connection to Google Sheets
 conn = st.experimental_connection("gsheets", type=GSheetsConnection)
 
-@st.cache_data
+# One compact, read-only copy of the sheet per process, shared by every session (cache_data copied it per caller)
+@st.cache_resource
 def get_data_from_gsheet(url, worksheet_id):
     try:
         st.write(f"Reading from Google Sheets URL: {url} and Worksheet ID: {worksheet_id}")
-        data = conn.read(spreadsheet=url, usecols=list(range(5)), worksheet=worksheet_id)
-        return data
+        data = compact_catalog(conn.read(spreadsheet=url, usecols=list(range(5)), worksheet=worksheet_id))
     except Exception as e:
         st.error(f"Error reading from Google Sheets: {e}")
-        return pd.DataFrame()  # Return an empty DataFrame in case of error
+        data = pd.DataFrame()  # Return an empty DataFrame in case of error
+    return data, catalog_version(data)
 
-data = get_data_from_gsheet(spreadsheet_url, worksheet_id)
+data, data_version = get_data_from_gsheet(spreadsheet_url, worksheet_id)
 
 # Construct the system message from the Google Sheets data
 system_message = """
@@ -43,19 +52,12 @@ We help you find the right HS Code for your products quickly and accurately. Sav
 Product List:
 """
 
-if not data.empty:
-    for index, row in data.iterrows():
-        system_message += f"""
-{row['Product Name']}
-* Definisi: {row['Definition']}
-* Bahan: {row['Material']}
-* HS Code: {row['HS Code']}
-* Specifications: {row['Specifications']}
-"""
+# Append the product list, compiled once per sheet version
+system_message = compile_system_prompt(system_message, data, "indonesian", data_version).text
 
 # Initialize chat history as a session state
 if "chat_history" not in st.session_state:
-    st.session_state.chat_history = [{"role": "system", "content": system_message}]
+    st.session_state.chat_history = []
 if "input_buffer" not in st.session_state:
     st.session_state.input_buffer = ""
 
@@ -76,14 +78,27 @@ def send_message():
         # Append user input to chat history
         st.session_state.chat_history.append({"role": "user", "content": st.session_state.input_buffer})
 
-        # Call Groq API with the chat history
-        response = groq_client.chat.completions.create(
-            model="llama3-70b-8192",
-            messages=st.session_state.chat_history,
-            temperature=0.3,
-            max_tokens=2000
-        )
-        chatbot_response = response.choices[0].message.content.strip()
+        # Send the system message once plus a token-budgeted view of the conversation.
+        # Stream the Groq reply into a temporary bubble; the chat history below shows it after the rerun
+        bubble = st.empty()
+        stream = groq_client.stream_chat({
+            "model": "llama3-70b-8192",
+            "messages": [{"role": "system", "content": system_message}] + build_context(st.session_state.chat_history),
+            "temperature": 0.3,
+            "max_tokens": 2000
+        }, timeout=60)
+        try:
+            partial = ""
+            for chunk in stream:
+                partial += chunk
+                bubble.markdown(f"<div style='border: 2px solid green; padding: 10px; margin: 10px 0; border-radius: 8px; width: 80%; float: left; clear: both;'>{partial}</div>", unsafe_allow_html=True)
+        except LLMError as e:
+            stream.error = {"message": str(e)}
+        bubble.empty()
+        if stream.error is not None:
+            chatbot_response = f"Error from Groq: {stream.error.get('message', stream.error)}"
+        else:
+            chatbot_response = stream.text.strip()
 
         # Append chatbot response to chat history
         st.session_state.chat_history.append({"role": "assistant", "content": chatbot_response})
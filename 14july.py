@@ -1,17 +1,19 @@
 import streamlit as st
 import base64
-import openai
 import requests
 import json
 from streamlit_gsheets import GSheetsConnection
 import pandas as pd
+from prompt import compile_system_prompt
+from catalog_store import compact_catalog
+from retrieval import catalog_version
+from engine import response_text
 
 # Set up the page
 st.set_page_config(page_title="HS Code Lookup System", layout="wide")
 
 # Load the OpenAI API key from Streamlit secrets
 api_key = st.secrets["openai"]["api_key"]
-openai.api_key = api_key
 
 # Google Sheets URL and worksheet ID from secrets
 spreadsheet_url = "https://docs.google.com/spreadsheets/d/1wgliY7XyZF-p4FUa1MiELUlQ3v1Tg6KDZzWuyW8AMo4/edit?gid=835818411"
@@ -20,17 +22,18 @@ worksheet_id = "835818411"
 # Set up connection to Google Sheets
 conn = st.experimental_connection("gsheets", type=GSheetsConnection)
 
-@st.cache_data
+# One compact, read-only copy of the sheet per process, shared by every session (cache_data copied it per caller)
+@st.cache_resource
 def get_data_from_gsheet(url, worksheet_id):
     try:
         st.write(f"Reading from Google Sheets URL: {url} and Worksheet ID: {worksheet_id}")
-        data = conn.read(spreadsheet=url, usecols=list(range(5)), worksheet=worksheet_id)
-        return data
+        data = compact_catalog(conn.read(spreadsheet=url, usecols=list(range(5)), worksheet=worksheet_id))
     except Exception as e:
         st.error(f"Error reading from Google Sheets: {e}")
-        return pd.DataFrame()  # Return an empty DataFrame in case of error
+        data = pd.DataFrame()  # Return an empty DataFrame in case of error
+    return data, catalog_version(data)
 
-data = get_data_from_gsheet(spreadsheet_url, worksheet_id)
+data, data_version = get_data_from_gsheet(spreadsheet_url, worksheet_id)
 
 # Construct the system message from the Google Sheets data
 system_message = """
@@ -46,15 +49,8 @@ json
 Product List:
 """
 
-if not data.empty:
-    for index, row in data.iterrows():
-        system_message += f"""
-{row['Product Name']}
-* Definisi: {row['Definition']}
-* Bahan: {row['Material']}
-* HS Code: {row['HS Code']}
-* Specifications: {row['Specifications']}
-"""
+# Append the product list, compiled once per sheet version
+system_message = compile_system_prompt(system_message, data, "indonesian", data_version).text
 
 # Initialize chat history as a session state
 if "chat_history" not in st.session_state:
@@ -86,27 +82,20 @@ def process_prompt_openai(system_prompt, user_prompt, image_path=None):
         "Content-Type": "application/json",
         "Authorization": f"Bearer {api_key}"
     }
-    messages = [
-        {"role": "system", "content": system_prompt},
-        {"role": "user", "content": user_prompt}
-    ]
+    # The system prompt is the same for every call (a cacheable prefix); the query is sent once, after it
+    messages = [{"role": "system", "content": system_prompt}]
     if base64_image:
-        messages.append({
-            "role": "user",
-            "content": [
-                {
-                    "type": "text",
-                    "text": user_prompt
-                },
-                {
-                    "type": "image_url",
-                    "image_url": {
-                        "url": f"data:image/jpeg;base64,{base64_image}",
-                        "detail": "high"
-                    }
-                }
-            ]
+        content = [{"type": "text", "text": user_prompt}] if user_prompt else []
+        content.append({
+            "type": "image_url",
+            "image_url": {
+                "url": f"data:image/jpeg;base64,{base64_image}",
+                "detail": "high"
+            }
         })
+        messages.append({"role": "user", "content": content})
+    else:
+        messages.append({"role": "user", "content": user_prompt})
 
     payload = {
         "model": "gpt-4o",
@@ -139,7 +128,8 @@ def send_message():
 
         # Call the OpenAI API with the chat history
         response = process_prompt_openai(system_prompt, user_prompt, imgpath)
-        st.session_state.chat_history.append({"role": "assistant", "content": response})
+        # Keep only the reply text in history, not the raw response with its usage metadata
+        st.session_state.chat_history.append({"role": "assistant", "content": response_text(response)})
         st.session_state.input_buffer = ""
 
     st.experimental_rerun()  # Trigger rerun to clear input and update chat history
@@ -1,17 +1,20 @@
 import streamlit as st
 import base64
-import openai
 import requests
 import json
 from streamlit_gsheets import GSheetsConnection
 import pandas as pd
+from prompt import compile_system_prompt
+from catalog_store import compact_catalog
+from retrieval import catalog_version
+from engine import response_text
+from context import build_context
 
 # Set up the page
 st.set_page_config(page_title="HS Code Lookup System", layout="wide")
 
 # Load the OpenAI API key from Streamlit secrets
 api_key = st.secrets["openai"]["api_key"]
-openai.api_key = api_key
 
 # Google Sheets URL and worksheet ID from secrets
 spreadsheet_url = "https://docs.google.com/spreadsheets/d/1wgliY7XyZF-p4FUa1MiELUlQ3v1Tg6KDZzWuyW8AMo4/edit?gid=835818411"
@@ -20,17 +23,18 @@ worksheet_id = "835818411"
 # Set up connection to Google Sheets
 conn = st.experimental_connection("gsheets", type=GSheetsConnection)
 
-@st.cache_data
+# One compact, read-only copy of the sheet per process, shared by every session (cache_data copied it per caller)
+@st.cache_resource
 def get_data_from_gsheet(url, worksheet_id):
     try:
         st.write(f"Reading from Google Sheets URL: {url} and Worksheet ID: {worksheet_id}")
-        data = conn.read(spreadsheet=url, usecols=list(range(5)), worksheet=worksheet_id)
-        return data
+        data = compact_catalog(conn.read(spreadsheet=url, usecols=list(range(5)), worksheet=worksheet_id))
     except Exception as e:
         st.error(f"Error reading from Google Sheets: {e}")
-        return pd.DataFrame()  # Return an empty DataFrame in case of error
+        data = pd.DataFrame()  # Return an empty DataFrame in case of error
+    return data, catalog_version(data)
 
-data = get_data_from_gsheet(spreadsheet_url, worksheet_id)
+data, data_version = get_data_from_gsheet(spreadsheet_url, worksheet_id)
 
 # Construct the initial system message from the Google Sheets data
 initial_system_message = """
@@ -59,15 +63,8 @@ always only produce the codes mentioned below and nothing else from your knowled
 Product List:
 """
 
-if not data.empty:
-    for index, row in data.iterrows():
-        initial_system_message += f"""
-{row['Product Name']}
-* Definisi: {row['Definition']}
-* Bahan: {row['Material']}
-* HS Code: {row['HS Code']}
-* Specifications: {row['Specifications']}
-"""
+# Append the product list, compiled once per sheet version
+initial_system_message = compile_system_prompt(initial_system_message, data, "indonesian", data_version).text
 
 # Initialize chat history as a session state
 if "chat_history" not in st.session_state:
@@ -145,9 +142,10 @@ def send_message():
             for i, imgpath in enumerate(imgpaths):
                 st.session_state.chat_history.append({"role": "user", "content": f"<image-upload>{imgpath}</image-upload>"})
 
-        # Call the OpenAI API with the chat history
-        response = process_prompt_openai(initial_system_message, st.session_state.chat_history, imgpaths)
-        st.session_state.chat_history.append({"role": "assistant", "content": f"<assistant-response>{response}</assistant-response>"})
+        # Call the OpenAI API with a token-budgeted view of the chat history (recent turns plus resolved codes)
+        response = process_prompt_openai(initial_system_message, build_context(st.session_state.chat_history), imgpaths)
+        # Keep only the reply text in history, not the raw response with its usage metadata
+        st.session_state.chat_history.append({"role": "assistant", "content": f"<assistant-response>{response_text(response)}</assistant-response>"})
         st.session_state.input_buffer = ""
 
     st.experimental_rerun()  # Trigger rerun to clear input and update chat history
@@ -0,0 +1,191 @@
+import asyncio
+import base64
+import fcntl
+import os
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel, Field
+
+from batch import RESULT_COLUMNS, BatchStats, iter_batch
+from catalog_sync import CatalogSync, CsvSheetConnection
+from engine import DEFAULT_MODEL
+from hs_tree import format_hs, hs_digits
+from image_pipeline import prepare_images
+from llm_client import GROQ_BASE_URL, OPENAI_BASE_URL, LLMClient
+from rate_limit import KeyedLimiter
+from router import Provider, ProviderRouter
+from service import LookupService
+from tracing import tracer
+
+# Headless HTTP API over the lookup engine. Run with several worker processes, e.g.
+#   uvicorn api:app --workers 4
+# Every worker keeps one warm catalog, engine and connection pool; the Parquet snapshot and the
+# SQLite response cache on disk are shared, and only one worker polls the sheet. Workers accept
+# connections at once and warm the catalog in the background; /health answers 503 until they are warm.
+
+SHEET_CSV_URL = os.environ.get(
+    "HSCODE_SHEET_CSV",
+    "https://docs.google.com/spreadsheets/d/1wgliY7XyZF-p4FUa1MiELUlQ3v1Tg6KDZzWuyW8AMo4/export?format=csv&gid=835818411",
+)
+SNAPSHOT_PATH = os.environ.get("HSCODE_SNAPSHOT", ".cache/catalog.parquet")
+RESPONSE_CACHE_PATH = os.environ.get("HSCODE_RESPONSE_CACHE", ".cache/responses.sqlite")
+# Perceptual-hash index of classified photos; each worker loads it at start and adds what it classifies
+IMAGE_INDEX_PATH = os.environ.get("HSCODE_IMAGE_INDEX", ".cache/images.sqlite")
+LLM_BASE_URL = os.environ.get("HSCODE_LLM_BASE_URL", OPENAI_BASE_URL)
+# Optional second provider for text-only queries
+GROQ_API_KEY = os.environ.get("GROQ_API_KEY", "")
+GROQ_URL = os.environ.get("HSCODE_GROQ_BASE_URL", GROQ_BASE_URL)
+GROQ_MODEL = os.environ.get("HSCODE_GROQ_MODEL", "llama3-70b-8192")
+MODEL = os.environ.get("HSCODE_MODEL", DEFAULT_MODEL)
+POLL_SECONDS = float(os.environ.get("HSCODE_POLL_SECONDS", "300"))
+# Upstream calls per caller (X-API-Key header, else client address) and worker: bursts of RATE_BURST, then
+# RATE_PER_MINUTE; requests over the rate wait for their turn rather than fail
+RATE_PER_MINUTE = float(os.environ.get("HSCODE_RATE_PER_MINUTE", "60"))
+RATE_BURST = float(os.environ.get("HSCODE_RATE_BURST", "10"))
+# Per-stage spans, served as Prometheus text on /metrics
+TRACING = os.environ.get("HSCODE_TRACING", "") not in ("", "0")
+
+
+class ClassifyRequest(BaseModel):
+    query: Optional[str] = None
+    images: List[str] = []  # base64-encoded image files
+
+
+# Items per packed LLM request; output tokens grow with it (batch.TOKENS_PER_ITEM each)
+MAX_PACK_SIZE = 50
+# Items per /classify/batch call; longer lists are split by the caller
+MAX_BATCH_ITEMS = int(os.environ.get("HSCODE_MAX_BATCH_ITEMS", "2000"))
+
+
+class BatchRequest(BaseModel):
+    items: List[str] = Field(..., max_length=MAX_BATCH_ITEMS)
+    pack_size: int = Field(10, ge=1, le=MAX_PACK_SIZE)
+
+
+_poll_lock_file = None
+
+
+# The first worker to take the lock polls the sheet; the others only follow the snapshot
+def elect_poller():
+    global _poll_lock_file
+    directory = os.path.dirname(SNAPSHOT_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    _poll_lock_file = open(f"{SNAPSHOT_PATH}.lock", "w")
+    try:
+        fcntl.flock(_poll_lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+def make_sync():
+    return CatalogSync(CsvSheetConnection(SHEET_CSV_URL), SNAPSHOT_PATH, usecols=list(range(5)),
+                       interval_seconds=POLL_SECONDS).start(poll_sheet=elect_poller())
+
+
+def make_llm_client():
+    providers = [Provider("openai", LLMClient(os.environ.get("OPENAI_API_KEY", ""), base_url=LLM_BASE_URL), vision=True)]
+    if GROQ_API_KEY:
+        providers.append(Provider("groq", LLMClient(GROQ_API_KEY, base_url=GROQ_URL), GROQ_MODEL, json_schema=False))
+    return ProviderRouter(providers)
+
+
+state = None
+
+
+# Warm the catalog in the background; requests that arrive before it is ready wait for it off the event loop
+async def current_engine():
+    if not state.ready:
+        await asyncio.to_thread(state.wait)
+    return state.current()
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global state
+    tracer.enabled = TRACING
+    state = LookupService(make_sync, make_llm_client(), RESPONSE_CACHE_PATH, MODEL, image_index_path=IMAGE_INDEX_PATH,
+                          rate_limiter=KeyedLimiter(RATE_PER_MINUTE / 60, RATE_BURST)).start()
+    yield
+    await asyncio.to_thread(state.stop)
+    await state.llm_client.aclose()
+    state.llm_client.close()
+
+
+app = FastAPI(title="HS Code Lookup API", lifespan=lifespan)
+
+
+@app.get("/health")
+async def health():
+    if not state.ready:
+        return JSONResponse({"status": "warming"}, status_code=503)
+    if state.error is not None:
+        return JSONResponse({"status": "error", "detail": str(state.error)}, status_code=503)
+    engine = state.current()
+    return {"status": "ok", "catalog_version": engine.version, "catalog_rows": len(engine.data),
+            "warmup_seconds": round(state.warm_seconds, 3), "llm": state.llm_client.report(),
+            "coalescing": engine.in_flight.report(), "rate_limit": state.rate_limiter.report(),
+            "rebuild_error": None if state.rebuild_error is None else str(state.rebuild_error)}
+
+
+def client_key(http_request, api_key):
+    if api_key:
+        return f"key:{api_key}"
+    return f"addr:{http_request.client.host if http_request.client else 'unknown'}"
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return tracer.export_prometheus()
+
+
+# Everything under an HS prefix ("73", "7326", "7326.90"): row count, the next level down and the first rows
+@app.get("/hs")
+@app.get("/hs/{prefix}")
+async def hs_codes(prefix: str = "", limit: int = 50):
+    engine = await current_engine()
+    rows = engine.data.iloc[engine.hs_tree.rows(prefix)[:max(limit, 0)]].astype(object)
+    return {
+        "prefix": hs_digits(prefix),
+        "count": engine.hs_tree.count(prefix),
+        "children": [{"code": format_hs(code), "count": count} for code, count in engine.hs_tree.children(prefix)],
+        "rows": rows.where(rows.notna(), None).to_dict("records"),
+        "catalog_version": engine.version,
+    }
+
+
+@app.post("/classify")
+async def classify(request: ClassifyRequest, http_request: Request, x_api_key: Optional[str] = Header(None)):
+    if not request.query and not request.images:
+        raise HTTPException(status_code=400, detail="Provide a query, an image, or both.")
+    with tracer.trace("request", route="/classify"):
+        try:
+            # Decoding and resizing photos takes a few hundred ms each: off the event loop
+            images = await asyncio.to_thread(prepare_images, [base64.b64decode(image) for image in request.images])
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Invalid image: {e}")
+        engine = await current_engine()
+        answer = await engine.aclassify(request.query, images, client_key=client_key(http_request, x_api_key))
+        return dict(answer.as_dict(), catalog_version=engine.version)
+
+
+@app.post("/classify/batch")
+async def classify_batch(request: BatchRequest, http_request: Request, x_api_key: Optional[str] = Header(None)):
+    engine = await current_engine()
+    stats = BatchStats(len(request.items))
+    results = []
+    # Each packed LLM request counts against the caller's rate like a single lookup does
+    async for resolved in iter_batch(request.items, engine.matcher, engine.index, engine.llm_client, engine.model, stats,
+                                     pack_size=request.pack_size, rate_limiter=engine.rate_limiter,
+                                     client_key=client_key(http_request, x_api_key)):
+        results.extend(resolved)
+    results.sort(key=lambda result: result.item)
+    return {
+        "results": [dict(zip(RESULT_COLUMNS, result.row())) for result in results],
+        "stats": stats.report(),
+        "catalog_version": engine.version,
+    }
@@ -1,140 +1,134 @@
 import streamlit as st
-import base64
-import openai
-import requests
-import json
-import os
-from streamlit_gsheets import GSheetsConnection
-import pandas as pd
+import asyncio
+import csv
+import io
+import uuid
+from rate_limit import KeyedLimiter
+from service import LookupService
+from tracing import tracer
+
+# pandas, the sheet connection, the engine and the HTTP client are imported where they are first used,
+# after the page has been drawn; the catalog itself is loaded on a background thread (service.py)
 
 # Set up the page
 st.set_page_config(page_title="HS Code Lookup System", layout="wide")
 
 # Load the OpenAI API key from Streamlit secrets
 api_key = st.secrets["openai"]["api_key"]
-openai.api_key = api_key
+
+# Model used for every OpenAI call
+OPENAI_MODEL = "gpt-4o-mini"
+
+# Per-call timeout for the OpenAI request, in seconds
+OPENAI_TIMEOUT_SECONDS = 60
+
+# On-disk location of the response cache
+RESPONSE_CACHE_PATH = ".cache/responses.sqlite"
+
+# Perceptual hashes of photos classified before, so re-shoots of the same part are recognised
+IMAGE_INDEX_PATH = ".cache/images.sqlite"
 
 # Google Sheets URL and worksheet ID from secrets
 spreadsheet_url = "https://docs.google.com/spreadsheets/d/1wgliY7XyZF-p4FUa1MiELUlQ3v1Tg6KDZzWuyW8AMo4/edit?gid=835818411"
 worksheet_id = "835818411"
 
-# Set up connection to Google Sheets
-conn = st.experimental_connection("gsheets", type=GSheetsConnection)
-
-@st.cache_data
-def get_data_from_gsheet(url, worksheet_id):
-    try:
-        st.write(f"Reading from Google Sheets URL: {url} and Worksheet ID: {worksheet_id}")
-        data = conn.read(spreadsheet=url, usecols=list(range(5)), worksheet=worksheet_id)
-        return data
-    except Exception as e:
-        st.error(f"Error reading from Google Sheets: {e}")
-        return pd.DataFrame()  # Return an empty DataFrame in case of error
-
-data = get_data_from_gsheet(spreadsheet_url, worksheet_id)
-
-# Construct the initial system message from the Google Sheets data
-initial_system_message = """
-You are a virtual assistant providing HS Code information. Be professional and informative.
-Do not make up any details you do not know. Always sound smart and refer to yourself as Jarvis.
-Only output the information given below and nothing else of your own knowledge. This is the only truth. Translate everything to English to the best of your ability.
-and only output when prompted towards something don't dump all the codes into the response.
-*** always make a prediction of what the image could be and be open to be corrected.
-IMPORTANT PRODUCT info:
-some products could look the same in image but could vary in materials and dimensions etc.
-few shot eg.
-1) conveyer belts
-2) small screws
-3) clamps
-4) pumps,
-5) rings, etc.
-so always list all available products in that type with dimensions and materials used. so an informed decision can be taken.
-We help you find the right HS Code for your products quickly and accurately. Save time and avoid customs issues with our automated HS Code lookup tool.
-Product List:
-"""
-
-if not data.empty:
-    for index, row in data.iterrows():
-        initial_system_message += f"{row['Product Name']}* Definition: {row['Definition']}* Material: {row['Material']}* HS Code: {row['HS Code']}* Specifications: {row['Specifications']}\n"
+# Local snapshot of the sheet and how often it is checked for changes
+CATALOG_SNAPSHOT_PATH = ".cache/catalog.parquet"
+CATALOG_POLL_SECONDS = 300
+
+# Groq model used for text-only queries when a Groq key is configured
+GROQ_MODEL = "llama3-70b-8192"
+
+# Upstream calls each browser session may make: a burst of 5, then one every 6 seconds. Faster senders
+# wait for their turn instead of getting an error.
+SESSION_REQUESTS_PER_MINUTE = 10
+SESSION_BURST = 5
+
+# Identifies this browser session to the rate limiter
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
 
 # Title and description
 st.title("HS Code Lookup System")
 st.write("Automated and accurate HS Code information at your fingertips.")
 
-# Helper function to read image bytes and encode them in base64
-def read_image_base64(image_path):
-    if os.path.exists(image_path):
-        with open(image_path, 'rb') as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
-    else:
-        st.error(f"File not found: {image_path}")
-        return None
-
-# Function to send a prompt (text and/or image) to OpenAI API
-def process_prompt_openai(system_prompt, chat_history, image_paths=None):
-    base64_images = [read_image_base64(image_path) for image_path in image_paths] if image_paths else []
-
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}"
-    }
-    messages = [{"role": "system", "content": system_prompt}]
-    for entry in chat_history:
-        messages.append({"role": entry["role"], "content": entry["content"]})
-    if base64_images:
-        image_contents = []
-        for base64_image in base64_images:
-            image_contents.append({
-                "type": "image_url",
-                "image_url": {
-                    "url": f"data:image/jpeg;base64,{base64_image}",
-                    "detail": "high"
-                }
-            })
-        messages.append({
-            "role": "user",
-            "content": image_contents
-        })
-
-    payload = {
-        "model": "gpt-4o-mini",
-        "messages": messages,
-        "max_tokens": 300
-    }
-
-    response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
-    return response.json()
+# Pooled HTTP clients shared by all sessions in this process: text queries go to the fastest healthy
+# provider, image queries to OpenAI
+@st.cache_resource
+def get_llm_client():
+    from llm_client import GROQ_BASE_URL, LLMClient
+    from router import Provider, ProviderRouter
+
+    providers = [Provider("openai", LLMClient(api_key), vision=True)]
+    if "GROQ_API_KEY" in st.secrets:
+        providers.append(Provider("groq", LLMClient(st.secrets["GROQ_API_KEY"], base_url=GROQ_BASE_URL), GROQ_MODEL, json_schema=False))
+    return ProviderRouter(providers)
+
+# One catalog, response cache and lookup engine per process, shared by every session and warmed in the
+# background: cold starts load the snapshot, a poller thread applies sheet changes, and the engine
+# (retrieval index, local matcher, compiled prompt) is rebuilt only when the sheet version changes
+@st.cache_resource
+def get_lookup_service(url, worksheet_id):
+    from streamlit_gsheets import GSheetsConnection
+
+    conn = st.experimental_connection("gsheets", type=GSheetsConnection)
+
+    # Runs on the warm-up thread, which also pays for the pandas import
+    def make_sync():
+        from catalog_sync import CatalogSync
+
+        return CatalogSync(conn, CATALOG_SNAPSHOT_PATH, spreadsheet=url, worksheet=worksheet_id,
+                           usecols=list(range(5)), interval_seconds=CATALOG_POLL_SECONDS).start()
+
+    return LookupService(make_sync, get_llm_client(), RESPONSE_CACHE_PATH, OPENAI_MODEL, OPENAI_TIMEOUT_SECONDS,
+                         IMAGE_INDEX_PATH, KeyedLimiter(SESSION_REQUESTS_PER_MINUTE / 60, SESSION_BURST)).start()
+
+# The engine for the current sheet version, waiting for the warm-up if it is still running
+def get_engine():
+    service = get_lookup_service(spreadsheet_url, worksheet_id)
+    if not service.ready:
+        with st.spinner("Catalog warming up..."):
+            service.wait()
+    return service.current()
+
+def render_user_message(content):
+    st.markdown(f"<div style='border: 2px solid blue; padding: 10px; margin: 10px 0; border-radius: 8px; width: 80%; float: right; clear: both;'>{content}</div>", unsafe_allow_html=True)
+
+def render_assistant_message(content, container=st):
+    container.markdown(f"<div style='border: 2px solid green; padding: 10px; margin: 10px 0; border-radius: 8px; width: 80%; float: left; clear: both;'>{content}</div>", unsafe_allow_html=True)
 
 # Function to handle message sending and processing
 def send_message():
     local_chat_history = []
     user_prompt = st.session_state.input_buffer
-    imgpaths = [f"temp_image_{i}.png" for i, _ in enumerate(uploaded_files)] if uploaded_files else []
 
     if not user_prompt and not uploaded_files:
         st.write("Please provide a text input, an image, or both.")
     else:
-        if uploaded_files:
-            # Save the uploaded files temporarily
-            for i, uploaded_file in enumerate(uploaded_files):
-                imgpath = f"temp_image_{i}.png"
-                with open(imgpath, "wb") as f:
-                    f.write(uploaded_file.getbuffer())
-                local_chat_history.append({"role": "user", "content": f"<image-upload>{imgpath}</image-upload>"})
-
-        if user_prompt:
-            local_chat_history.append({"role": "user", "content": f"<user-query>{user_prompt}</user-query>"})
-
-        # Call the OpenAI API with the chat history
-        response = process_prompt_openai(initial_system_message, local_chat_history, imgpaths)
-        local_chat_history.append({"role": "assistant", "content": f"<assistant-response>{response}</assistant-response>"})
-
-        # Display the chat history
-        for message in local_chat_history:
-            if message["role"] == "user":
-                st.markdown(f"<div style='border: 2px solid blue; padding: 10px; margin: 10px 0; border-radius: 8px; width: 80%; float: right; clear: both;'>{message['content']}</div>", unsafe_allow_html=True)
-            elif message["role"] == "assistant":
-                st.markdown(f"<div style='border: 2px solid green; padding: 10px; margin: 10px 0; border-radius: 8px; width: 80%; float: left; clear: both;'>{message['content']}</div>", unsafe_allow_html=True)
+        with tracer.trace("send_message"):
+            images = []
+            if uploaded_files:
+                from image_pipeline import prepare_images
+
+                # Downscale and encode the uploads in memory, skipping identical ones
+                images = prepare_images([uploaded_file.getbuffer() for uploaded_file in uploaded_files])
+                for uploaded_file in uploaded_files:
+                    local_chat_history.append({"role": "user", "content": f"<image-upload>{uploaded_file.name}</image-upload>"})
+
+            if user_prompt:
+                local_chat_history.append({"role": "user", "content": f"<user-query>{user_prompt}</user-query>"})
+
+            # Display the user messages, then the answer as it arrives
+            for message in local_chat_history:
+                render_user_message(message["content"])
+            assistant_bubble = st.empty()
+
+            # Answered locally, from the cache or by the OpenAI API, streaming into the bubble
+            answer = get_engine().classify(user_prompt, images, local_chat_history,
+                                           on_text=lambda text: render_assistant_message(text, assistant_bubble),
+                                           client_key=st.session_state.session_id)
+            with tracer.span("render.answer"):
+                render_assistant_message(f"<assistant-response>{answer.text}</assistant-response>", assistant_bubble)
 
     st.experimental_rerun()  # Trigger rerun to clear input and update chat history
 
@@ -152,6 +146,143 @@ if uploaded_files:
 # Send button
 st.button("Send", on_click=send_message)
 
-# Display data from Google Sheets
+# Classify a whole product list: local matches first, the rest packed into concurrent LLM requests
+def run_batch(batch_file):
+    from batch import RESULT_COLUMNS, BatchStats, iter_batch, read_items
+
+    engine = get_engine()
+    descriptions = read_items(batch_file, batch_file.name)
+    stats = BatchStats(len(descriptions))
+    progress = st.progress(0.0, text="Classifying...")
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(RESULT_COLUMNS)
+
+    # The client's connections for this run's event loop are closed with it
+    async def consume():
+        try:
+            # Each packed request counts against this session's rate like a single lookup does
+            async for results in iter_batch(descriptions, engine.matcher, engine.index, engine.llm_client, OPENAI_MODEL, stats,
+                                            rate_limiter=engine.rate_limiter, client_key=st.session_state.session_id):
+                writer.writerows(result.row() for result in results)
+                progress.progress(stats.done / max(stats.rows, 1), text=f"{stats.done}/{stats.rows} rows")
+        finally:
+            await engine.llm_client.aclose()
+
+    asyncio.run(consume())
+    st.session_state.batch_output = (batch_file.name, output.getvalue(), stats.report())
+
+with st.expander("Batch classification (CSV / Excel)"):
+    batch_file = st.file_uploader("Product list, one description per row", type=["csv", "xlsx"], key="batch_file")
+    if batch_file and st.button("Classify file"):
+        run_batch(batch_file)
+    if "batch_output" in st.session_state:
+        name, output, report = st.session_state.batch_output
+        st.write(f"{report['rows']} rows in {report['seconds']:.1f} s ({report['rows_per_second']} rows/s): "
+                 f"{report['local']} from the sheet, {report['llm']} from {report['llm_requests']} LLM requests, {report['unresolved']} unresolved")
+        st.download_button("Download results", output, file_name=f"hs_codes_{name.rsplit('.', 1)[0]}.csv", mime="text/csv")
+
+# Everything below needs the catalog: the spinner shows while it warms up
+try:
+    engine = get_engine()
+except Exception as e:
+    st.error(f"Error reading from Google Sheets: {e}")
+    get_lookup_service.clear()  # try again on the next run
+    st.stop()
+llm_client = engine.llm_client
+response_cache = engine.response_cache
+data = engine.data
+
+# Share of lookups answered locally without calling the API
+stats = engine.match_stats.report()
+st.sidebar.write("## Local matcher")
+st.sidebar.write(f"Queries: {stats['queries']} | answered locally: {stats['local_hits']} ({stats['hit_rate']:.0%})")
+st.sidebar.write(f"Avg local answer: {stats['avg_hit_ms']:.1f} ms")
+
+st.sidebar.write(f"Full system prompt: {engine.full_prompt.token_count} tokens")
+
+latency = llm_client.latency.report()
+st.sidebar.write("## LLM latency")
+st.sidebar.write(f"Time to first token: p50 {latency['ttft_p50_ms']:.0f} ms, p95 {latency['ttft_p95_ms']:.0f} ms")
+st.sidebar.write(f"Total: p50 {latency['total_p50_ms']:.0f} ms, p95 {latency['total_p95_ms']:.0f} ms over {latency['calls']} calls")
+routing = llm_client.report()
+for provider in routing["providers"]:
+    status = "healthy" if provider["healthy"] else "cooling down"
+    st.sidebar.write(f"{provider['provider']}: p50 {provider['p50_ms']:.0f} ms, p95 {provider['p95_ms']:.0f} ms, "
+                     f"errors {provider['error_rate']:.0%} over {provider['calls']} calls ({status})")
+st.sidebar.write(f"Hedged: {routing['hedges']} | failed over: {routing['failovers']}")
+flights = engine.in_flight.report()
+limits = engine.rate_limiter.report()
+st.sidebar.write(f"Coalesced duplicates: {flights['coalesced']} ({flights['coalesced_share']:.0%}) | "
+                 f"rate-limited waits: {limits['queued']} (avg {limits['avg_wait_ms']:.0f} ms)")
+usage = engine.usage_stats.report()
+st.sidebar.write(f"Output: {usage['avg_output_tokens']:.0f} tokens per answer on average (max {usage['max_output_tokens']})")
+st.sidebar.write(f"Prompt: {usage['cached_prompt_tokens']} cached / {usage['uncached_prompt_tokens']} uncached tokens ({usage['cached_share']:.0%} from the provider's prefix cache)")
+
+cache_stats = response_cache.stats()
+st.sidebar.write("## Response cache")
+st.sidebar.write(f"Hits: {cache_stats['memory_hits']} memory, {cache_stats['disk_hits']} disk | misses: {cache_stats['misses']} ({cache_stats['hit_rate']:.0%} hit rate)")
+image_stats = engine.image_index.stats()
+st.sidebar.write(f"Known photos: {image_stats['images']} | near-duplicate uploads: {image_stats['hits']} ({image_stats['hit_rate']:.0%})")
+
+# Admin panel (open the app with ?admin=1): per-stage timings of recent requests
+if st.query_params.get("admin") == "1":
+    st.sidebar.write("## Tracing")
+    tracer.enabled = st.sidebar.checkbox("Record spans", value=tracer.enabled)
+    stages = tracer.report()
+    if stages:
+        st.sidebar.dataframe([{"stage": name, "count": stage["count"], "p50 ms": round(stage["p50_ms"], 1),
+                              "p95 ms": round(stage["p95_ms"], 1), "errors": stage["errors"]}
+                             for name, stage in stages.items()], hide_index=True)
+        for spans in tracer.recent_traces(5):
+            st.sidebar.write(" → ".join(f"{span['span']} {span['ms']:.0f} ms" for span in spans))
+        st.sidebar.download_button("Spans (JSON lines)", tracer.export_jsonl(), file_name="spans.jsonl", mime="application/x-ndjson")
+        st.sidebar.download_button("Metrics (Prometheus)", tracer.export_prometheus(), file_name="metrics.prom", mime="text/plain")
+    if st.sidebar.button("Clear spans"):
+        tracer.clear()
+
+# Product data: filtered and paged on the server, so a rerun sends one page of the sheet to the browser
+def browse_catalog():
+    from catalog_view import PAGE_SIZES, filter_rows, material_options, page_count, page_rows
+    from hs_tree import HS_LEVELS, LEVEL_NAMES, format_hs
+
+    search_column, material_column = st.columns(2)
+    search = search_column.text_input("Search products or HS codes", key="catalog_search")
+    materials = material_column.multiselect("Material", material_options(data), key="catalog_materials")
+
+    # Drill down from chapter to heading, subheading and tariff line
+    prefix = ""
+    for level, column in zip(HS_LEVELS, st.columns(len(HS_LEVELS))):
+        options = engine.hs_tree.children(prefix)
+        if not options:
+            break
+        choice = column.selectbox(LEVEL_NAMES[level].capitalize(), [None] + options, key=f"hs_level_{level}",
+                                  format_func=lambda option: "All" if option is None else f"{format_hs(option[0])} ({option[1]})")
+        if choice is None:
+            break
+        prefix = choice[0]
+
+    rows = filter_rows(engine, search, materials, prefix)
+    page_size = st.session_state.get("catalog_page_size", PAGE_SIZES[0])
+    pages = page_count(len(rows), page_size)
+    # New filters start again from the first page
+    filters = (search, tuple(materials), prefix, page_size, engine.version)
+    if st.session_state.get("catalog_filters") != filters:
+        st.session_state.catalog_filters = filters
+        st.session_state.catalog_page = 1
+
+    st.dataframe(page_rows(data, rows, st.session_state.catalog_page, page_size))
+    page_column, size_column, export_column = st.columns(3)
+    page_column.number_input(f"Page (of {pages})", min_value=1, max_value=pages, key="catalog_page")
+    size_column.selectbox("Rows per page", PAGE_SIZES, key="catalog_page_size")
+    st.caption(f"{len(rows)} of {len(data)} products" + (f" under {format_hs(prefix)}" if prefix else ""))
+
+    # The filtered rows are serialized only when asked for, and dropped again once downloaded
+    if export_column.button(f"Export {len(rows)} rows"):
+        st.session_state.catalog_export = data.iloc[rows].to_csv(index=False)
+    if "catalog_export" in st.session_state:
+        if export_column.download_button("Download CSV", st.session_state.catalog_export, file_name="products.csv", mime="text/csv"):
+            del st.session_state.catalog_export
+
 st.write("## Product Data")
-st.dataframe(data)
+browse_catalog()
@@ -0,0 +1,242 @@
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+
+from llm_client import OPENAI_BASE_URL, LLMClient, LLMError
+from matcher import ProductMatcher, normalize_query
+from prompt import render_catalog
+from rate_limit import TokenBucket
+from retrieval import CatalogIndex
+
+# Column names recognised as the product description in an uploaded list; otherwise the first column is used
+DESCRIPTION_COLUMNS = ("description", "product description", "product", "product name", "item", "goods description")
+
+RESULT_COLUMNS = ["item", "description", "hs_code", "product_name", "source", "score"]
+
+BATCH_HEADER = """
+You classify products into HS Codes for customs. Use only the product list below; do not use any other knowledge.
+Product List:
+"""
+BATCH_INSTRUCTIONS = """
+Classify each numbered item from the user using only the product list above.
+Reply with JSON only: {"results": [{"item": <number>, "row": <number in [brackets] before the product>}]}.
+Use null for row when no product in the list fits the item.
+"""
+
+# Output tokens budgeted per item in a packed request
+TOKENS_PER_ITEM = 40
+
+
+class BatchResult:
+    __slots__ = ("item", "description", "hs_code", "product_name", "source", "score")
+
+    def __init__(self, item, description, hs_code=None, product_name=None, source="unresolved", score=None):
+        self.item = item
+        self.description = description
+        self.hs_code = hs_code
+        self.product_name = product_name
+        self.source = source
+        self.score = score
+
+    def row(self):
+        return [self.item, self.description, self.hs_code or "", self.product_name or "", self.source,
+                "" if self.score is None else round(self.score, 3)]
+
+
+class BatchStats:
+    def __init__(self, rows):
+        self.rows = rows
+        self.local = 0
+        self.llm = 0
+        self.unresolved = 0
+        self.requests = 0
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    def add(self, result):
+        if result.source == "unresolved":
+            self.unresolved += 1
+        elif result.source == "llm":
+            self.llm += 1
+        else:
+            self.local += 1
+        self.seconds = time.perf_counter() - self.started
+
+    @property
+    def done(self):
+        return self.local + self.llm + self.unresolved
+
+    def report(self):
+        return {
+            "rows": self.rows,
+            "local": self.local,
+            "llm": self.llm,
+            "unresolved": self.unresolved,
+            "llm_requests": self.requests,
+            "seconds": round(self.seconds, 3),
+            "rows_per_second": round(self.done / self.seconds, 1) if self.seconds else 0.0,
+        }
+
+
+def read_items(file, filename):
+    if filename.lower().endswith((".xlsx", ".xls")):
+        items = pd.read_excel(file)
+    else:
+        items = pd.read_csv(file)
+    if items.empty:
+        return []
+    column = next((column for column in items.columns if str(column).strip().lower() in DESCRIPTION_COLUMNS), items.columns[0])
+    return items[column].fillna("").astype(str).tolist()
+
+
+# Match every distinct description once and fan the answers out to duplicate rows
+def resolve_locally(descriptions, matcher):
+    results = [None] * len(descriptions)
+    by_query = {}
+    for item, description in enumerate(descriptions):
+        by_query.setdefault(normalize_query(description), []).append(item)
+    for query, items in by_query.items():
+        match = matcher.match(query) if query else None
+        if match is None or not match.confident:
+            continue
+        for item in items:
+            results[item] = BatchResult(item, descriptions[item], match.hs_code, match.row.get("Product Name"), match.method, match.score)
+    return results
+
+
+# Messages for one pack and the catalog rows listed in them (by row id, as in the single-lookup prompt)
+def pack_messages(pack, index, candidates_per_item):
+    positions = sorted({position for _, description in pack for position in index.search(description, candidates_per_item)})
+    system = BATCH_HEADER + render_catalog(index.data.iloc[positions], with_ids=True) + BATCH_INSTRUCTIONS
+    user = "\n".join(f"{item}. {description}" for item, description in pack)
+    return [{"role": "system", "content": system}, {"role": "user", "content": user}], positions
+
+
+# The model names a row; code and product name come from the sheet. Rows that were not in the prompt
+# (or are not rows at all) leave the item unresolved.
+def parse_pack_response(response, pack, data, positions):
+    answers = {}
+    if "error" not in response:
+        try:
+            content = json.loads(response["choices"][0]["message"]["content"])
+            for entry in content.get("results", []):
+                try:
+                    answers[int(entry["item"])] = int(entry["row"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+        except (KeyError, IndexError, TypeError, ValueError, AttributeError):
+            pass
+    listed = set(positions)
+    results = []
+    for item, description in pack:
+        row = answers.get(item)
+        if row in listed:
+            record = data.iloc[row]
+            results.append(BatchResult(item, description, str(record.get("HS Code")), record.get("Product Name"), "llm"))
+        else:
+            results.append(BatchResult(item, description))
+    return results
+
+
+async def _classify_pack(pack, index, client, model, limiter, candidates_per_item, stats, rate_limiter, client_key):
+    await limiter.acquire_async()
+    if rate_limiter is not None:
+        await rate_limiter.acquire_async(client_key)
+    stats.requests += 1
+    # Retrieval over the catalog is CPU work: off the event loop, like the local matching
+    messages, positions = await asyncio.to_thread(pack_messages, pack, index, candidates_per_item)
+    payload = {
+        "model": model,
+        "messages": messages,
+        "max_tokens": TOKENS_PER_ITEM * len(pack) + 50,
+        "response_format": {"type": "json_object"},
+        "temperature": 0,
+    }
+    try:
+        response = await client.achat(payload)
+    except LLMError as e:
+        response = {"error": {"message": str(e)}}
+    return parse_pack_response(response, pack, index.data, positions)
+
+
+# Yields lists of results as they are resolved: local matches first, then each packed LLM request as it completes.
+# With a rate_limiter (rate_limit.KeyedLimiter) every packed request is also charged to client_key's bucket.
+async def iter_batch(descriptions, matcher, index, client, model, stats, pack_size=10, requests_per_second=2.0,
+                     candidates_per_item=5, rate_limiter=None, client_key=None):
+    # Matching a long list takes seconds on a large sheet: on a worker thread so the loop keeps serving
+    local = await asyncio.to_thread(resolve_locally, descriptions, matcher)
+    resolved = [result for result in local if result is not None]
+    for result in resolved:
+        stats.add(result)
+    if resolved:
+        yield resolved
+
+    pending = [(item, description) for item, description in enumerate(descriptions) if local[item] is None]
+    if not pending:
+        return
+    if client is None:
+        results = [BatchResult(item, description) for item, description in pending]
+        for result in results:
+            stats.add(result)
+        yield results
+        return
+
+    limiter = TokenBucket(requests_per_second)
+    packs = [pending[i:i + pack_size] for i in range(0, len(pending), pack_size)]
+    tasks = [asyncio.ensure_future(_classify_pack(pack, index, client, model, limiter, candidates_per_item, stats,
+                                                 rate_limiter, client_key)) for pack in packs]
+    try:
+        for task in asyncio.as_completed(tasks):
+            results = await task
+            for result in results:
+                stats.add(result)
+            yield results
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def classify_to_csv(descriptions, catalog, output, client, model, **options):
+    matcher = ProductMatcher(catalog)
+    index = CatalogIndex(catalog)
+    stats = BatchStats(len(descriptions))
+    writer = csv.writer(output)
+    writer.writerow(RESULT_COLUMNS)
+    async for results in iter_batch(descriptions, matcher, index, client, model, stats, **options):
+        writer.writerows(result.row() for result in results)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify a CSV/Excel list of product descriptions into HS codes")
+    parser.add_argument("items", help="CSV or XLSX file with one product description per row")
+    parser.add_argument("--catalog", required=True, help="product sheet as CSV or Parquet")
+    parser.add_argument("--output", default="-", help="output CSV (default: stdout)")
+    parser.add_argument("--model", default="gpt-4o-mini")
+    parser.add_argument("--base-url", default=OPENAI_BASE_URL)
+    parser.add_argument("--pack-size", type=int, default=10)
+    parser.add_argument("--requests-per-second", type=float, default=2.0)
+    parser.add_argument("--local-only", action="store_true", help="do not call the LLM for unresolved rows")
+    args = parser.parse_args()
+
+    catalog = pd.read_parquet(args.catalog) if args.catalog.endswith(".parquet") else pd.read_csv(args.catalog)
+    descriptions = read_items(args.items, args.items)
+    client = None if args.local_only else LLMClient(os.environ.get("OPENAI_API_KEY", ""), base_url=args.base_url)
+    output = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+    try:
+        stats = asyncio.run(classify_to_csv(descriptions, catalog, output, client, args.model,
+                                            pack_size=args.pack_size, requests_per_second=args.requests_per_second))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(json.dumps(stats.report()), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
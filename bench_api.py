@@ -0,0 +1,96 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from bench_matcher import query_mix
+from mock_llm_server import MockLLMConfig, start_mock_server
+from synthetic_catalog import make_catalog
+
+
+async def wait_ready(client, url, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get(f"{url}/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("API did not start")
+
+
+async def load(url, queries, concurrency):
+    latencies = []
+    sources = {}
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+        await wait_ready(client, url)
+
+        async def one(query):
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post(f"{url}/classify", json={"query": query})
+                latencies.append((time.perf_counter() - start) * 1000)
+                source = response.json().get("source", "error") if response.status_code == 200 else f"http_{response.status_code}"
+                sources[source] = sources.get(source, 0) + 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(query) for query in queries))
+        elapsed = time.perf_counter() - start
+    return latencies, sources, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of the HTTP API (uvicorn workers) against a mocked LLM")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--catalog-rows", type=int, default=5000)
+    parser.add_argument("--llm-latency-ms", type=float, default=500.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    server, base_url = start_mock_server(MockLLMConfig(args.llm_latency_ms, 100.0, seed=0))
+    with tempfile.TemporaryDirectory() as directory:
+        catalog = make_catalog(args.catalog_rows)
+        sheet_path = os.path.join(directory, "sheet.csv")
+        catalog.to_csv(sheet_path, index=False)
+        env = dict(os.environ, HSCODE_SHEET_CSV=sheet_path, HSCODE_SNAPSHOT=os.path.join(directory, "catalog.parquet"),
+                   HSCODE_RESPONSE_CACHE=os.path.join(directory, "responses.sqlite"), HSCODE_LLM_BASE_URL=base_url,
+                   HSCODE_IMAGE_INDEX=os.path.join(directory, "images.sqlite"),
+                   OPENAI_API_KEY="mock-key")
+        api = subprocess.Popen([sys.executable, "-m", "uvicorn", "api:app", "--port", str(args.port),
+                                "--workers", str(args.workers), "--log-level", "warning"], env=env)
+        try:
+            queries = [query for query, _ in query_mix(catalog, args.requests, seed=2)]
+            latencies, sources, elapsed = asyncio.run(load(f"http://127.0.0.1:{args.port}", queries, args.concurrency))
+        finally:
+            api.terminate()
+            api.wait()
+    server.shutdown()
+
+    report = {
+        "workers": args.workers,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "throughput_rps": round(args.requests / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies), 1),
+        "p95_ms": round(statistics.quantiles(latencies, n=20)[-1], 1),
+        "sources": sources,
+        "upstream_llm_requests": server.config.requests,
+    }
+    print(json.dumps(report) if args.json else "\n".join(f"{key:>22}: {value}" for key, value in report.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import argparse
+import asyncio
+import io
+import json
+import re
+
+from bench_matcher import query_mix
+from batch import classify_to_csv
+from llm_client import LLMClient
+from mock_llm_server import MockLLMConfig, start_mock_server
+from synthetic_catalog import make_catalog
+
+
+# Mock LLM answer for a packed request: one JSON result per numbered item, naming the first listed row
+def packed_reply(request):
+    user = request["messages"][-1]["content"]
+    items = [int(number) for number in re.findall(r"^(\d+)\. ", user, flags=re.M)]
+    row = int(re.search(r"\[(\d+)\]", request["messages"][0]["content"]).group(1))
+    return json.dumps({"results": [{"item": item, "row": row} for item in items]})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch classification throughput with a mocked LLM")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--catalog-rows", type=int, default=5000)
+    parser.add_argument("--latency-ms", type=float, default=800.0)
+    parser.add_argument("--pack-size", type=int, default=10)
+    parser.add_argument("--requests-per-second", type=float, default=20.0)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    catalog = make_catalog(args.catalog_rows)
+    descriptions = [query for query, _ in query_mix(catalog, args.rows, seed=1)]
+    server, base_url = start_mock_server(MockLLMConfig(args.latency_ms, 100.0, reply=packed_reply, seed=0))
+    client = LLMClient("mock-key", base_url=base_url)
+
+    output = io.StringIO()
+    stats = asyncio.run(classify_to_csv(descriptions, catalog, output, client, "gpt-4o-mini",
+                                        pack_size=args.pack_size, requests_per_second=args.requests_per_second))
+    server.shutdown()
+    report = stats.report()
+    print(json.dumps(report) if args.json else "\n".join(f"{key:>26}: {value}" for key, value in report.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import argparse
+import gc
+import json
+import pickle
+import tracemalloc
+
+from catalog_store import compact_catalog, memory_bytes
+from synthetic_catalog import make_catalog
+
+
+# Python-heap bytes allocated while building `sessions` session states, per session
+def per_session_bytes(make_state, sessions):
+    gc.collect()
+    tracemalloc.start()
+    states = [make_state() for _ in range(sessions)]
+    allocated, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del states
+    return allocated / sessions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Catalog memory per concurrent session: per-caller copies vs. one shared compact frame")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    # Object columns, as read_csv returns them on the pandas version pinned in requirements.txt
+    raw = make_catalog(args.rows).astype(object)
+    shared = compact_catalog(raw)
+
+    # Before: st.cache_data hands every session its own unpickled copy of the frame
+    before = per_session_bytes(lambda: {"data": pickle.loads(pickle.dumps(raw))}, args.sessions)
+    # After: st.cache_resource hands every session the same compact frame
+    after = per_session_bytes(lambda: {"data": shared}, args.sessions)
+
+    report = {
+        "catalog_rows": args.rows,
+        "sessions": args.sessions,
+        "catalog_kb_object_columns": round(memory_bytes(raw) / 1024, 1),
+        "catalog_kb_compact": round(memory_bytes(shared) / 1024, 1),
+        "per_session_kb_before": round(before / 1024, 1),
+        "per_session_kb_after": round(after / 1024, 2),
+        "total_mb_before": round((before * args.sessions) / 2 ** 20, 1),
+        "total_mb_after": round((memory_bytes(shared) + after * args.sessions) / 2 ** 20, 2),
+    }
+    print(json.dumps(report) if args.json else "\n".join(f"{key:>26}: {value}" for key, value in report.items()))
+
+
+if __name__ == "__main__":
+    main()
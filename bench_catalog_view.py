@@ -0,0 +1,83 @@
+import argparse
+import json
+import statistics
+import time
+
+import pyarrow as pa
+
+from catalog_store import compact_catalog
+from catalog_view import filter_rows, page_rows
+from engine import LookupEngine
+from synthetic_catalog import make_catalog
+
+# Filters a user might set in the catalog browser: (search, materials, HS prefix)
+FILTERS = [
+    ("", (), ""),
+    ("", ("Brass",), ""),
+    ("", (), "73"),
+    ("pump", (), ""),
+    ("stainless clamp", ("Stainless Steel 316",), "7326"),
+    ("7318.15", (), ""),
+]
+
+
+# What st.dataframe sends to the browser: the frame as an Arrow IPC stream
+def arrow_bytes(frame):
+    table = pa.Table.from_pandas(frame)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().size
+
+
+def timed(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(times)
+
+
+def run(rows, page_size, repeat):
+    data = compact_catalog(make_catalog(rows))
+    engine = LookupEngine(data, None)
+    full_bytes, full_ms = timed(lambda: arrow_bytes(data), repeat)
+    filter_ms = []
+    page_bytes = []
+    for search, materials, prefix in FILTERS:
+        positions, elapsed = timed(lambda: filter_rows(engine, search, materials, prefix), repeat)
+        filter_ms.append(elapsed)
+        page_bytes.append(arrow_bytes(page_rows(data, positions, 1, page_size)))
+    page_bytes_median = statistics.median(page_bytes)
+    _, page_ms = timed(lambda: arrow_bytes(page_rows(data, filter_rows(engine), 1, page_size)), repeat)
+    return {
+        "catalog_rows": rows,
+        "full_frame_kb": round(full_bytes / 1024, 1),
+        "full_frame_serialize_ms": round(full_ms, 2),
+        "page_kb": round(page_bytes_median / 1024, 1),
+        "page_filter_and_serialize_ms": round(page_ms + statistics.median(filter_ms), 2),
+        "filter_p50_ms": round(statistics.median(filter_ms), 3),
+        "filter_max_ms": round(max(filter_ms), 3),
+        "bytes_saved_per_rerun": f"{1 - page_bytes_median / full_bytes:.1%}",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Catalog view: full st.dataframe payload vs one filtered page per rerun")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 20000])
+    parser.add_argument("--page-size", type=int, default=25)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    reports = [run(rows, args.page_size, args.repeat) for rows in args.rows]
+    if args.json:
+        print(json.dumps(reports))
+        return
+    for report in reports:
+        print("  ".join(f"{key}={value}" for key, value in report.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+
+import numpy as np
+
+from bench_matcher import VAGUE_QUERIES
+from engine import LookupEngine
+from llm_client import LLMClient
+from mock_llm_server import MockLLMConfig, start_mock_server
+from rate_limit import KeyedLimiter
+from synthetic_catalog import make_catalog
+
+
+# The same few popular questions, typed differently (case, spacing) by each caller
+def burst_queries(n, seed=0):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(n):
+        query = rng.choice(VAGUE_QUERIES)
+        queries.append(query.upper() if rng.random() < 0.3 else f"  {query} " if rng.random() < 0.3 else query)
+    return queries
+
+
+def percentiles(latencies):
+    values = np.array(latencies)
+    return {"p50_ms": round(float(np.percentile(values, 50)), 1), "p95_ms": round(float(np.percentile(values, 95)), 1),
+            "p99_ms": round(float(np.percentile(values, 99)), 1), "max_ms": round(float(values.max()), 1)}
+
+
+def make_engine(data, base_url, upstream_slots, coalesce, rate_limiter=None):
+    # upstream_slots stands in for the provider's concurrency allowance: calls beyond it queue in the client
+    client = LLMClient("mock-key", base_url=base_url, max_concurrency=upstream_slots)
+    engine = LookupEngine(data, client, rate_limiter=rate_limiter, coalesce=coalesce)
+    return engine, client
+
+
+# All callers released at once, one thread each, the way simultaneous Streamlit sessions arrive
+def threaded_burst(engine, queries, client_keys=None):
+    client_keys = client_keys or [None] * len(queries)
+    gate = threading.Barrier(len(queries))
+    latencies = [0.0] * len(queries)
+    sources = {}
+    lock = threading.Lock()
+
+    def one(i):
+        gate.wait()
+        start = time.perf_counter()
+        try:
+            source = engine.classify(queries[i], client_key=client_keys[i]).source
+        except Exception:
+            source = "error"
+        latencies[i] = (time.perf_counter() - start) * 1000
+        with lock:
+            sources[source] = sources.get(source, 0) + 1
+
+    threads = [threading.Thread(target=one, args=(i,)) for i in range(len(queries))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, sources
+
+
+async def async_burst(engine, queries):
+    async def one(query):
+        start = time.perf_counter()
+        answer = await engine.aclassify(query)
+        return (time.perf_counter() - start) * 1000, answer.source
+
+    results = await asyncio.gather(*(one(query) for query in queries))
+    sources = {}
+    for _, source in results:
+        sources[source] = sources.get(source, 0) + 1
+    return [latency for latency, _ in results], sources
+
+
+# A burst of popular questions with no warm response cache: upstream calls and tail latency with and without
+# coalescing
+def coalescing(data, args, mode):
+    queries = burst_queries(args.callers, seed=1)
+    rows = []
+    for coalesce in (False, True):
+        server, base_url = start_mock_server(MockLLMConfig(args.llm_latency_ms, 50.0, seed=0, token_delay_ms=0.0))
+        engine, client = make_engine(data, base_url, args.upstream_slots, coalesce)
+        start = time.perf_counter()
+        if mode == "threads":
+            latencies, sources = threaded_burst(engine, queries)
+        else:
+            latencies, sources = asyncio.run(async_burst(engine, queries))
+        elapsed = time.perf_counter() - start
+        client.close()
+        server.shutdown()
+        rows.append({"mode": mode, "coalescing": coalesce, "callers": len(queries), "distinct_questions": len(set(q.strip().lower() for q in queries)),
+                     "upstream_requests": server.config.requests, "wall_s": round(elapsed, 2), **percentiles(latencies), "sources": sources})
+    return rows
+
+
+# One session firing many different questions at once next to sessions asking one each: what the others wait
+# with and without per-session buckets
+def fairness(data, args):
+    noisy = [f"{VAGUE_QUERIES[i % len(VAGUE_QUERIES)]} variant {i}" for i in range(args.noisy_requests)]
+    quiet = [f"{VAGUE_QUERIES[i % len(VAGUE_QUERIES)]} for session {i}" for i in range(args.quiet_sessions)]
+    queries = noisy + quiet
+    keys = ["noisy"] * len(noisy) + [f"quiet-{i}" for i in range(len(quiet))]
+    rows = []
+    for limited in (False, True):
+        limiter = KeyedLimiter(args.session_rate, args.session_burst) if limited else None
+        server, base_url = start_mock_server(MockLLMConfig(args.llm_latency_ms, 50.0, seed=0, token_delay_ms=0.0))
+        engine, client = make_engine(data, base_url, args.upstream_slots, True, limiter)
+        latencies, sources = threaded_burst(engine, queries, keys)
+        client.close()
+        server.shutdown()
+        row = {"per_session_limit": limited, "noisy_requests": len(noisy), "quiet_sessions": len(quiet),
+               "upstream_requests": server.config.requests, "rejected": sources.get("error", 0),
+               "quiet_p95_ms": round(float(np.percentile(latencies[len(noisy):], 95)), 1),
+               "noisy_last_ms": round(max(latencies[:len(noisy)]), 1)}
+        if limiter is not None:
+            row["limiter"] = {key: round(value, 1) if isinstance(value, float) else value for key, value in limiter.report().items()}
+        rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent identical lookups: request coalescing and per-session rate limits")
+    parser.add_argument("--callers", type=int, default=200)
+    parser.add_argument("--upstream-slots", type=int, default=8, help="concurrent calls the provider allows")
+    parser.add_argument("--llm-latency-ms", type=float, default=400.0)
+    parser.add_argument("--catalog-rows", type=int, default=2000)
+    parser.add_argument("--noisy-requests", type=int, default=40)
+    parser.add_argument("--quiet-sessions", type=int, default=10)
+    parser.add_argument("--session-rate", type=float, default=2.0, help="tokens per second per session")
+    parser.add_argument("--session-burst", type=float, default=3.0)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    data = make_catalog(args.catalog_rows)
+    report = {"coalescing": coalescing(data, args, "threads") + coalescing(data, args, "async"),
+              "fairness": fairness(data, args)}
+    if args.json:
+        print(json.dumps(report))
+        return
+    for row in report["coalescing"] + report["fairness"]:
+        print("  ".join(f"{key}={value}" for key, value in row.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import argparse
+import json
+import random
+
+from context import build_context, message_tokens
+from synthetic_catalog import PRODUCT_TYPES
+
+
+def assistant_reply(rng):
+    name, hs_code, definition = rng.choice(PRODUCT_TYPES)
+    sizes = ", ".join(f"{size}mm" for size in rng.sample([6, 8, 10, 12, 16, 20, 25, 32, 40, 50], 5))
+    return (f"<assistant-response>Based on your description this is most likely a {name} ({definition.lower()}). "
+            f"HS Code: {hs_code}. The product sheet lists it in {sizes}, in stainless steel, brass and carbon steel. "
+            f"If the material differs, let me know and I will check the other variants listed under the same heading.</assistant-response>")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-turn conversation payload size: full history vs. token-budgeted context")
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    history = []
+    rows = []
+    for turn in range(1, args.turns + 1):
+        history.append({"role": "user", "content": f"<user-query>what is the HS code for {rng.choice(PRODUCT_TYPES)[0].lower()} number {turn}</user-query>"})
+        full = sum(message_tokens(message) for message in history)
+        bounded = sum(message_tokens(message) for message in build_context(history))
+        rows.append({"turn": turn, "full_history_tokens": full, "bounded_tokens": bounded})
+        history.append({"role": "assistant", "content": assistant_reply(rng)})
+
+    if args.json:
+        for row in rows:
+            print(json.dumps(row))
+        return
+    for row in rows:
+        if row["turn"] in (1, 2, 5, 10, 20, 30, 40, 50) or row["turn"] == args.turns:
+            print(f"turn {row['turn']:>3}: full history {row['full_history_tokens']:>6} tokens, bounded context {row['bounded_tokens']:>5} tokens")
+    print(f"max bounded context: {max(row['bounded_tokens'] for row in rows)} tokens")
+
+
+if __name__ == "__main__":
+    main()
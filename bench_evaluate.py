@@ -0,0 +1,130 @@
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import tempfile
+import time
+
+from bench_matcher import query_mix
+from bench_structured import PRODUCT_LINE
+from evaluate import CONFIGS, RecordedClient, evaluate, load_labeled, recommend, summarize
+from llm_client import LLMClient
+from mock_llm_server import MockLLMConfig, start_mock_server
+from synthetic_catalog import make_catalog
+
+# Product blocks of the one-field-per-line template the scripts use
+SCRIPT_PRODUCT = re.compile(r"^([^\n*]+)\n\* Definisi: [^\n]*\n\* Bahan: ([^\n]*)\n\* HS Code: ([^\n]*)\n", re.M)
+WORD = re.compile(r"[a-z0-9]+")
+
+# Mock models: (seconds to first token, seconds per output word, share of answers that pick the wrong product)
+MODELS = {
+    "gpt-4o": (0.45, 0.012, 0.03),
+    "gpt-4o-mini": (0.30, 0.006, 0.08),
+    "llama3-70b-8192": (0.20, 0.003, 0.15),
+}
+
+
+# Mock model: ranks the products in the prompt by word overlap with the question and answers with the best
+# (or, for a model's share of answers, the runner-up), as JSON candidates or prose, after a model-dependent delay
+def make_reply(time_scale):
+    def reply(request):
+        system = "".join(m["content"] for m in request["messages"] if m["role"] == "system")
+        products = [(row, name, material, code) for row, name, material, code, _ in PRODUCT_LINE.findall(system)]
+        products += [("", name, material, code) for name, material, code in SCRIPT_PRODUCT.findall(system)]
+        question = " ".join(m["content"] for m in request["messages"] if m["role"] == "user" and isinstance(m["content"], str))
+        words = set(WORD.findall(question.replace("user-query", "").lower()))
+        ranked = sorted(products, key=lambda product: -len(words & set(WORD.findall(f"{product[1]} {product[2]}".lower()))))
+        first_token, per_word, error_rate = MODELS.get(request["model"], MODELS["gpt-4o-mini"])
+        roll = int(hashlib.sha1(f"{request['model']}|{question}".encode("utf-8")).hexdigest()[:8], 16) / 0xFFFFFFFF
+        if roll < error_rate and len(ranked) > 1:
+            wrong = next((product for product in ranked if product[3] != ranked[0][3]), ranked[1])
+            ranked = [wrong] + ranked
+        if "response_format" in request:
+            candidates = [{"row": int(row or 0), "hs_code": code, "confidence": round(0.9 - 0.2 * i, 2)}
+                          for i, (row, _, _, code) in enumerate(ranked[:3])]
+            text = json.dumps({"candidates": candidates, "note": "Which material is it?"})
+        else:
+            lines = [f"{i + 1}) {name} made of {material}, HS Code: {code}." for i, (_, name, material, code) in enumerate(ranked[:3])]
+            text = ("I am Jarvis. Based on your description these products from the list could match:<br>" + "<br>".join(lines)
+                    + "<br>They look alike but differ in material and dimensions, so please tell me which one you have.")
+        time.sleep((first_token + per_word * len(text.split())) * time_scale)
+        return text
+    return reply
+
+
+# Half product names as users type them, half descriptions of what the part does, which the local matcher
+# cannot place
+def write_labeled(path, data, n, seed=3):
+    rng = random.Random(seed)
+    named = [(query, hs_code) for query, hs_code in query_mix(data, n * 2, seed) if hs_code is not None][:n - n // 2]
+    described = []
+    for _ in range(n // 2):
+        row = data.iloc[rng.randrange(len(data))]
+        described.append((f"{row['Definition'].lower()}, {row['Material'].lower()}", row["HS Code"]))
+    with open(path, "w") as f:
+        for query, hs_code in named + described:
+            f.write(json.dumps({"query": query, "hs_code": hs_code}) + "\n")
+
+
+def run(configs, items, data, client, workers):
+    summaries = []
+    for config in configs:
+        results, seconds = evaluate(config, items, data, client, workers)
+        summaries.append(summarize(config, results, seconds))
+    return summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluation harness: record against a mock provider, then re-score offline")
+    parser.add_argument("--rows", type=int, default=300)
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--time-scale", type=float, default=0.5, help="multiplier on the mock models' latencies")
+    parser.add_argument("--prefill-ms-per-1k-tokens", type=float, default=20.0)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    data = make_catalog(args.rows)
+    server, base_url = start_mock_server(MockLLMConfig(0.0, 0.0, reply=make_reply(args.time_scale), seed=0, token_delay_ms=0.0,
+                                                       prefill_ms_per_1k_tokens=args.prefill_ms_per_1k_tokens))
+    upstream = LLMClient("mock-key", base_url=base_url, max_concurrency=args.workers)
+    with tempfile.TemporaryDirectory() as directory:
+        labeled = os.path.join(directory, "labeled.jsonl")
+        write_labeled(labeled, data, args.items)
+        items = load_labeled(labeled)
+        responses = os.path.join(directory, "responses.jsonl")
+
+        start = time.perf_counter()
+        recording = RecordedClient(responses, "auto", {config.model: upstream for config in CONFIGS})
+        live = run(CONFIGS, items, data, recording, args.workers)
+        live_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        replaying = RecordedClient(responses, "replay")
+        offline = run(CONFIGS, items, data, replaying, args.workers)
+        offline_seconds = time.perf_counter() - start
+    upstream.close()
+    server.shutdown()
+
+    same = all(a["accuracy"] == b["accuracy"] and a["avg_prompt_tokens"] == b["avg_prompt_tokens"] for a, b in zip(live, offline))
+    report = {
+        "configs": offline,
+        "recommended": recommend(offline),
+        "live_run_s": round(live_seconds, 2),
+        "offline_run_s": round(offline_seconds, 2),
+        "upstream_calls": server.config.requests,
+        "offline_missing_responses": replaying.missing,
+        "offline_matches_live": same,
+    }
+    if args.json:
+        print(json.dumps(report))
+        return
+    for summary in offline:
+        print("  ".join(f"{key}={value}" for key, value in summary.items()))
+    print("  ".join(f"{key}={value}" for key, value in report.items() if key != "configs"))
+
+
+if __name__ == "__main__":
+    main()
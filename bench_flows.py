@@ -0,0 +1,248 @@
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from bench_matcher import query_mix
+from bench_structured import mock_reply
+from catalog_store import compact_catalog
+from catalog_sync import CatalogSync, CsvSheetConnection
+from context import build_context
+from engine import LookupEngine, response_text
+from llm_client import LLMClient, LLMError, cost
+from mock_llm_server import MockLLMConfig, start_mock_server
+from prompt import compile_system_prompt, script_header
+from response_cache import ResponseCache
+from retrieval import catalog_version
+from synthetic_catalog import make_catalog
+
+# Headless comparison of the four front ends (13july.py, 14july.py, 19julybackup.py, app.py): each flow below
+# sends exactly the requests its script sends, against a mock LLM endpoint and a CSV stand-in for the sheet.
+
+# The scripts (and the git checkout) sit next to this file, wherever the bench is run from
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+CONTEXT_WINDOWS = {"gpt-4o": 128000, "gpt-4o-mini": 128000, "llama3-70b-8192": 8192}
+
+HS_CODE = re.compile(r"HS Code: ([0-9.]+)")
+
+
+# Mock model: the JSON schema reply for structured requests, otherwise a prose answer of typical length.
+# Non-streamed replies are delayed by their length, like streamed ones are by the mock itself.
+def make_reply(token_delay_ms):
+    def reply(request):
+        if "response_format" in request:
+            return mock_reply(request)
+        codes = list(dict.fromkeys(HS_CODE.findall(request["messages"][0]["content"])))[:3]
+        text = ("I am Jarvis. Based on your description the closest products in the list are "
+                + ", ".join(f"HS Code: {code}" for code in codes)
+                + ". They look alike but differ in material and dimensions, so please tell me the material and size "
+                  "so that I can give you the exact code. " * 3)
+        if not request.get("stream"):
+            time.sleep(len(text.split()) * token_delay_ms / 1000)
+        return text
+    return reply
+
+
+# 13july.py, 14july.py and 19julybackup.py: the whole catalog in the system message on every call
+class ScriptFlow:
+    def __init__(self, name, script, header_name, model, max_tokens, query_format, send_history, stream):
+        self.name = name
+        self.script = script
+        self.header_name = header_name
+        self.model = model
+        self.max_tokens = max_tokens
+        self.query_format = query_format
+        self.send_history = send_history
+        self.stream = stream
+        self.client = None
+        self.system_prompt = None
+
+    def start(self, conn, client, workdir):
+        self.client = client
+        data = compact_catalog(conn.read(usecols=list(range(5))))
+        header = script_header(os.path.join(HERE, self.script), self.header_name)
+        self.system_prompt = compile_system_prompt(header, data, "indonesian", catalog_version(data)).text
+
+    def new_session(self):
+        return []
+
+    # Returns (source, response) for one query, updating the session history like the script does
+    def ask(self, history, query):
+        history.append({"role": "user", "content": self.query_format.format(query)})
+        conversation = build_context(history) if self.send_history else [{"role": "user", "content": query}]
+        payload = {"model": self.model, "messages": [{"role": "system", "content": self.system_prompt}] + conversation,
+                   "max_tokens": self.max_tokens}
+        try:
+            if self.stream:
+                stream = self.client.stream_chat(payload)
+                for _ in stream:
+                    pass
+                response = stream.as_response()
+            else:
+                response = self.client.chat(payload)
+        except LLMError as e:
+            response = {"error": {"message": str(e)}}
+        history.append({"role": "assistant", "content": response_text(response)})
+        return ("error" if "error" in response else "llm"), response
+
+
+# app.py: snapshot-backed catalog, local matcher, retrieval or cached prefix, structured answers, response cache
+class AppFlow:
+    name = "app"
+    model = "gpt-4o-mini"
+
+    def __init__(self):
+        self.engine = None
+
+    def start(self, conn, client, workdir):
+        sync = CatalogSync(conn, os.path.join(workdir, "catalog.parquet"), usecols=list(range(5)))
+        if not sync.load_snapshot():
+            sync.sync()
+        data, version = sync.current()
+        cache = ResponseCache(os.path.join(workdir, f"responses-{time.time_ns()}.sqlite"), version)
+        self.engine = LookupEngine(data, client, cache, model=self.model, version=version)
+
+    def new_session(self):
+        return None
+
+    def ask(self, session, query):
+        answer = self.engine.classify(query, None, [{"role": "user", "content": f"<user-query>{query}</user-query>"}],
+                                      on_text=lambda text: None)
+        return answer.source, answer.response if answer.source == "llm" else None
+
+
+FLOWS = {
+    "13july": lambda: ScriptFlow("13july", "13july.py", "system_message", "llama3-70b-8192", 2000, "{}", True, True),
+    "14july": lambda: ScriptFlow("14july", "14july.py", "system_message", "gpt-4o", 3000, "{}", False, False),
+    "19julybackup": lambda: ScriptFlow("19julybackup", "19julybackup.py", "initial_system_message", "gpt-4o-mini", 300,
+                                       "<user-query>{}</user-query>", True, False),
+    "app": AppFlow,
+}
+
+
+def run_flow(name, sheet_path, args, workdir):
+    flow = FLOWS[name]()
+    # Only OpenAI serves repeated prompt prefixes from its cache
+    server, base_url = start_mock_server(MockLLMConfig(args.llm_latency_ms, args.llm_latency_ms / 10, reply=make_reply(args.token_delay_ms),
+                                                       seed=0, token_delay_ms=args.token_delay_ms,
+                                                       prefix_cache=flow.model.startswith("gpt"),
+                                                       prefill_ms_per_1k_tokens=args.prefill_ms_per_1k_tokens))
+    client = LLMClient("mock-key", base_url=base_url, max_concurrency=args.sessions)
+    conn = CsvSheetConnection(sheet_path, latency_seconds=args.sheet_latency_ms / 1000)
+
+    start = time.perf_counter()
+    flow.start(conn, client, workdir)
+    cold_start_ms = (time.perf_counter() - start) * 1000
+    # A restart of the same process type; only app.py has a local snapshot to start from
+    restart_ms = None
+    if isinstance(flow, AppFlow):
+        start = time.perf_counter()
+        AppFlow().start(conn, client, workdir)
+        restart_ms = round((time.perf_counter() - start) * 1000, 1)
+
+    latencies = []
+    sources = {}
+    usages = []
+    lock = threading.Lock()
+    data = make_catalog(args.catalog_rows)
+
+    def session(number):
+        state = flow.new_session()
+        for query, _ in query_mix(data, args.queries_per_session, seed=number):
+            begin = time.perf_counter()
+            source, response = flow.ask(state, query)
+            elapsed = (time.perf_counter() - begin) * 1000
+            with lock:
+                latencies.append(elapsed)
+                sources[source] = sources.get(source, 0) + 1
+                if response and response.get("usage"):
+                    usages.append(response["usage"])
+
+    threads = [threading.Thread(target=session, args=(number,)) for number in range(args.sessions)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    client.close()
+    server.shutdown()
+
+    queries = len(latencies)
+    config = server.config
+    prompt_tokens = sum(usage.get("prompt_tokens", 0) for usage in usages)
+    return {
+        "flow": name,
+        "model": flow.model,
+        "cold_start_ms": round(cold_start_ms, 1),
+        "restart_ms": restart_ms,
+        "queries": queries,
+        "throughput_qps": round(queries / elapsed, 2),
+        "p50_ms": round(statistics.median(latencies), 1),
+        "p95_ms": round(statistics.quantiles(latencies, n=20)[-1], 1),
+        "llm_requests": config.requests,
+        "payload_kb_per_query": round(config.bytes_received / queries / 1024, 1),
+        "prompt_tokens_per_query": round(prompt_tokens / queries, 1),
+        "cached_prompt_share": round(sum((u.get("prompt_tokens_details") or {}).get("cached_tokens", 0) for u in usages)
+                                     / prompt_tokens, 3) if prompt_tokens else 0.0,
+        "output_tokens_per_query": round(sum(usage.get("completion_tokens", 0) for usage in usages) / queries, 1),
+        "over_context_requests": sum(usage.get("prompt_tokens", 0) > CONTEXT_WINDOWS[flow.model] for usage in usages),
+        "usd_per_1k_queries": round(sum(cost(flow.model, usage) for usage in usages) / queries * 1000, 4),
+        "sources": sources,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=HERE).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start, latency, payload size, cost and throughput of every front end, headless")
+    parser.add_argument("--flows", nargs="+", default=list(FLOWS), choices=list(FLOWS))
+    parser.add_argument("--catalog-rows", type=int, default=150)
+    parser.add_argument("--sessions", type=int, default=10, help="concurrent sessions")
+    parser.add_argument("--queries-per-session", type=int, default=10)
+    parser.add_argument("--llm-latency-ms", type=float, default=300.0)
+    parser.add_argument("--token-delay-ms", type=float, default=5.0)
+    parser.add_argument("--prefill-ms-per-1k-tokens", type=float, default=20.0)
+    parser.add_argument("--sheet-latency-ms", type=float, default=500.0)
+    parser.add_argument("--output", help="append the results as one JSON line to this file")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        sheet_path = os.path.join(workdir, "sheet.csv")
+        make_catalog(args.catalog_rows).to_csv(sheet_path, index=False)
+        for name in args.flows:
+            results.append(run_flow(name, sheet_path, args, workdir))
+
+    record = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "json")},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "a") as f:
+            f.write(json.dumps(record) + "\n")
+    if args.json:
+        print(json.dumps(record))
+        return
+    for result in results:
+        print("  ".join(f"{key}={value}" for key, value in result.items()))
+
+
+if __name__ == "__main__":
+    main()
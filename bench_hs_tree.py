@@ -0,0 +1,94 @@
+import argparse
+import json
+import statistics
+import time
+
+from bench_matcher import query_mix
+from engine import LookupEngine
+from hs_tree import HSTree, hs_digits
+from prompt import count_tokens, render_catalog
+from synthetic_catalog import make_catalog
+
+PREFIXES = ["73", "7318", "731815", "73181590", "84", "8413", "4016"]
+
+
+def ms(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+# Prefix lookups and per-chapter counts: the tree against scanning the HS Code column
+def lookups(data, repeat):
+    start = time.perf_counter()
+    tree = HSTree(data)
+    build_ms = (time.perf_counter() - start) * 1000
+    digits = data["HS Code"].map(hs_digits)
+    for prefix in PREFIXES:
+        assert len(tree.rows(prefix)) == int(digits.str.startswith(prefix).sum())
+    return {
+        "tree_build_ms": round(build_ms, 1),
+        "prefix_rows_ms_tree": round(ms(lambda: [tree.rows(prefix) for prefix in PREFIXES], repeat) / len(PREFIXES), 4),
+        "prefix_rows_ms_scan": round(ms(lambda: [data.index[digits.str.startswith(prefix)] for prefix in PREFIXES], repeat) / len(PREFIXES), 4),
+        "chapter_counts_ms_tree": round(ms(tree.chapters, repeat), 4),
+        "chapter_counts_ms_scan": round(ms(lambda: digits.str[:2].value_counts(), repeat), 4),
+    }
+
+
+# Rows sent to the model per query: the flat top k, or narrowed to one chapter when the query falls in it
+def narrowing(data, queries, top_k, chapter_top_k):
+    engine = LookupEngine(data, None, top_k=top_k, chapter_top_k=chapter_top_k, prefix_max_tokens=0)
+    reports = []
+    for layout in ("flat", "chapter"):
+        tokens, recall, precision, chapters, narrowed = [], [], [], [], 0
+        for query, expected in queries:
+            if layout == "flat":
+                positions, prefix = engine.index.search(query, top_k), None
+            else:
+                positions, prefix = engine.candidate_rows(query)
+            narrowed += prefix is not None
+            rows = data.iloc[positions]
+            tokens.append(count_tokens(render_catalog(rows, "english", with_ids=True)))
+            chapters.append(rows["HS Code"].str[:2].nunique())
+            if expected is not None and len(rows):
+                codes = rows["HS Code"].tolist()
+                recall.append(expected in codes)
+                precision.append(codes.count(expected) / len(codes))
+        reports.append({
+            "layout": layout,
+            "rows_sent": top_k if layout == "flat" else f"{top_k}/{chapter_top_k}",
+            "narrowed_share": round(narrowed / len(queries), 3),
+            "product_tokens": round(statistics.mean(tokens), 1),
+            "chapters_per_prompt": round(statistics.mean(chapters), 2),
+            "expected_code_sent": round(statistics.mean(recall), 3),
+            "rows_with_expected_code": round(statistics.mean(precision), 3),
+        })
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HS prefix tree: lookups vs column scans, and prompt narrowing to one chapter")
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--top-k", type=int, default=25)
+    parser.add_argument("--chapter-top-k", type=int, nargs="+", default=[25, 15, 10])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    data = make_catalog(args.rows)
+    queries = query_mix(data, args.queries, seed=3)
+    report = {"lookups": lookups(data, args.repeat), "narrowing": []}
+    for chapter_top_k in args.chapter_top_k:
+        report["narrowing"].extend(narrowing(data, queries, args.top_k, chapter_top_k)[chapter_top_k != args.chapter_top_k[0]:])
+    if args.json:
+        print(json.dumps(report))
+        return
+    print("  ".join(f"{key}={value}" for key, value in report["lookups"].items()))
+    for row in report["narrowing"]:
+        print("  ".join(f"{key}={value}" for key, value in row.items()))
+
+
+if __name__ == "__main__":
+    main()
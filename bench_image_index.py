@@ -0,0 +1,148 @@
+import argparse
+import io
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageEnhance
+
+from engine import LookupEngine
+from image_index import IMAGE_MATCH_MAX_DISTANCE, ImageIndex, _to_db, hamming_distances
+from image_pipeline import prepare_image, prepare_images
+from llm_client import LLMClient
+from mock_llm_server import MockLLMConfig, start_mock_server
+from synthetic_catalog import make_catalog
+
+
+# A photo of one part: a few shapes on a background, the same for every call with the same seed
+def part_photo(seed, size=(1200, 900)):
+    rng = random.Random(seed)
+    image = Image.new("RGB", size, tuple(rng.randrange(120, 256) for _ in range(3)))
+    draw = ImageDraw.Draw(image)
+    for _ in range(rng.randrange(3, 7)):
+        x0, y0 = rng.randrange(size[0] - 200), rng.randrange(size[1] - 200)
+        box = [x0, y0, x0 + rng.randrange(80, 600), y0 + rng.randrange(80, 500)]
+        colour = tuple(rng.randrange(0, 200) for _ in range(3))
+        (draw.ellipse if rng.random() < 0.5 else draw.rectangle)(box, fill=colour)
+    return image
+
+
+# The same part again: re-cropped, re-scaled, slightly rotated, lit differently and recompressed
+def reshoot(image, rng):
+    width, height = image.size
+    crop = rng.uniform(0.0, 0.12)
+    left, top = rng.uniform(0, crop) * width, rng.uniform(0, crop) * height
+    image = image.crop((left, top, left + (1 - crop) * width, top + (1 - crop) * height))
+    image = image.rotate(rng.uniform(-3, 3), resample=Image.BILINEAR, expand=False, fillcolor=image.getpixel((0, 0)))
+    image = ImageEnhance.Brightness(image).enhance(rng.uniform(0.85, 1.15))
+    scale = rng.uniform(0.4, 1.0)
+    image = image.resize((int(image.width * scale), int(image.height * scale)))
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=rng.randrange(60, 92))
+    return output.getvalue()
+
+
+# Hamming distances between re-shoots of the same part and between different parts
+def separation(parts, shots, thresholds):
+    rng = random.Random(1)
+    hashes = [[prepare_image(reshoot(part_photo(part), rng)).phash for _ in range(shots)] for part in range(parts)]
+    same = [bin(a ^ b).count("1") for shot_hashes in hashes for i, a in enumerate(shot_hashes) for b in shot_hashes[i + 1:]]
+    firsts = [shot_hashes[0] for shot_hashes in hashes]
+    different = [bin(a ^ b).count("1") for i, a in enumerate(firsts) for b in firsts[i + 1:]]
+    return {
+        "same_part_p50_bits": statistics.median(same),
+        "different_parts_p5_bits": float(np.percentile(different, 5)),
+        "thresholds": {threshold: {"reshoots_matched": round(float(np.mean(np.array(same) <= threshold)), 3),
+                                   "false_matches": round(float(np.mean(np.array(different) <= threshold)), 4)}
+                       for threshold in thresholds},
+    }
+
+
+# Nearest-neighbour lookups and start-up load time as the index grows
+def search_speed(size, directory, lookups=200):
+    path = os.path.join(directory, f"images-{size}.sqlite")
+    rng = np.random.default_rng(size)
+    stored = rng.integers(0, 2 ** 63, size, dtype=np.int64).astype(np.uint64) * np.uint64(2) + rng.integers(0, 2, size).astype(np.uint64)
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE images (phash INTEGER PRIMARY KEY, hs_code TEXT, row INTEGER, product_name TEXT, confirmations INTEGER, updated REAL)")
+    db.executemany("INSERT OR IGNORE INTO images VALUES (?, '7326.90.99', 0, 'Hose Clamp', 1, 0)", ((_to_db(int(h)),) for h in stored))
+    db.commit()
+    db.close()
+
+    start = time.perf_counter()
+    index = ImageIndex(path)
+    load_ms = (time.perf_counter() - start) * 1000
+    queries = [int(stored[i]) ^ (1 << int(rng.integers(64))) for i in rng.integers(0, size, lookups)]
+    start = time.perf_counter()
+    found = sum(index.nearest(query) is not None for query in queries)
+    search_ms = (time.perf_counter() - start) * 1000 / lookups
+    start = time.perf_counter()
+    hamming_distances(index._hashes[:len(index)], queries[0])
+    scan_ms = (time.perf_counter() - start) * 1000
+    return {"images": len(index), "load_ms": round(load_ms, 1), "nearest_ms": round(search_ms, 3),
+            "scan_only_ms": round(scan_ms, 3), "near_duplicates_found": f"{found}/{lookups}"}
+
+
+# Image-only uploads (each part photographed several times) through the engine, against a mock vision model
+# that knows which part each photo shows
+def end_to_end(parts, shots, directory, use_index):
+    data = make_catalog(40)
+    rng = random.Random(2)
+    uploads = [(part, reshoot(part_photo(part), rng)) for _ in range(shots) for part in range(parts)]
+    row_of_photo = {}
+    for part, photo in uploads:
+        row_of_photo[prepare_images([photo])[0].data_url] = part % len(data)
+
+    def vision_reply(request):
+        image = request["messages"][-1]["content"][0]["image_url"]["url"]
+        row = row_of_photo[image]
+        return json.dumps({"candidates": [{"row": row, "hs_code": data["HS Code"].iat[row], "confidence": 0.9}], "note": ""})
+
+    server, base_url = start_mock_server(MockLLMConfig(300.0, 30.0, reply=vision_reply, seed=0, token_delay_ms=0.0))
+    client = LLMClient("mock-key", base_url=base_url)
+    index = ImageIndex(os.path.join(directory, f"e2e-{use_index}.sqlite")) if use_index else None
+    engine = LookupEngine(data, client, image_index=index)
+    latencies, correct, sources = [], 0, {}
+    for part, photo in uploads:
+        start = time.perf_counter()
+        answer = engine.classify(None, prepare_images([photo]))
+        latencies.append((time.perf_counter() - start) * 1000)
+        correct += answer.hs_code == data["HS Code"].iat[part % len(data)]
+        sources[answer.source] = sources.get(answer.source, 0) + 1
+    client.close()
+    server.shutdown()
+    return {"image_index": use_index, "uploads": len(uploads), "vision_calls": server.config.requests,
+            "correct": round(correct / len(uploads), 3), "p50_ms": round(statistics.median(latencies), 1),
+            "mean_ms": round(statistics.mean(latencies), 1), "sources": sources}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perceptual-hash image index: match quality, search speed and vision calls saved")
+    parser.add_argument("--parts", type=int, default=40)
+    parser.add_argument("--shots", type=int, default=5, help="photos of each part")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--thresholds", type=int, nargs="+", default=[6, 8, IMAGE_MATCH_MAX_DISTANCE, 12, 14])
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        report = {
+            "separation": separation(args.parts, args.shots, args.thresholds),
+            "search": [search_speed(size, directory) for size in args.sizes],
+            "end_to_end": [end_to_end(args.parts, args.shots, directory, use_index) for use_index in (False, True)],
+        }
+    if args.json:
+        print(json.dumps(report))
+        return
+    print(json.dumps(report["separation"]))
+    for row in report["search"] + report["end_to_end"]:
+        print("  ".join(f"{key}={value}" for key, value in row.items()))
+
+
+if __name__ == "__main__":
+    main()
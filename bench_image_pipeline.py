@@ -0,0 +1,71 @@
+import argparse
+import base64
+import io
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from image_pipeline import prepare_images
+
+PHOTO_SIZES = [(4000, 3000), (3024, 4032), (1920, 1080), (640, 480)]
+
+
+# Photo-like test image: gradient plus sensor noise, so JPEG sizes resemble real phone shots
+def synthetic_photo(width, height, seed=0):
+    rng = np.random.default_rng(seed)
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    pixels = gradient + rng.normal(0, 20, (height, width, 3)).astype(np.float32)
+    output = io.BytesIO()
+    Image.fromarray(pixels.clip(0, 255).astype(np.uint8)).save(output, format="JPEG", quality=92)
+    return output.getvalue()
+
+
+# The previous path: write the upload to a temp file, read it back and base64 the original
+def temp_file_encode(buffers, directory):
+    encoded = []
+    for i, buffer in enumerate(buffers):
+        path = os.path.join(directory, f"temp_image_{i}.png")
+        with open(path, "wb") as f:
+            f.write(buffer)
+        with open(path, "rb") as f:
+            encoded.append(base64.b64encode(f.read()).decode("utf-8"))
+    return encoded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Image payload bytes and encode time: temp files vs. in-memory pipeline")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for width, height in PHOTO_SIZES:
+            photo = synthetic_photo(width, height)
+            buffers = [photo, photo]  # the same photo uploaded twice
+
+            start = time.perf_counter()
+            old = temp_file_encode(buffers, directory)
+            old_ms = (time.perf_counter() - start) * 1000
+
+            start = time.perf_counter()
+            new = prepare_images(buffers)
+            new_ms = (time.perf_counter() - start) * 1000
+
+            result = {
+                "photo": f"{width}x{height}",
+                "upload_bytes": len(photo),
+                "old_payload_bytes": sum(len(encoded) for encoded in old),
+                "old_encode_ms": round(old_ms, 2),
+                "new_payload_bytes": sum(image.bytes_out for image in new),
+                "new_encode_ms": round(new_ms, 2),
+                "sent_size": f"{new[0].width}x{new[0].height}",
+                "detail": new[0].detail,
+            }
+            print(json.dumps(result) if args.json else "  ".join(f"{key}={value}" for key, value in result.items()))
+
+
+if __name__ == "__main__":
+    main()
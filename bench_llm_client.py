@@ -0,0 +1,62 @@
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+from llm_client import LLMClient, LLMError
+from mock_llm_server import MockLLMConfig, start_mock_server
+
+
+async def run(client, n_requests, model):
+    latencies = []
+    failures = 0
+
+    async def one(i):
+        nonlocal failures
+        start = time.perf_counter()
+        try:
+            response = await client.achat({"model": model, "messages": [{"role": "user", "content": f"query {i}"}], "max_tokens": 300})
+            if "error" in response:
+                failures += 1
+        except LLMError:
+            failures += 1
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(n_requests)))
+    elapsed = time.perf_counter() - start
+    await client.aclose()
+    return latencies, failures, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput of the pooled LLM client against the local mock server")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8, help="in-flight request cap")
+    parser.add_argument("--latency-ms", type=float, default=200.0)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.05)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    server, base_url = start_mock_server(MockLLMConfig(args.latency_ms, 20.0, args.error_rate, args.rate_limit_rate, seed=0))
+    client = LLMClient("mock-key", base_url=base_url, max_concurrency=args.concurrency, backoff_seconds=0.05)
+    latencies, failures, elapsed = asyncio.run(run(client, args.requests, "gpt-4o-mini"))
+    server.shutdown()
+
+    report = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "throughput_rps": round(args.requests / elapsed, 2),
+        "p50_ms": round(statistics.median(latencies), 1),
+        "p95_ms": round(statistics.quantiles(latencies, n=20)[-1], 1),
+        "retries": client.retries,
+        "failures": failures,
+        "upstream_requests": server.config.requests,
+    }
+    print(json.dumps(report) if args.json else "\n".join(f"{key:>18}: {value}" for key, value in report.items()))
+
+
+if __name__ == "__main__":
+    main()
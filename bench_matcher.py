@@ -0,0 +1,63 @@
+import argparse
+import json
+import random
+import statistics
+
+from matcher import MatchStats, ProductMatcher, timed_match
+from synthetic_catalog import make_catalog
+
+VAGUE_QUERIES = ["pump", "screw", "something for pipes", "rubber part", "what code is a motor", "stainless steel part"]
+
+
+# Mix of exact names, reworded/partial names and vague questions, labelled with the expected HS code
+def query_mix(data, n_queries, seed=0):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(n_queries):
+        row = data.iloc[rng.randrange(len(data))]
+        name = row["Product Name"].split("#")[0].strip()
+        kind = rng.random()
+        if kind < 0.4:
+            queries.append((f"HS code for {name}", row["HS Code"]))
+        elif kind < 0.8:
+            words = name.split()
+            rng.shuffle(words)
+            queries.append((" ".join(words[:max(2, len(words) - 1)]).lower(), row["HS Code"]))
+        else:
+            queries.append((rng.choice(VAGUE_QUERIES), None))
+    return queries
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local matcher hit rate and latency")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    data = make_catalog(args.rows)
+    matcher = ProductMatcher(data)
+    stats = MatchStats()
+    latencies = []
+    correct = 0
+    for query, expected in query_mix(data, args.queries):
+        match, seconds = timed_match(matcher, query)
+        hit = bool(match and match.confident)
+        stats.record(hit, seconds)
+        latencies.append(seconds * 1000)
+        if hit and match.hs_code == expected:
+            correct += 1
+
+    report = stats.report()
+    report["hit_precision"] = correct / report["local_hits"] if report["local_hits"] else 0.0
+    report["p50_ms"] = statistics.median(latencies)
+    report["p95_ms"] = statistics.quantiles(latencies, n=20)[-1]
+    if args.json:
+        print(json.dumps(report))
+    else:
+        for key, value in report.items():
+            print(f"{key:>14}: {value:.3f}" if isinstance(value, float) else f"{key:>14}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+import argparse
+import json
+import time
+
+from prompt import compile_system_prompt, count_tokens, render_catalog
+from synthetic_catalog import make_catalog
+
+
+# The per-rerun string building the scripts used before the prompt was compiled
+def render_iterrows(data):
+    text = ""
+    for index, row in data.iterrows():
+        text += f"{row['Product Name']}* Definition: {row['Definition']}* Material: {row['Material']}* HS Code: {row['HS Code']}* Specifications: {row['Specifications']}\n"
+    return text
+
+
+def timed_ms(function):
+    start = time.perf_counter()
+    function()
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="System prompt build time: iterrows loop vs. vectorized render vs. compiled cache")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        data = make_catalog(size)
+        compiled_first_ms = timed_ms(lambda: compile_system_prompt("Product List:\n", data))
+        result = {
+            "catalog_rows": size,
+            "iterrows_ms": round(timed_ms(lambda: render_iterrows(data)), 2),
+            "vectorized_ms": round(timed_ms(lambda: render_catalog(data)), 2),
+            "compile_first_ms": round(compiled_first_ms, 2),
+            "compile_cached_ms": round(timed_ms(lambda: compile_system_prompt("Product List:\n", data)), 3),
+            "prompt_tokens": count_tokens(render_catalog(data)),
+        }
+        print(json.dumps(result) if args.json else "  ".join(f"{key}={value}" for key, value in result.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import argparse
+import json
+import subprocess
+import sys
+
+from bench_image_pipeline import synthetic_photo
+from bench_matcher import VAGUE_QUERIES
+from engine import PREFIX_CATALOG_MAX_TOKENS, LookupEngine, prefix_digest
+from image_pipeline import prepare_images
+from llm_client import LLMClient
+from mock_llm_server import MockLLMConfig, start_mock_server
+from prompt import render_catalog
+from synthetic_catalog import PRODUCT_TYPES, make_catalog
+
+HISTORY = [
+    {"role": "user", "content": "<user-query>what is the hs code for a hose clamp</user-query>"},
+    {"role": "assistant", "content": '{"candidates":[{"row":0,"hs_code":"7326.90.99"}]}'},
+]
+
+
+def queries(n):
+    return [f"{VAGUE_QUERIES[i % len(VAGUE_QUERIES)]} like a {PRODUCT_TYPES[i % len(PRODUCT_TYPES)][0].lower()}" for i in range(n)]
+
+
+# Prefix digests of text, image and follow-up requests, grouped by the kind of static prefix they should share
+def digests(rows, n_queries):
+    engine = LookupEngine(make_catalog(rows), None)
+    image = prepare_images([synthetic_photo(640, 480)])
+    by_kind = {"text": set(), "image_only": set()}
+    for query in queries(n_queries):
+        by_kind["text"].add(prefix_digest(engine._request(query, None, None)[1]))
+        by_kind["text"].add(prefix_digest(engine._request(query, HISTORY + [{"role": "user", "content": query}], image)[1]))
+    by_kind["image_only"].add(prefix_digest(engine._request(None, [], image)[1]))
+    by_kind["image_only"].add(prefix_digest(engine._request(None, HISTORY, image)[1]))
+    if engine.catalog_in_prefix:
+        by_kind = {"all": by_kind["text"] | by_kind["image_only"]}
+    return {kind: sorted(values) for kind, values in by_kind.items()}
+
+
+# Check that the static prefix is byte-identical across requests in this process and in a fresh one
+def check(rows, n_queries):
+    local = digests(rows, n_queries)
+    for kind, values in local.items():
+        if len(values) != 1:
+            sys.exit(f"{rows} rows: {len(values)} different {kind} prefixes across requests")
+    other = subprocess.run([sys.executable, __file__, "--digests", str(rows), "--queries", str(n_queries)],
+                           capture_output=True, text=True, check=True)
+    if json.loads(other.stdout) != local:
+        sys.exit(f"{rows} rows: prefix differs between processes")
+    return local
+
+
+# Old layout for comparison: the retrieved rows, in score order, inside the system message
+def per_query_system_prompt(engine, query):
+    return engine.header + render_catalog(engine.index.top_rows(query, engine.top_k), "english", with_ids=True)
+
+
+def cached_share(rows, n_queries, layout):
+    server, base_url = start_mock_server(MockLLMConfig(5.0, 1.0, reply='{"candidates": [], "note": ""}', prefix_cache=True))
+    client = LLMClient("mock-key", base_url=base_url)
+    engine = LookupEngine(make_catalog(rows), client, prefix_max_tokens=10 ** 9 if layout == "full_prefix" else 0)
+    for query in queries(n_queries):
+        if layout == "per_query_system":
+            payload = engine.build_payload(per_query_system_prompt(engine, query), [{"role": "user", "content": query}])
+            engine.usage_stats.record(client.chat(payload))
+        else:
+            engine.classify(query)
+    client.close()
+    server.shutdown()
+    usage = engine.usage_stats.report()
+    default = "full_prefix" if engine.full_prompt.token_count <= PREFIX_CATALOG_MAX_TOKENS else "retrieval_after_prefix"
+    return {"rows": rows, "layout": layout, "default": layout == default, "prompt_tokens": usage["prompt_tokens"],
+            "cached_prompt_tokens": usage["cached_prompt_tokens"], "uncached_prompt_tokens": usage["uncached_prompt_tokens"],
+            "cached_share": round(usage["cached_share"], 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Static prompt prefix: byte-identical check and cached prompt tokens against the mock")
+    parser.add_argument("--rows", type=int, nargs="+", default=[40, 2000])
+    parser.add_argument("--queries", type=int, default=30)
+    parser.add_argument("--digests", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    if args.digests:
+        print(json.dumps(digests(args.digests, args.queries)))
+        return
+
+    for rows in args.rows:
+        check(rows, args.queries)
+    reports = [cached_share(rows, args.queries, layout) for rows in args.rows
+               for layout in ("per_query_system", "retrieval_after_prefix", "full_prefix")]
+    if args.json:
+        print(json.dumps(reports))
+        return
+    print(f"static prefix identical across requests and processes for {', '.join(map(str, args.rows))} rows")
+    for report in reports:
+        print("  ".join(f"{key}={value}" for key, value in report.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+import argparse
+import json
+import statistics
+import time
+
+from prompt import count_tokens, render_catalog
+from retrieval import CatalogIndex
+from synthetic_catalog import make_catalog, sample_queries
+
+# Upstream latency model used for the end-to-end estimate: fixed round trip plus prompt processing time
+UPSTREAM_BASE_MS = 400.0
+UPSTREAM_MS_PER_1K_PROMPT_TOKENS = 60.0
+
+
+def run(sizes, top_k, n_queries):
+    results = []
+    for size in sizes:
+        data = make_catalog(size)
+        queries = sample_queries(data, n_queries)
+
+        start = time.perf_counter()
+        index = CatalogIndex(data)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        full_prompt = render_catalog(data)
+        full_tokens = count_tokens(full_prompt)
+
+        local_ms = []
+        prompt_tokens = []
+        for query in queries:
+            start = time.perf_counter()
+            prompt = render_catalog(index.top_rows(query, top_k))
+            local_ms.append((time.perf_counter() - start) * 1000)
+            prompt_tokens.append(count_tokens(prompt))
+
+        retrieval_tokens = statistics.mean(prompt_tokens)
+        retrieval_ms = statistics.median(local_ms)
+        results.append({
+            "catalog_rows": size,
+            "index_build_ms": round(build_ms, 2),
+            "full_prompt_tokens": full_tokens,
+            "topk_prompt_tokens": round(retrieval_tokens, 1),
+            "retrieval_p50_ms": round(retrieval_ms, 3),
+            "full_e2e_ms": round(UPSTREAM_BASE_MS + full_tokens / 1000 * UPSTREAM_MS_PER_1K_PROMPT_TOKENS, 1),
+            "topk_e2e_ms": round(retrieval_ms + UPSTREAM_BASE_MS + retrieval_tokens / 1000 * UPSTREAM_MS_PER_1K_PROMPT_TOKENS, 1),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt size and latency of top-k retrieval vs. the full catalog")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 5000, 20000])
+    parser.add_argument("--top-k", type=int, default=25)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--json", action="store_true", help="print results as JSON lines")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.top_k, args.queries)
+    if args.json:
+        for result in results:
+            print(json.dumps(result))
+        return
+    header = list(results[0].keys())
+    print("  ".join(f"{name:>20}" for name in header))
+    for result in results:
+        print("  ".join(f"{result[name]:>20}" for name in header))
+
+
+if __name__ == "__main__":
+    main()
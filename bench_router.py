@@ -0,0 +1,86 @@
+import argparse
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from llm_client import LLMClient, LLMError
+from mock_llm_server import MockLLMConfig, start_mock_server
+from router import Provider, ProviderRouter
+
+IMAGE_PART = {"type": "image_url", "image_url": {"url": "data:image/jpeg;base64,AAAA", "detail": "low"}}
+
+
+def payload(i, vision):
+    content = [IMAGE_PART] if vision else f"<user-query>query {i}</user-query>"
+    return {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": content}], "max_tokens": 100}
+
+
+def run(client, n_requests, concurrency, vision_share):
+    latencies = []
+    failures = 0
+
+    def one(i):
+        nonlocal failures
+        start = time.perf_counter()
+        try:
+            response = client.chat(payload(i, i % round(1 / vision_share) == 0 if vision_share else False))
+            failures += "error" in response
+        except LLMError:
+            failures += 1
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, range(n_requests)))
+    elapsed = time.perf_counter() - start
+    return {
+        "throughput_rps": round(n_requests / elapsed, 2),
+        "p50_ms": round(statistics.median(latencies), 1),
+        "p95_ms": round(statistics.quantiles(latencies, n=20)[-1], 1),
+        "p99_ms": round(statistics.quantiles(latencies, n=100)[-1], 1),
+        "failures": failures,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Provider router against two fake backends with different latency profiles")
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--vision-share", type=float, default=0.2, help="share of requests carrying an image")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    # "openai": slower but steady and vision-capable; "groq": fast text-only, with latency spikes and errors
+    openai_server, openai_url = start_mock_server(MockLLMConfig(300.0, 30.0, error_rate=0.01, seed=1))
+    groq_server, groq_url = start_mock_server(MockLLMConfig(80.0, 10.0, error_rate=0.05, seed=2, spike_rate=0.04, spike_ms=1500.0))
+
+    def providers():
+        return [Provider("openai", LLMClient("mock-key", base_url=openai_url, max_retries=0), vision=True),
+                Provider("groq", LLMClient("mock-key", base_url=groq_url, max_retries=0), "llama3-70b-8192", json_schema=False)]
+
+    reports = {}
+    for name, hedge in (("openai_only", None), ("router_no_hedge", False), ("router_hedged", True)):
+        openai_server.config.requests = groq_server.config.requests = 0
+        if hedge is None:
+            client = LLMClient("mock-key", base_url=openai_url, max_retries=0)
+            report = run(client, args.requests, args.concurrency, args.vision_share)
+        else:
+            client = ProviderRouter(providers(), hedge=hedge)
+            report = run(client, args.requests, args.concurrency, args.vision_share)
+            report.update(hedges=client.hedges, failovers=client.failovers)
+        report.update(openai_requests=openai_server.config.requests, groq_requests=groq_server.config.requests)
+        client.close()
+        reports[name] = report
+    openai_server.shutdown()
+    groq_server.shutdown()
+
+    if args.json:
+        print(json.dumps(reports))
+        return
+    for name, report in reports.items():
+        print(f"{name:>16}: " + "  ".join(f"{key}={value}" for key, value in report.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import argparse
+import importlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+# Cold start of app.py, headless: each run is a fresh interpreter that imports what the script imports
+# before st.title and then loads the catalog, against a CSV stand-in for the sheet. Streamlit itself is
+# left out; the sheet connection and the OpenAI SDK are counted when they are installed.
+
+# Before: everything imported at the top, the catalog and engine built before the title is drawn
+EAGER_IMPORTS = ["pandas", "openai", "streamlit_gsheets", "retrieval", "matcher", "catalog_sync", "llm_client", "router",
+                 "response_cache", "engine", "image_pipeline", "batch"]
+# After: the title is drawn once these are imported; the rest is imported where it is used
+LAZY_IMPORTS = ["rate_limit", "service", "tracing"]
+
+
+def import_all(names):
+    missing = []
+    for name in names:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            missing.append(name)
+    return missing
+
+
+def run_child(mode, sheet_path, workdir, sheet_latency_ms):
+    start = time.perf_counter()
+    missing = import_all(EAGER_IMPORTS if mode == "eager" else LAZY_IMPORTS)
+    import_ms = (time.perf_counter() - start) * 1000
+
+    def make_sync():
+        from catalog_sync import CatalogSync, CsvSheetConnection
+
+        conn = CsvSheetConnection(sheet_path, latency_seconds=sheet_latency_ms / 1000)
+        return CatalogSync(conn, os.path.join(workdir, "catalog.parquet"), usecols=list(range(5))).start()
+
+    if mode == "eager":
+        from engine import LookupEngine
+        from llm_client import LLMClient
+        from response_cache import ResponseCache
+
+        client = LLMClient("mock-key")
+        sync = make_sync()
+        data, version = sync.current()
+        LookupEngine(data, client, ResponseCache(os.path.join(workdir, "responses.sqlite"), version), version=version)
+        first_paint_ms = ready_ms = (time.perf_counter() - start) * 1000
+    else:
+        first_paint_ms = (time.perf_counter() - start) * 1000
+        from llm_client import LLMClient
+        from service import LookupService
+
+        client = LLMClient("mock-key")
+        service = LookupService(make_sync, client, os.path.join(workdir, "responses.sqlite"), "gpt-4o-mini").start()
+        service.wait()
+        ready_ms = (time.perf_counter() - start) * 1000
+        sync = service.sync
+    sync.stop()
+    client.close()
+    return {"import_ms": round(import_ms, 1), "first_paint_ms": round(first_paint_ms, 1), "ready_ms": round(ready_ms, 1),
+            "not_installed": missing}
+
+
+def measure(mode, sheet_path, workdir, args):
+    child = subprocess.run([sys.executable, __file__, "--child", mode, "--sheet", sheet_path, "--workdir", workdir,
+                            "--sheet-latency-ms", str(args.sheet_latency_ms)], capture_output=True, text=True, check=True)
+    return json.loads(child.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time, time to first paint and time to a warm catalog: eager vs lazy startup")
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--sheet-latency-ms", type=float, default=1500.0)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--child", choices=["eager", "lazy"], help=argparse.SUPPRESS)
+    parser.add_argument("--sheet", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child, args.sheet, args.workdir, args.sheet_latency_ms)))
+        return
+
+    from synthetic_catalog import make_catalog
+
+    reports = []
+    with tempfile.TemporaryDirectory() as directory:
+        sheet_path = os.path.join(directory, "sheet.csv")
+        make_catalog(args.rows).to_csv(sheet_path, index=False)
+        for mode in ("eager", "lazy"):
+            # First start reads the sheet; restarts load the Parquet snapshot the first one wrote
+            for start in ("first_start", "restart"):
+                runs = []
+                for repeat in range(args.repeats if start == "restart" else 1):
+                    workdir = os.path.join(directory, mode)
+                    os.makedirs(workdir, exist_ok=True)
+                    runs.append(measure(mode, sheet_path, workdir, args))
+                best = min(runs, key=lambda run: run["first_paint_ms"])
+                reports.append(dict(mode=mode, start=start, **best))
+
+    if args.json:
+        print(json.dumps(reports))
+        return
+    for report in reports:
+        print("  ".join(f"{key}={value}" for key, value in report.items()))
+
+
+if __name__ == "__main__":
+    main()
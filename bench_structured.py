@@ -0,0 +1,74 @@
+import argparse
+import json
+import re
+import statistics
+import time
+
+from engine import LookupEngine
+from llm_client import LLMClient
+from mock_llm_server import MockLLMConfig, start_mock_server
+from synthetic_catalog import PRODUCT_TYPES, make_catalog
+
+PRODUCT_LINE = re.compile(r"^(?:\[(\d+)\] )?([^*\n]+)\* Definition: [^*]*\* Material: ([^*]+)\* HS Code: ([^*]+)\* Specifications: (.*)$", re.M)
+
+
+# Mock model: prose that lists the matching products (what the free-text prompt asks for), or the compact JSON
+def mock_reply(request):
+    system = "".join(m["content"] for m in request["messages"] if m["role"] == "system")
+    products = PRODUCT_LINE.findall(system)[:8]
+    if "response_format" in request:
+        candidates = [{"row": int(row), "hs_code": hs_code, "confidence": round(0.9 - 0.2 * i, 2)}
+                      for i, (row, _, _, hs_code, _) in enumerate(products[:3])]
+        return json.dumps({"candidates": candidates, "note": "Which material is it?"})
+    lines = [f"{i + 1}) {name} made of {material}, HS Code: {hs_code} ({specs})."
+             for i, (_, name, material, hs_code, specs) in enumerate(products)]
+    return ("I am Jarvis. Based on your description these products from the list could match:<br>" + "<br>".join(lines)
+            + "<br>They look alike but differ in material and dimensions, so please tell me which one you have.")
+
+
+def run(data, base_url, queries, structured):
+    client = LLMClient("mock-key", base_url=base_url)
+    engine = LookupEngine(data, client, structured=structured)
+    latencies = []
+    history_chars = []
+    for query in queries:
+        start = time.perf_counter()
+        answer = engine.classify(query, on_text=lambda text: None)
+        latencies.append((time.perf_counter() - start) * 1000)
+        history_chars.append(len(answer.history_content()))
+    client.close()
+    output = engine.usage_stats.report()
+    return {
+        "mode": "structured" if structured else "free_text",
+        "answers": output["answers"],
+        "avg_output_tokens": round(output["avg_output_tokens"], 1),
+        "avg_history_chars": round(statistics.mean(history_chars), 1),
+        "p50_ms": round(statistics.median(latencies), 1),
+        "p95_ms": round(statistics.quantiles(latencies, n=20)[-1], 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Output tokens and latency per answer: free-text vs. structured JSON replies")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=40)
+    parser.add_argument("--token-delay-ms", type=float, default=5.0, help="mock generation time per output word")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    data = make_catalog(args.rows)
+    # Product-type questions are ambiguous across materials, so none of them is answered locally
+    queries = [f"what is the hs code for a {PRODUCT_TYPES[i % len(PRODUCT_TYPES)][0].lower()} variant {i}" for i in range(args.queries)]
+    server, base_url = start_mock_server(MockLLMConfig(50.0, 5.0, reply=mock_reply, seed=0, token_delay_ms=args.token_delay_ms))
+    reports = [run(data, base_url, queries, structured) for structured in (False, True)]
+    server.shutdown()
+
+    if args.json:
+        print(json.dumps(reports))
+        return
+    for report in reports:
+        print("  ".join(f"{key}={value}" for key, value in report.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import json
+import time
+
+from bench_matcher import query_mix
+from bench_structured import mock_reply
+from engine import LookupEngine
+from llm_client import LLMClient
+from mock_llm_server import MockLLMConfig, start_mock_server
+from synthetic_catalog import make_catalog
+from tracing import Tracer, tracer
+
+
+# Cost of entering and leaving one span, in nanoseconds
+def span_ns(enabled, n):
+    local = Tracer(enabled=enabled)
+    start = time.perf_counter_ns()
+    for _ in range(n):
+        with local.span("stage") as span:
+            if span:
+                span.set(tokens=1)
+    return (time.perf_counter_ns() - start) / n
+
+
+# Queries per second through engine.classify, with the process tracer off or on
+def classify_qps(engine, queries, enabled):
+    tracer.enabled = enabled
+    tracer.clear()
+    start = time.perf_counter()
+    for query in queries:
+        engine.classify(query)
+    elapsed = time.perf_counter() - start
+    tracer.enabled = False
+    return len(queries) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tracing overhead: per-span cost and classify throughput with spans off and on")
+    parser.add_argument("--rows", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--spans", type=int, default=200000)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    data = make_catalog(args.rows)
+    queries = [query for query, _ in query_mix(data, args.queries)]
+    # Zero-latency mock, so that the engine's own work dominates
+    server, base_url = start_mock_server(MockLLMConfig(0.0, 0.0, reply=mock_reply, seed=0, token_delay_ms=0.0))
+    client = LLMClient("mock-key", base_url=base_url)
+    engine = LookupEngine(data, client)
+    classify_qps(engine, queries, False)  # warm up the compiled prompt and the connection pool
+
+    # Best of several runs, alternating, to keep machine noise out of a small difference
+    off, on = [], []
+    for _ in range(args.repeats):
+        off.append(classify_qps(engine, queries, False))
+        on.append(classify_qps(engine, queries, True))
+    spans_per_query = len(tracer.spans) / len(queries)
+    report = {
+        "span_ns_disabled": round(span_ns(False, args.spans), 1),
+        "span_ns_enabled": round(span_ns(True, args.spans), 1),
+        "classify_qps_disabled": round(max(off), 1),
+        "classify_qps_enabled": round(max(on), 1),
+        "spans_per_query": round(spans_per_query, 1),
+        "overhead_enabled_pct": round((max(off) / max(on) - 1) * 100, 2),
+        "stages": {name: round(stage["p50_ms"], 3) for name, stage in tracer.report().items()},
+    }
+    client.close()
+    server.shutdown()
+    print(json.dumps(report) if args.json else "\n".join(f"{key:>22}: {value}" for key, value in report.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+import pandas as pd
+
+# Text columns with at most this share of distinct values are stored as categoricals (one copy of each
+# distinct string plus small integer codes); the rest become Arrow-backed strings instead of Python objects
+# when they have no missing values
+MAX_CATEGORY_SHARE = 0.5
+
+try:
+    import pyarrow  # noqa: F401
+    COMPACT_STRING_DTYPE = "string[pyarrow]"
+except ImportError:
+    COMPACT_STRING_DTYPE = None
+
+
+def _is_text(values):
+    return values.dtype == object or isinstance(values.dtype, pd.StringDtype)
+
+
+# Compact columnar copy of the sheet, shared read-only by every session in the process.
+# Values (and therefore row hashes, the catalog version and the rendered prompt) are unchanged.
+def compact_catalog(data):
+    if data.empty:
+        return data
+    columns = {}
+    for column in data.columns:
+        values = data[column]
+        if _is_text(values):
+            if values.nunique(dropna=True) <= MAX_CATEGORY_SHARE * len(values):
+                values = values.astype("category")
+            elif COMPACT_STRING_DTYPE is not None and not values.isna().any():
+                # Arrow strings would turn missing values into pd.NA, which renders differently
+                values = values.astype(COMPACT_STRING_DTYPE)
+        columns[column] = values.array
+    return pd.DataFrame(columns, index=pd.RangeIndex(len(data)))
+
+
+# Rows numbered 0..n-1, without copying frames that already are
+def positional(data):
+    index = data.index
+    if isinstance(index, pd.RangeIndex) and index.start == 0 and index.step == 1:
+        return data
+    return data.reset_index(drop=True)
+
+
+def memory_bytes(data):
+    return int(data.memory_usage(deep=True, index=True).sum())
@@ -0,0 +1,166 @@
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from catalog_store import compact_catalog
+from retrieval import catalog_version
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+
+# File-backed stand-in for GSheetsConnection, so the sync can run offline and in benchmarks
+class CsvSheetConnection:
+    def __init__(self, path, latency_seconds=0.0):
+        self.path = path
+        self.latency_seconds = latency_seconds
+
+    def read(self, spreadsheet=None, usecols=None, worksheet=None, ttl=None):
+        if self.latency_seconds:
+            time.sleep(self.latency_seconds)
+        return pd.read_csv(self.path, usecols=usecols)
+
+
+def row_hashes(data):
+    return pd.util.hash_pandas_object(data, index=False).to_numpy()
+
+
+class SyncResult:
+    __slots__ = ("changed", "added", "removed", "seconds")
+
+    def __init__(self, changed, added, removed, seconds):
+        self.changed = changed
+        self.added = added
+        self.removed = removed
+        self.seconds = seconds
+
+    def __bool__(self):
+        return bool(self.changed or self.added or self.removed)
+
+
+# Keeps a local Parquet snapshot of the sheet and brings it up to date from the connection.
+# Every poll reads the whole sheet and compares row hashes (rows are identified by their position). When no
+# hash changed nothing is written; otherwise the sheet as read replaces the catalog and the snapshot file is
+# rewritten in full (Parquet has no in-place update). The changed/added/removed rows are only reported.
+# .data is a compact frame shared read-only by every session; updates swap in a new frame, never edit it.
+class CatalogSync:
+    def __init__(self, conn, snapshot_path, spreadsheet=None, worksheet=None, usecols=None, interval_seconds=60):
+        self.conn = conn
+        self.snapshot_path = snapshot_path
+        self.spreadsheet = spreadsheet
+        self.worksheet = worksheet
+        self.usecols = usecols
+        self.interval_seconds = interval_seconds
+        self.data = pd.DataFrame()
+        self.hashes = np.array([], dtype=np.uint64)
+        self.version = catalog_version(self.data)
+        self.last_sync = None
+        self.last_error = None
+        self.snapshot_mtime = None
+        self.poll_sheet = True
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def load_snapshot(self):
+        if not os.path.exists(self.snapshot_path):
+            return False
+        mtime = os.path.getmtime(self.snapshot_path)
+        with tracer.span("snapshot.load") as span:
+            data = pd.read_parquet(self.snapshot_path)
+            span.set(rows=len(data))
+        with self._lock:
+            self._set(data)
+            self.snapshot_mtime = mtime
+        return True
+
+    # For processes that do not poll the sheet themselves: pick up a snapshot written by another process
+    def reload_if_changed(self):
+        if not os.path.exists(self.snapshot_path) or os.path.getmtime(self.snapshot_path) == self.snapshot_mtime:
+            return False
+        return self.load_snapshot()
+
+    def _set(self, data):
+        data = compact_catalog(data)
+        self.data = data
+        self.hashes = row_hashes(data) if not data.empty else np.array([], dtype=np.uint64)
+        self.version = catalog_version(data, self.hashes)
+
+    def _write_snapshot(self, data):
+        directory = os.path.dirname(self.snapshot_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{self.snapshot_path}.{os.getpid()}.tmp"
+        data.to_parquet(temporary, index=False)
+        os.replace(temporary, self.snapshot_path)
+        self.snapshot_mtime = os.path.getmtime(self.snapshot_path)
+
+    def sync(self):
+        start = time.perf_counter()
+        with tracer.span("sheet.read") as span:
+            remote = self.conn.read(spreadsheet=self.spreadsheet, usecols=self.usecols, worksheet=self.worksheet, ttl=0)
+            span.set(rows=len(remote))
+        remote = remote.reset_index(drop=True)
+        remote_hashes = row_hashes(remote) if not remote.empty else np.array([], dtype=np.uint64)
+
+        with self._lock:
+            current = self.data
+            if list(current.columns) != list(remote.columns):
+                # Schema change: nothing to diff against, take the whole sheet
+                changed, added, removed = [], list(range(len(remote))), list(range(len(remote), len(current)))
+                updated = remote
+            else:
+                shared = min(len(current), len(remote))
+                changed = np.flatnonzero(self.hashes[:shared] != remote_hashes[:shared]).tolist()
+                added = list(range(shared, len(remote)))
+                removed = list(range(shared, len(current)))
+                # The remote frame holds every changed and added row in place, so it becomes the new catalog
+                updated = remote if changed or added or removed else current
+
+            result = SyncResult(changed, added, removed, time.perf_counter() - start)
+            if result:
+                self._write_snapshot(updated)
+                self._set(updated)
+            self.last_sync = time.time()
+            self.last_error = None
+        return result
+
+    def _poll(self):
+        while not self._stop.wait(self.interval_seconds):
+            try:
+                if not self.poll_sheet:
+                    self.reload_if_changed()
+                    continue
+                result = self.sync()
+                if result:
+                    logger.info("Catalog sync: %d changed, %d added, %d removed rows",
+                                len(result.changed), len(result.added), len(result.removed))
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning("Catalog sync failed: %s", e)
+
+    # Load the snapshot (or do a first full sync without one) and keep polling in the background.
+    # With poll_sheet=False the thread only reloads the snapshot when another process rewrites it.
+    def start(self, poll_sheet=True):
+        self.poll_sheet = poll_sheet
+        if not self.load_snapshot():
+            self.sync()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._poll, name="catalog-sync", daemon=True)
+            self._thread.start()
+        return self
+
+    # Data and version of the same catalog, even while the poller swaps in a new one
+    def current(self):
+        with self._lock:
+            return self.data, self.version
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
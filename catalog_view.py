@@ -0,0 +1,45 @@
+import numpy as np
+
+from hs_tree import hs_digits
+
+# Server-side catalog browser: filters run against the engine's shared index and HS tree, and only the
+# rows of the visible page are handed to st.dataframe. The whole (filtered) sheet leaves the server only
+# when it is exported.
+
+PAGE_SIZES = (25, 50, 100, 250)
+MATERIAL_COLUMN = "Material"
+
+
+def material_options(data):
+    if MATERIAL_COLUMN not in data.columns:
+        return []
+    values = data[MATERIAL_COLUMN]
+    if hasattr(values, "cat"):
+        return [str(value) for value in values.cat.categories]
+    return sorted(str(value) for value in values.dropna().unique())
+
+
+# Row positions matching the filters. A search ranks rows by relevance (a search that is an HS code selects
+# the rows under it instead); without one, rows stay in sheet order.
+def filter_rows(engine, search="", materials=(), hs_prefix=""):
+    data = engine.data
+    rows = np.sort(engine.hs_tree.rows(hs_prefix)) if hs_prefix else np.arange(len(data))
+    if materials and MATERIAL_COLUMN in data.columns:
+        rows = rows[data[MATERIAL_COLUMN].isin(materials).to_numpy()[rows]]
+    search = (search or "").strip()
+    if not search:
+        return rows
+    code = hs_digits(search)
+    if code and len(code) >= 2 and not search.strip("0123456789. "):
+        return rows[np.isin(rows, engine.hs_tree.rows(code))]
+    return engine.index.ranked(search, len(rows), rows)[0]
+
+
+def page_count(total, page_size):
+    return max(1, -(-total // page_size))
+
+
+# Rows of one page (1-based) of the filtered positions
+def page_rows(data, rows, page, page_size):
+    start = (min(max(page, 1), page_count(len(rows), page_size)) - 1) * page_size
+    return data.iloc[rows[start:start + page_size]]
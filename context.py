@@ -0,0 +1,91 @@
+import re
+
+from prompt import count_tokens
+
+# HS codes as they appear in answers: 7326.90.99, 7326.90, 73269099
+HS_CODE_PATTERN = re.compile(r"\b\d{4}(?:\.\d{2}){1,3}\b|\b\d{6,10}\b")
+TAG_PATTERN = re.compile(r"</?[a-z-]+>")
+
+# Token budget for the conversation part of the payload (the system prompt is sent separately)
+HISTORY_TOKEN_BUDGET = 1500
+KEEP_TURNS = 3
+MAX_FACTS = 20
+FACT_QUESTION_CHARS = 80
+
+
+def _text(content):
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return " ".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content)
+
+
+def message_tokens(message):
+    return count_tokens(_text(message["content"])) + 4
+
+
+# Split the conversation into turns, each starting at a user message
+def _turns(history):
+    turns = []
+    for message in history:
+        if message["role"] == "system":
+            continue
+        if message["role"] == "user" and (not turns or turns[-1][-1]["role"] != "user"):
+            turns.append([])
+        if not turns:
+            turns.append([])
+        turns[-1].append(message)
+    return turns
+
+
+# "Resolved HS codes so far": one short line per older turn whose answer named a code
+def summarize_turns(turns, max_facts=MAX_FACTS):
+    facts = []
+    for turn in turns:
+        question = " ".join(TAG_PATTERN.sub("", _text(m["content"])).strip() for m in turn if m["role"] == "user")
+        answer = " ".join(_text(m["content"]) for m in turn if m["role"] == "assistant")
+        codes = list(dict.fromkeys(HS_CODE_PATTERN.findall(answer)))
+        if codes:
+            facts.append(f"- {question[:FACT_QUESTION_CHARS]} -> HS {', '.join(codes[:5])}")
+    if not facts:
+        return None
+    facts = facts[-max_facts:]
+    return "Earlier in this conversation (summary, resolved HS codes so far):\n" + "\n".join(facts)
+
+
+def _truncate(message, budget):
+    text = _text(message["content"])
+    while text and count_tokens(text) + 4 > budget:
+        text = text[: len(text) * 3 // 4]
+    return {"role": message["role"], "content": text + " [truncated]"}
+
+
+# Messages to send for a conversation: system messages are dropped (the caller sends the system prompt once),
+# the last keep_turns turns go verbatim and everything older is folded into a summary of resolved codes.
+# Verbatim turns are moved into the summary, oldest first, until the whole thing fits the token budget.
+def build_context(history, budget_tokens=HISTORY_TOKEN_BUDGET, keep_turns=KEEP_TURNS, max_facts=MAX_FACTS):
+    turns = _turns(history)
+    split = max(0, len(turns) - keep_turns)
+    while True:
+        summary = summarize_turns(turns[:split], max_facts)
+        messages = [{"role": "system", "content": summary}] if summary else []
+        for turn in turns[split:]:
+            messages.extend({"role": m["role"], "content": m["content"]} for m in turn)
+        if split >= len(turns) - 1 or sum(message_tokens(m) for m in messages) <= budget_tokens:
+            break
+        split += 1
+
+    # The newest turn alone is still too large: shorten its longest messages
+    total = sum(message_tokens(m) for m in messages)
+    if total > budget_tokens:
+        for i in sorted(range(len(messages)), key=lambda i: -message_tokens(messages[i])):
+            if not isinstance(messages[i]["content"], str):
+                continue
+            excess = total - budget_tokens
+            size = message_tokens(messages[i])
+            messages[i] = _truncate(messages[i], max(16, size - excess))
+            total += message_tokens(messages[i]) - size
+            if total <= budget_tokens:
+                break
+    return messages
@@ -0,0 +1,391 @@
+import asyncio
+import hashlib
+import json
+from collections import deque
+
+from catalog_store import positional
+from hs_tree import HSTree
+from llm_client import LLMError
+from matcher import MatchStats, ProductMatcher, format_match, normalize, timed_match
+from prompt import compile_system_prompt, render_catalog
+from response_cache import cache_key
+from retrieval import CatalogIndex, catalog_version
+from single_flight import SingleFlight
+from structured import MAX_TOKENS, RESPONSE_FORMAT, STRUCTURED_INSTRUCTIONS, Candidate, parse_answer, parse_partial
+from tracing import tracer
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+# Number of candidate product rows sent to the model per query
+TOP_K_PRODUCTS = 25
+# Rows sent once a query has been placed in one HS chapter: look-alikes from other chapters no longer compete
+CHAPTER_TOP_K_PRODUCTS = 15
+
+# Catalogs up to this size go into every request as part of the static, provider-cacheable prefix;
+# larger ones are narrowed to the retrieved rows, sent after the prefix. Cached prompt tokens are billed
+# at half price, so past about twice the size of a retrieval prompt the whole catalog costs more.
+PREFIX_CATALOG_MAX_TOKENS = 3000
+
+# Label of the per-query product rows that follow the conversation
+MATCHING_PRODUCTS_LABEL = "Products from the list matching this query:\n"
+
+# Instructions that precede the product list in the system message
+SYSTEM_MESSAGE_HEADER = """
+You are a virtual assistant providing HS Code information. Be professional and informative.
+Do not make up any details you do not know. Always sound smart and refer to yourself as Jarvis.
+Only output the information given below and nothing else of your own knowledge. This is the only truth. Translate everything to English to the best of your ability.
+and only output when prompted towards something don't dump all the codes into the response.
+*** always make a prediction of what the image could be and be open to be corrected.
+IMPORTANT PRODUCT info:
+some products could look the same in image but could vary in materials and dimensions etc.
+few shot eg.
+1) conveyer belts
+2) small screws
+3) clamps
+4) pumps,
+5) rings, etc.
+so always list all available products in that type with dimensions and materials used. so an informed decision can be taken.
+We help you find the right HS Code for your products quickly and accurately. Save time and avoid customs issues with our automated HS Code lookup tool.
+Product List:
+"""
+
+# Same instructions, but the answer is a short JSON list of candidate rows instead of prose
+STRUCTURED_MESSAGE_HEADER = SYSTEM_MESSAGE_HEADER.replace("Product List:\n", STRUCTURED_INSTRUCTIONS.lstrip() + "Product List:\n")
+
+
+# Text of a chat completion (or of its error)
+def response_text(response):
+    if isinstance(response, str):
+        return response
+    if "error" in response:
+        return f"Error: {response['error'].get('message', response['error'])}"
+    return response["choices"][0]["message"]["content"]
+
+
+# Fingerprint of the static prefix of a payload (its first message); identical for every request on one catalog
+def prefix_digest(payload):
+    return hashlib.sha256(json.dumps(payload["messages"][0], ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class Answer:
+    __slots__ = ("text", "source", "hs_code", "response", "candidates", "compact")
+
+    def __init__(self, text, source, hs_code=None, response=None, candidates=None, compact=None):
+        self.text = text
+        self.source = source
+        self.hs_code = hs_code
+        self.response = response
+        self.candidates = candidates or []
+        self.compact = compact
+
+    # What goes back into chat history for the next request: the compact JSON when there is one
+    def history_content(self):
+        return self.compact or self.text
+
+    def as_dict(self):
+        return {"answer": self.text, "source": self.source, "hs_code": self.hs_code,
+                "candidates": [candidate.as_dict() for candidate in self.candidates]}
+
+
+# Token usage per answered request over the last `size` requests: completion tokens, and prompt tokens
+# split into those served from the provider's prefix cache and the rest
+class UsageStats:
+    def __init__(self, size=500):
+        self.tokens = deque(maxlen=size)
+        self.prompt = deque(maxlen=size)
+
+    def record(self, response):
+        usage = response.get("usage") or {}
+        if "completion_tokens" in usage:
+            self.tokens.append(usage["completion_tokens"])
+        if "prompt_tokens" in usage:
+            cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+            self.prompt.append((usage["prompt_tokens"], cached))
+
+    def report(self):
+        tokens = list(self.tokens)
+        prompt_tokens = sum(total for total, _ in self.prompt)
+        cached_tokens = sum(cached for _, cached in self.prompt)
+        return {"answers": len(tokens), "avg_output_tokens": sum(tokens) / len(tokens) if tokens else 0.0,
+                "max_output_tokens": max(tokens, default=0), "prompt_tokens": prompt_tokens,
+                "cached_prompt_tokens": cached_tokens, "uncached_prompt_tokens": prompt_tokens - cached_tokens,
+                "cached_share": cached_tokens / prompt_tokens if prompt_tokens else 0.0}
+
+
+# The answer another caller's identical request got
+def _coalesced(answer):
+    return Answer(answer.text, "coalesced", answer.hs_code, answer.response, answer.candidates, answer.compact)
+
+
+# The lookup core shared by the Streamlit app, the HTTP API and the batch runner:
+# one catalog version with its index, matcher and compiled prompt, plus the process-wide client and cache.
+class LookupEngine:
+    def __init__(self, data, llm_client, response_cache=None, match_stats=None, model=DEFAULT_MODEL,
+                 top_k=TOP_K_PRODUCTS, max_tokens=300, timeout=60, version=None, structured=True,
+                 prefix_max_tokens=PREFIX_CATALOG_MAX_TOKENS, chapter_top_k=CHAPTER_TOP_K_PRODUCTS, image_index=None,
+                 rate_limiter=None, header=None, template="english", local_match=True, coalesce=True):
+        self.version = version or catalog_version(data)
+        # Row ids in the prompt, the index and the matcher are all positions in this frame
+        self.data = positional(data)
+        self.llm_client = llm_client
+        self.response_cache = response_cache
+        self.image_index = image_index
+        self.rate_limiter = rate_limiter
+        self.in_flight = SingleFlight(coalesce)
+        self.match_stats = match_stats or MatchStats()
+        self.local_match = local_match
+        self.model = model
+        self.top_k = top_k
+        self.chapter_top_k = chapter_top_k
+        self.structured = structured
+        self.max_tokens = MAX_TOKENS if structured else max_tokens
+        self.timeout = timeout
+        # Instructions and row template can be swapped for evaluation (evaluate.py)
+        self.header = header or (STRUCTURED_MESSAGE_HEADER if structured else SYSTEM_MESSAGE_HEADER)
+        self.template = template
+        self.usage_stats = UsageStats()
+        self.index = CatalogIndex(self.data)
+        self.matcher = ProductMatcher(self.data)
+        self.hs_tree = HSTree(self.data)
+        # Instructions plus the whole catalog in row-id order, byte-identical for every request on this version
+        self.full_prompt = compile_system_prompt(self.header, self.data, template, self.version, with_ids=structured)
+        self.catalog_in_prefix = self.full_prompt.token_count <= prefix_max_tokens
+
+    # Static system prompt and per-query product rows (or None). Small catalogs are always sent whole so that
+    # the provider can reuse the cached prefix; otherwise text queries get the instructions alone as the prefix,
+    # with the best matching rows, in row-id order, after the conversation. Image-only queries get the full list.
+    def prompt_for_query(self, query):
+        if self.catalog_in_prefix or not query:
+            return self.full_prompt.text, None
+        candidates = self.data.iloc[self.candidate_rows(query)[0]]
+        if candidates.empty:
+            return self.full_prompt.text, None
+        return self.header, MATCHING_PRODUCTS_LABEL + render_catalog(candidates.sort_index(), self.template, with_ids=self.structured)
+
+    # Row positions to send for a text query, and the HS prefix they were narrowed to (or None): the best
+    # matches under a code typed into the query, or within one chapter when most of the retrieval score
+    # falls in it, otherwise the best matches overall
+    def candidate_rows(self, query):
+        prefix = self.hs_tree.prefix_in_query(query)
+        if prefix is not None:
+            rows = self.hs_tree.rows(prefix)
+            return self.index.search(query, self.top_k, rows) or rows[:self.top_k].tolist(), prefix
+        positions, scores = self.index.ranked(query, self.top_k)
+        chapter = self.hs_tree.dominant_chapter(positions, scores)
+        if chapter is None or self.hs_tree.count(chapter) == len(self.data):
+            return positions.tolist(), None
+        return self.index.search(query, self.chapter_top_k, self.hs_tree.rows(chapter)), chapter
+
+    # Static prefix first, then everything that changes per request: history, matching rows, images
+    def build_payload(self, system_prompt, chat_history, images=None, products=None):
+        messages = [{"role": "system", "content": system_prompt}]
+        for entry in chat_history:
+            messages.append({"role": entry["role"], "content": entry["content"]})
+        if products:
+            messages.append({"role": "system", "content": products})
+        if images:
+            messages.append({"role": "user", "content": [image.message_content() for image in images]})
+        payload = {"model": self.model, "messages": messages, "max_tokens": self.max_tokens}
+        if self.structured:
+            payload["response_format"] = RESPONSE_FORMAT
+        return payload
+
+    # Text-only lookups with an unambiguous match in the sheet skip the API call
+    def local_answer(self, query, images=None):
+        if not self.local_match or not query or images:
+            return None
+        match, seconds = timed_match(self.matcher, query)
+        hit = bool(match and match.confident)
+        self.match_stats.record(hit, seconds)
+        if not hit:
+            return None
+        candidate = Candidate(int(match.row.name), match.hs_code, str(match.row.get("Product Name")), round(match.score, 3))
+        return Answer(format_match(match), match.method, match.hs_code, candidates=[candidate])
+
+    # Image-only lookups of one photo close to one classified before: (answer, trusted) or (None, False).
+    # A trusted match (confirmed by enough vision answers) is the answer; otherwise it is shown while the
+    # vision call runs.
+    def image_answer(self, query, images):
+        if self.image_index is None or query or not images or len(images) != 1 or images[0].phash is None:
+            return None, False
+        with tracer.span("image.match") as span:
+            match = self.image_index.nearest(images[0].phash)
+            span.set(hit=match is not None)
+        row = self._catalog_row(match.row, match.hs_code) if match is not None else None
+        if row is None:
+            return None, False
+        candidate = Candidate(row, match.hs_code, match.product_name, round(match.similarity, 3))
+        text = f"HS Code {match.hs_code} - {match.product_name} [matched to a photo classified before, {match.distance} bits apart]"
+        return Answer(text, "image", match.hs_code, candidates=[candidate]), self.image_index.trusted(match)
+
+    # The stored row if it still holds this code on the current sheet, else the first row with the code
+    def _catalog_row(self, row, hs_code):
+        if "HS Code" not in self.data.columns:
+            return None
+        if row is not None and 0 <= row < len(self.data) and str(self.data["HS Code"].iat[row]) == hs_code:
+            return row
+        rows = self.hs_tree.rows(hs_code)
+        return int(rows[0]) if len(rows) else None
+
+    # Remember what the vision call made of a single photo, for its re-crops and re-shoots
+    def _learn_image(self, images, answer):
+        if self.image_index is None or not images or len(images) != 1 or images[0].phash is None or not answer.candidates:
+            return
+        best = answer.candidates[0]
+        self.image_index.record(images[0].phash, best.hs_code, best.row, best.product_name)
+
+    # A caller's chat history is part of the question: follow-ups with different histories are different requests.
+    # Its text is normalized like the query, so retyping the same turn still hits.
+    def _cache_key(self, query, images, system_prompt, products, chat_history=None):
+        history = json.dumps([[message.get("role"), normalize(message["content"]) if isinstance(message.get("content"), str)
+                               else message.get("content")] for message in chat_history or []], ensure_ascii=False)
+        return cache_key(query, [image.digest for image in images or []], self.model, system_prompt + (products or "") + history)
+
+    # Typed answer for a completion; structured replies that do not parse fall back to the raw text
+    def _answer(self, response, source):
+        if "error" in response:
+            return Answer(response_text(response), "error", response=response)
+        text = response_text(response)
+        parsed = parse_answer(text, self.data) if self.structured else None
+        if parsed is None:
+            return Answer(text, source, response=response)
+        hs_code = parsed.candidates[0].hs_code if parsed.candidates else None
+        return Answer(parsed.text(), source, hs_code, response, parsed.candidates, parsed.compact())
+
+    def _cached(self, key):
+        if self.response_cache is None:
+            return None
+        with tracer.span("cache.lookup") as span:
+            response = self.response_cache.get(key)
+            span.set(hit=response is not None)
+        return self._answer(response, "cache") if response is not None else None
+
+    # Replies are cached for the cache's TTL, so structured ones that were cut off at max_tokens or did not
+    # parse (shown as raw text) are not: the next ask gets a fresh try
+    def _remember(self, key, response, images=None):
+        with tracer.span("answer.parse"):
+            answer = self._answer(response, "llm")
+        if "error" not in response:
+            self.usage_stats.record(response)
+            truncated = (response.get("choices") or [{}])[0].get("finish_reason") == "length"
+            if self.response_cache is not None and not (self.structured and (truncated or answer.compact is None)):
+                self.response_cache.put(key, response)
+        self._learn_image(images, answer)
+        return answer
+
+    # Streamed text as it should be shown: the candidates parsed so far for structured replies
+    def _partial_text(self, text):
+        if not self.structured:
+            return text
+        partial = parse_partial(text, self.data)
+        return partial.text() if partial.candidates else None
+
+    def _request(self, query, chat_history, images):
+        with tracer.span("prompt.build") as span:
+            system_prompt, products = self.prompt_for_query(query)
+            key = self._cache_key(query, images, system_prompt, products, chat_history)
+            if chat_history is None:
+                chat_history = [{"role": "user", "content": f"<user-query>{query}</user-query>"}] if query else []
+            payload = self.build_payload(system_prompt, chat_history, images, products)
+            if span:
+                span.set(payload_bytes=len(json.dumps(payload)), messages=len(payload["messages"]))
+        return key, payload
+
+    @staticmethod
+    def _trace_usage(span, response):
+        usage = response.get("usage") or {}
+        span.set(prompt_tokens=usage.get("prompt_tokens", 0), completion_tokens=usage.get("completion_tokens", 0),
+                 cached_tokens=(usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0)
+
+    # With on_text the completion is streamed and on_text gets the text received so far after every chunk.
+    # client_key (a session or API key) is charged one token of the rate limiter per lookup that is not answered
+    # locally or from the cache, whether it calls upstream or waits for an identical call in flight.
+    def classify(self, query, images=None, chat_history=None, on_text=None, client_key=None):
+        with tracer.trace("classify", images=len(images or [])) as span:
+            answer = self._classify(query, images, chat_history, on_text, client_key)
+            span.set(source=answer.source)
+            return answer
+
+    # Everything before the upstream call (local match, photo match, retrieval, prompt, cache lookup):
+    # (answer, None, None, None) when that settles it, else (None, suggestion, key, payload)
+    def _prepare(self, query, images, chat_history):
+        with tracer.span("match.local"):
+            answer = self.local_answer(query, images)
+        if answer is not None:
+            return answer, None, None, None
+        suggestion, trusted = self.image_answer(query, images)
+        if trusted:
+            return suggestion, None, None, None
+        key, payload = self._request(query, chat_history, images)
+        answer = self._cached(key)
+        if answer is not None:
+            return answer, None, None, None
+        return None, suggestion, key, payload
+
+    def _classify(self, query, images, chat_history, on_text, client_key):
+        answer, suggestion, key, payload = self._prepare(query, images, chat_history)
+        if answer is not None:
+            return answer
+        if suggestion is not None and on_text is not None:
+            on_text(suggestion.text)
+        # Charged before joining a call in flight, so only the caller's own budget holds the caller back
+        if self.rate_limiter is not None:
+            with tracer.span("ratelimit.wait") as span:
+                span.set(wait_ms=self.rate_limiter.acquire(client_key) * 1000)
+        # Identical requests already on their way upstream are waited for, not repeated
+        answer, shared = self.in_flight.do(key, lambda: self._fetch(key, payload, images, on_text))
+        return _coalesced(answer) if shared else answer
+
+    def _fetch(self, key, payload, images, on_text):
+        with tracer.span("llm.request", model=payload["model"], stream=on_text is not None) as span:
+            try:
+                if on_text is None:
+                    response = self.llm_client.chat(payload, timeout=self.timeout)
+                else:
+                    payload["stream_options"] = {"include_usage": True}
+                    stream = self.llm_client.stream_chat(payload, timeout=self.timeout)
+                    text = ""
+                    shown = None
+                    for chunk in stream:
+                        text += chunk
+                        partial = self._partial_text(text)
+                        if partial is not None and partial != shown:
+                            shown = partial
+                            on_text(partial)
+                    response = stream.as_response()
+                    if span and stream.first_token_seconds is not None:
+                        span.set(first_token_ms=stream.first_token_seconds * 1000)
+            except LLMError as e:
+                response = {"error": {"message": str(e)}}
+            if span:
+                self._trace_usage(span, response)
+        return self._remember(key, response, images)
+
+    async def aclassify(self, query, images=None, chat_history=None, client_key=None):
+        with tracer.trace("classify", images=len(images or [])) as span:
+            answer = await self._aclassify(query, images, chat_history, client_key)
+            span.set(source=answer.source)
+            return answer
+
+    async def _aclassify(self, query, images, chat_history, client_key):
+        # Matching, retrieval and the SQLite cache lookup are CPU and disk work: on a worker thread, so one slow
+        # lookup does not hold up every other request on the loop
+        answer, _, key, payload = await asyncio.to_thread(self._prepare, query, images, chat_history)
+        if answer is not None:
+            return answer
+        if self.rate_limiter is not None:
+            with tracer.span("ratelimit.wait") as span:
+                span.set(wait_ms=await self.rate_limiter.acquire_async(client_key) * 1000)
+        answer, shared = await self.in_flight.ado(key, lambda: self._afetch(key, payload, images))
+        return _coalesced(answer) if shared else answer
+
+    async def _afetch(self, key, payload, images):
+        with tracer.span("llm.request", model=payload["model"], stream=False) as span:
+            try:
+                response = await self.llm_client.achat(payload, timeout=self.timeout)
+            except LLMError as e:
+                response = {"error": {"message": str(e)}}
+            if span:
+                self._trace_usage(span, response)
+        # Parsing and the SQLite write as well
+        return await asyncio.to_thread(self._remember, key, response, images)
@@ -0,0 +1,332 @@
+import argparse
+import csv
+import json
+import math
+import os
+import re
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from engine import DEFAULT_MODEL, PREFIX_CATALOG_MAX_TOKENS, TOP_K_PRODUCTS, LookupEngine
+from hs_tree import hs_digits
+from image_pipeline import prepare_images
+from llm_client import GROQ_BASE_URL, OPENAI_BASE_URL, LLMClient, LLMError, cost
+from prompt import script_header
+from response_cache import content_hash
+
+# Offline evaluation: a labeled set of (description and/or photo -> HS code) is replayed against several
+# configurations (model, max_tokens, prompt wording, row template, ...) and each gets accuracy next to
+# latency, tokens and cost. Completions are recorded per payload, so a configuration whose payloads have been
+# seen before is re-scored offline, without calling the provider, with the latency measured when recorded.
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESPONSES_PATH = os.path.join(".cache", "eval_responses.jsonl")
+
+# HS codes quoted in a free-text answer
+HS_CODE_IN_TEXT = re.compile(r"HS Code:?\**\s*([0-9]{4}[0-9.]*[0-9])")
+
+
+class EvalConfig:
+    __slots__ = ("name", "model", "max_tokens", "structured", "header", "template", "top_k", "whole_catalog",
+                 "local_match", "base_url")
+
+    def __init__(self, name, model=DEFAULT_MODEL, max_tokens=300, structured=True, header=None, template="english",
+                 top_k=TOP_K_PRODUCTS, whole_catalog=False, local_match=True, base_url=None):
+        self.name = name
+        self.model = model
+        self.max_tokens = max_tokens
+        self.structured = structured
+        # None for the engine's instructions, "script:<file>:<variable>" for a script's, or the text itself
+        self.header = header
+        self.template = template
+        self.top_k = top_k
+        # Whole catalog in every request, like the scripts before app.py
+        self.whole_catalog = whole_catalog
+        self.local_match = local_match
+        self.base_url = base_url
+
+    @classmethod
+    def from_dict(cls, entry):
+        return cls(**entry)
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def header_text(self):
+        if self.header and self.header.startswith("script:"):
+            _, path, name = self.header.split(":", 2)
+            return script_header(os.path.join(HERE, path), name)
+        return self.header
+
+    def engine(self, data, client):
+        return LookupEngine(data, client, model=self.model, max_tokens=self.max_tokens, structured=self.structured,
+                            top_k=self.top_k, prefix_max_tokens=math.inf if self.whole_catalog else PREFIX_CATALOG_MAX_TOKENS,
+                            header=self.header_text(), template=self.template, local_match=self.local_match,
+                            # Each item stands for a separate request: no sharing calls between concurrent duplicates
+                            coalesce=False)
+
+
+# What the front ends have shipped with, oldest first
+CONFIGS = [
+    EvalConfig("13july", "llama3-70b-8192", 2000, False, "script:13july.py:system_message", "indonesian",
+               whole_catalog=True, local_match=False),
+    EvalConfig("14july", "gpt-4o", 3000, False, "script:14july.py:system_message", "indonesian",
+               whole_catalog=True, local_match=False),
+    EvalConfig("19julybackup", "gpt-4o-mini", 300, False, "script:19julybackup.py:initial_system_message", "indonesian",
+               whole_catalog=True, local_match=False),
+    EvalConfig("app-free-text", "gpt-4o-mini", 300, False),
+    EvalConfig("app", "gpt-4o-mini"),
+    EvalConfig("app-gpt-4o", "gpt-4o"),
+]
+
+
+def load_configs(path):
+    with open(path) as f:
+        return [EvalConfig.from_dict(entry) for entry in json.load(f)]
+
+
+# Labeled set as JSON lines ({"query": ..., "image": path or [paths], "hs_code": ...}) or CSV with the same
+# columns; image paths are relative to the set file
+def load_labeled(path):
+    if path.lower().endswith(".csv"):
+        with open(path, newline="") as f:
+            entries = list(csv.DictReader(f))
+    else:
+        with open(path) as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+    directory = os.path.dirname(os.path.abspath(path))
+    items = []
+    for entry in entries:
+        paths = entry.get("image") or []
+        if isinstance(paths, str):
+            paths = [paths]
+        images = []
+        for image_path in paths:
+            with open(os.path.join(directory, image_path), "rb") as f:
+                images.append(f.read())
+        items.append({"query": entry.get("query") or entry.get("description") or None, "images": images,
+                      "hs_code": entry["hs_code"]})
+    return items
+
+
+# Completions keyed by payload, in a JSON lines file. mode "replay" answers from the recording only, "record"
+# always calls upstream and stores what it gets, "auto" calls upstream for payloads not recorded yet.
+class RecordedClient:
+    def __init__(self, path, mode="replay", clients=None):
+        self.path = path
+        self.mode = mode
+        self.clients = clients or {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.replayed = 0
+        self.recorded = 0
+        self.missing = 0
+        self._responses = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._responses[entry["key"]] = entry
+
+    @staticmethod
+    def key(payload):
+        return content_hash(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+
+    # Upstream latency of the last call on this thread that was answered from the recording (0 for live calls)
+    @property
+    def replayed_ms(self):
+        return getattr(self._local, "replayed_ms", 0.0)
+
+    def chat(self, payload, timeout=None):
+        key = self.key(payload)
+        self._local.replayed_ms = 0.0
+        entry = self._responses.get(key) if self.mode != "record" else None
+        if entry is not None:
+            with self._lock:
+                self.replayed += 1
+            self._local.replayed_ms = entry["latency_ms"]
+            return entry["response"]
+        client = self.clients.get(payload["model"])
+        if self.mode == "replay" or client is None:
+            with self._lock:
+                self.missing += 1
+            raise LLMError(f"No recorded response for this {payload['model']} payload")
+        start = time.perf_counter()
+        response = client.chat(payload, timeout=timeout)
+        latency_ms = (time.perf_counter() - start) * 1000
+        if "error" not in response:
+            entry = {"key": key, "model": payload["model"], "latency_ms": round(latency_ms, 1), "response": response}
+            with self._lock:
+                self._responses[key] = entry
+                self.recorded += 1
+                directory = os.path.dirname(self.path)
+                if directory:
+                    os.makedirs(directory, exist_ok=True)
+                with open(self.path, "a") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return response
+
+    def stream_chat(self, payload, timeout=None):
+        raise LLMError("Evaluation runs are not streamed")
+
+
+def predicted_codes(answer):
+    if answer.candidates:
+        codes = [candidate.hs_code for candidate in answer.candidates]
+    elif answer.hs_code:
+        codes = [answer.hs_code]
+    else:
+        codes = HS_CODE_IN_TEXT.findall(answer.text or "")
+    return list(dict.fromkeys(hs_digits(code) for code in codes if hs_digits(code)))
+
+
+class ItemResult:
+    __slots__ = ("item", "expected", "predicted", "source", "latency_ms", "prompt_tokens", "completion_tokens", "cost")
+
+    def __init__(self, item, expected, predicted, source, latency_ms, prompt_tokens=0, completion_tokens=0, cost=0.0):
+        self.item = item
+        self.expected = expected
+        self.predicted = predicted
+        self.source = source
+        self.latency_ms = latency_ms
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.cost = cost
+
+    @property
+    def correct(self):
+        return bool(self.predicted) and self.predicted[0] == self.expected
+
+    def as_dict(self):
+        return {"item": self.item, "expected": self.expected, "predicted": self.predicted, "source": self.source,
+                "correct": self.correct, "latency_ms": round(self.latency_ms, 1), "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens, "cost": self.cost}
+
+
+def run_item(engine, client, config, position, item):
+    images = prepare_images(item["images"]) if item["images"] else None
+    start = time.perf_counter()
+    answer = engine.classify(item["query"], images)
+    # Offline, the call itself took no time: count the latency it had when it was recorded
+    latency_ms = (time.perf_counter() - start) * 1000 + (client.replayed_ms if answer.source == "llm" else 0.0)
+    usage = {}
+    if answer.source == "llm":
+        usage = answer.response.get("usage") or {}
+    return ItemResult(position, hs_digits(item["hs_code"]), predicted_codes(answer), answer.source, latency_ms,
+                      usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0), cost(config.model, usage) if usage else 0.0)
+
+
+# One configuration over the whole set, on a pool of worker threads
+def evaluate(config, items, data, client, workers=8):
+    engine = config.engine(data, client)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(workers, thread_name_prefix=f"eval-{config.name}") as pool:
+        results = list(pool.map(lambda entry: run_item(engine, client, config, *entry), enumerate(items)))
+    return results, time.perf_counter() - start
+
+
+def summarize(config, results, seconds):
+    n = len(results)
+    latencies = [result.latency_ms for result in results]
+    costs = [result.cost for result in results]
+    sources = {}
+    for result in results:
+        sources[result.source] = sources.get(result.source, 0) + 1
+    return {
+        "config": config.name,
+        "model": config.model,
+        "items": n,
+        "accuracy": round(sum(result.correct for result in results) / n, 3),
+        "top3_accuracy": round(sum(result.expected in result.predicted[:3] for result in results) / n, 3),
+        "heading_accuracy": round(sum(bool(result.predicted) and result.predicted[0][:4] == result.expected[:4]
+                                      for result in results) / n, 3),
+        "errors": sources.get("error", 0),
+        "p50_ms": round(statistics.median(latencies), 1),
+        "p95_ms": round(statistics.quantiles(latencies, n=20)[-1], 1) if n > 1 else round(latencies[0], 1),
+        "avg_prompt_tokens": round(statistics.mean(result.prompt_tokens for result in results), 1),
+        "avg_completion_tokens": round(statistics.mean(result.completion_tokens for result in results), 1),
+        "usd_per_1k_items": None if None in costs else round(sum(costs) / n * 1000, 4),
+        "sources": sources,
+        "run_seconds": round(seconds, 2),
+    }
+
+
+# Fastest configuration (by p95, then cost) whose accuracy is within `tolerance` of the best one
+def recommend(summaries, tolerance=0.01):
+    best = max(summary["accuracy"] for summary in summaries)
+    eligible = [summary for summary in summaries if summary["accuracy"] >= best - tolerance and not summary["errors"]]
+    if not eligible:
+        return None
+    return min(eligible, key=lambda summary: (summary["p95_ms"], summary["usd_per_1k_items"] or 0.0))["config"]
+
+
+# Upstream clients by model: Groq for its Llama models, OpenAI otherwise, unless one base URL is given for all
+def make_clients(configs, base_url=None):
+    clients = {}
+    for config in configs:
+        url = base_url or config.base_url or (GROQ_BASE_URL if config.model.startswith("llama") else OPENAI_BASE_URL)
+        key = os.environ.get("GROQ_API_KEY" if url == GROQ_BASE_URL else "OPENAI_API_KEY", "")
+        clients[config.model] = LLMClient(key, base_url=url)
+    return clients
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuracy vs latency, tokens and cost of lookup configurations on a labeled set")
+    parser.add_argument("labeled", help="JSON lines or CSV of query/image -> hs_code")
+    parser.add_argument("--catalog", required=True, help="product sheet as CSV or Parquet")
+    parser.add_argument("--configs", help="JSON list of configurations (default: the shipped ones)")
+    parser.add_argument("--only", nargs="+", help="names of the configurations to run")
+    parser.add_argument("--responses", default=RESPONSES_PATH, help="recorded completions (JSON lines)")
+    parser.add_argument("--mode", choices=["replay", "auto", "record"], default="replay",
+                        help="replay: offline, recorded responses only; auto: record what is missing; record: call for everything")
+    parser.add_argument("--base-url", help="send every configuration to this endpoint")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--tolerance", type=float, default=0.01, help="accuracy a faster configuration may give up")
+    parser.add_argument("--results", help="write one JSON line per item and configuration here")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    configs = load_configs(args.configs) if args.configs else CONFIGS
+    if args.only:
+        configs = [config for config in configs if config.name in args.only]
+    data = pd.read_parquet(args.catalog) if args.catalog.endswith(".parquet") else pd.read_csv(args.catalog)
+    items = load_labeled(args.labeled)
+    clients = {} if args.mode == "replay" else make_clients(configs, args.base_url)
+    client = RecordedClient(args.responses, args.mode, clients)
+
+    summaries = []
+    output = open(args.results, "w") if args.results else None
+    try:
+        # One configuration at a time so their latencies do not interfere; items run in parallel within each
+        for config in configs:
+            results, seconds = evaluate(config, items, data, client, args.workers)
+            summaries.append(summarize(config, results, seconds))
+            if output is not None:
+                for result in results:
+                    output.write(json.dumps({"config": config.name, **result.as_dict()}) + "\n")
+    finally:
+        if output is not None:
+            output.close()
+        for upstream in clients.values():
+            upstream.close()
+
+    report = {"configs": summaries, "recommended": recommend(summaries, args.tolerance),
+              "responses": {"replayed": client.replayed, "recorded": client.recorded, "missing": client.missing}}
+    if args.json:
+        print(json.dumps(report))
+        return
+    for summary in summaries:
+        print("  ".join(f"{key}={value}" for key, value in summary.items()))
+    print(f"recommended: {report['recommended']}  responses: {report['responses']}")
+    if client.missing:
+        print(f"{client.missing} payloads have no recorded response; run with --mode auto to record them", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from catalog_store import positional
+
+# Digits at each level of an HS code: chapter, heading, subheading, national tariff line
+HS_LEVELS = (2, 4, 6, 8)
+LEVEL_NAMES = {2: "chapter", 4: "heading", 6: "subheading", 8: "tariff line"}
+
+# A share of the retrieval score at least this large puts a query in one chapter
+CHAPTER_MIN_SHARE = 0.6
+
+NON_DIGITS = re.compile(r"\D")
+# Units after a number that make it a rating or a size ("under 40 bar"), not a code
+UNITS = r"(?!\s*(?:bar|psi|mpa|kpa|pa|mm|cm|m|inch|kg|g|l|ml|v|kv|w|kw|hp|rpm|hz|c|f|deg|degrees)\b|\s*%)"
+# Codes typed into a query: written like the sheet ("7326.90", "7326.90.99"), or a number after a keyword
+# ("chapter 73", "HS 732690", "under 7326": at least a heading, as "under 40" is usually a rating) so that
+# sizes and model numbers are not taken for codes
+CODE_IN_QUERY = re.compile(
+    r"\b\d{4}(?:\.\d{2}){1,2}\b"
+    rf"|\b(?:hs|code|chapter|heading)\s*(\d{{2,8}})\b{UNITS}"
+    rf"|\bunder\s*(\d{{4,8}})\b{UNITS}",
+    re.IGNORECASE,
+)
+
+
+def hs_digits(code):
+    if code is None or (not isinstance(code, str) and pd.isna(code)):
+        return ""
+    return NON_DIGITS.sub("", str(code))
+
+
+# "732690" -> "7326.90", the way codes are written in the sheet
+def format_hs(digits):
+    return ".".join([digits[:4]] + [digits[i:i + 2] for i in range(4, len(digits), 2)]) if len(digits) > 4 else digits
+
+
+class HSNode:
+    __slots__ = ("code", "start", "end", "children")
+
+    def __init__(self, code, start, end):
+        self.code = code
+        self.start = start
+        self.end = end
+        self.children = {}
+
+    @property
+    def count(self):
+        return self.end - self.start
+
+
+# Prefix tree over the sheet's HS codes at 2/4/6/8 digits. Rows are kept sorted by code, so every node is one
+# contiguous range of that order: "everything under 7326" is a walk of two levels and a slice, and counts per
+# chapter or heading are range lengths.
+class HSTree:
+    def __init__(self, data, column="HS Code"):
+        data = positional(data)
+        digits = [hs_digits(code) for code in data[column]] if column in data.columns else []
+        coded = [position for position, code in enumerate(digits) if len(code) >= HS_LEVELS[0]]
+        coded.sort(key=lambda position: digits[position])
+        # Row positions in code order, and the code of each
+        self.order = np.array(coded, dtype=np.int64)
+        self.codes = [digits[position] for position in coded]
+        # Chapter number of every row position, -1 for rows without a code
+        self.row_chapters = np.full(len(data), -1, dtype=np.int16)
+        self.row_chapters[self.order] = [int(code[:2]) for code in self.codes]
+        self.root = HSNode("", 0, len(coded))
+        for index, code in enumerate(self.codes):
+            node = self.root
+            for level in HS_LEVELS:
+                if len(code) < level:
+                    break
+                key = code[len(node.code):level]
+                child = node.children.get(key)
+                if child is None:
+                    child = node.children[key] = HSNode(code[:level], index, index)
+                child.end = index + 1
+                node = child
+
+    def __len__(self):
+        return len(self.order)
+
+    # Deepest node for a prefix on a level boundary, and the digits left below it
+    def _walk(self, digits):
+        node = self.root
+        for level in HS_LEVELS:
+            if len(digits) < level:
+                break
+            child = node.children.get(digits[len(node.code):level])
+            if child is None:
+                return None, ""
+            node = child
+        return node, digits[len(node.code):]
+
+    # Range [start, end) of the code order holding every row under a prefix
+    def _range(self, prefix):
+        digits = hs_digits(prefix)
+        node, rest = self._walk(digits)
+        if node is None:
+            return 0, 0
+        if not rest:
+            return node.start, node.end
+        if node.children:
+            # Odd-length prefix such as "732": the children starting with the extra digit are adjacent
+            matching = [child for key, child in node.children.items() if key.startswith(rest)]
+            if not matching:
+                return 0, 0
+            return min(child.start for child in matching), max(child.end for child in matching)
+        # Below the last level (10-digit national codes): narrow the leaf by comparing codes
+        inside = [index for index in range(node.start, node.end) if self.codes[index].startswith(digits)]
+        return (inside[0], inside[-1] + 1) if inside else (0, 0)
+
+    # Row positions of every product under a prefix, in code order
+    def rows(self, prefix):
+        start, end = self._range(prefix)
+        return self.order[start:end]
+
+    def count(self, prefix):
+        start, end = self._range(prefix)
+        return end - start
+
+    # (code, row count) one level below a prefix; children("") are the chapters
+    def children(self, prefix=""):
+        node, rest = self._walk(hs_digits(prefix))
+        if node is None or rest:
+            return []
+        return [(child.code, child.count) for _, child in sorted(node.children.items())]
+
+    def chapters(self):
+        return dict(self.children())
+
+    def chapter_of(self, position):
+        chapter = self.row_chapters[position]
+        return f"{chapter:02d}" if chapter >= 0 else None
+
+    # The chapter holding at least min_share of the total score of the given rows, or None
+    def dominant_chapter(self, positions, scores, min_share=CHAPTER_MIN_SHARE):
+        chapters = self.row_chapters[np.asarray(positions, dtype=np.int64)]
+        coded = chapters >= 0
+        if not coded.any():
+            return None
+        totals = np.bincount(chapters[coded], weights=np.asarray(scores, dtype=np.float64)[coded], minlength=100)
+        total = totals.sum()
+        best = int(totals.argmax())
+        return f"{best:02d}" if total > 0 and totals[best] / total >= min_share else None
+
+    # The most specific code typed into the query that is in the sheet, e.g. "7326" in "anything under 7326?"
+    def prefix_in_query(self, query):
+        found = [hs_digits(match.group(1) or match.group(2) or match.group(0)) for match in CODE_IN_QUERY.finditer(query or "")]
+        found = [digits for digits in found if self.count(digits)]
+        return max(found, key=len) if found else None
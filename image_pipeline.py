@@ -0,0 +1,132 @@
+import base64
+import hashlib
+import io
+import time
+
+import numpy as np
+from PIL import Image, ImageOps
+
+from tracing import tracer
+
+# OpenAI vision scales high-detail images to fit 2048x2048 and then to 768px on the short side,
+# and low-detail images to 512x512; anything larger is uploaded for nothing.
+HIGH_DETAIL_LONG_SIDE = 2048
+HIGH_DETAIL_SHORT_SIDE = 768
+LOW_DETAIL_SIDE = 512
+JPEG_QUALITY = 85
+
+# pHash: the 8x8 lowest frequencies of the DCT of a 32x32 grey thumbnail, each bit set when above their median.
+# Re-crops, re-shoots and recompressions of the same part land a few bits apart.
+PHASH_SIZE = 32
+PHASH_FREQUENCIES = 8
+
+
+def _dct_matrix(n):
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    return np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+
+
+_DCT = _dct_matrix(PHASH_SIZE)
+
+
+# 64-bit perceptual hash of a PIL image, as an int
+def perceptual_hash(image):
+    thumbnail = image.convert("L").resize((PHASH_SIZE, PHASH_SIZE), Image.BILINEAR, reducing_gap=2.0)
+    frequencies = (_DCT @ np.asarray(thumbnail, dtype=np.float64) @ _DCT.T)[:PHASH_FREQUENCIES, :PHASH_FREQUENCIES].ravel()
+    # The DC term only measures brightness and is left out of the median
+    bits = frequencies > np.median(frequencies[1:])
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+class PreparedImage:
+    __slots__ = ("digest", "data_url", "detail", "width", "height", "bytes_in", "bytes_out", "encode_seconds", "phash")
+
+    def __init__(self, digest, data_url, detail, width, height, bytes_in, bytes_out, encode_seconds, phash=None):
+        self.digest = digest
+        self.data_url = data_url
+        self.detail = detail
+        self.width = width
+        self.height = height
+        self.bytes_in = bytes_in
+        self.bytes_out = bytes_out
+        self.encode_seconds = encode_seconds
+        self.phash = phash
+
+    def message_content(self):
+        return {"type": "image_url", "image_url": {"url": self.data_url, "detail": self.detail}}
+
+
+def target_size(width, height):
+    scale = min(1.0, HIGH_DETAIL_LONG_SIDE / max(width, height), HIGH_DETAIL_SHORT_SIDE / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+# Downscale and recompress one upload straight from its buffer (e.g. uploaded_file.getbuffer()).
+# Images that already fit in a low-detail tile are sent at "low" detail, the rest at "high".
+def prepare_image(buffer, digest=None):
+    start = time.perf_counter()
+    view = memoryview(buffer)
+    digest = digest or hashlib.sha256(view).hexdigest()
+
+    image = Image.open(io.BytesIO(view))
+    source_format = image.format
+    original_size = image.size
+    width, height = target_size(*image.size)
+    if source_format == "JPEG" and (width, height) != image.size:
+        # Let the JPEG decoder skip the pixels that would be thrown away anyway
+        image.draft("RGB", (width, height))
+    oriented = ImageOps.exif_transpose(image)
+    rotated = oriented.size != image.size
+    image = oriented
+    width, height = target_size(*image.size)
+    resized = (width, height) != image.size or image.size != original_size
+    detail = "low" if max(width, height) <= LOW_DETAIL_SIDE else "high"
+    phash = perceptual_hash(image)
+
+    if not resized and not rotated and source_format == "JPEG":
+        # Already small enough: send the original bytes untouched
+        mime, payload = "image/jpeg", view
+    else:
+        if (width, height) != image.size:
+            image = image.resize((width, height), Image.LANCZOS)
+        if image.mode not in ("RGB", "L"):
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.convert("RGBA").getchannel("A"))
+            image = background
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=JPEG_QUALITY)
+        payload = output.getbuffer()
+        mime = "image/jpeg"
+        if not resized and not rotated and len(view) <= len(payload) and source_format in ("PNG", "WEBP", "GIF"):
+            mime, payload = Image.MIME[source_format], view
+
+    encoded = base64.b64encode(payload).decode("ascii")
+    return PreparedImage(
+        digest=digest,
+        data_url=f"data:{mime};base64,{encoded}",
+        detail=detail,
+        width=width,
+        height=height,
+        bytes_in=len(view),
+        bytes_out=len(encoded),
+        encode_seconds=time.perf_counter() - start,
+        phash=phash,
+    )
+
+
+# Prepare several uploads, dropping byte-identical duplicates
+def prepare_images(buffers):
+    prepared = []
+    seen = set()
+    with tracer.span("image.prepare") as span:
+        for buffer in buffers:
+            digest = hashlib.sha256(memoryview(buffer)).hexdigest()
+            if digest in seen:
+                continue
+            seen.add(digest)
+            prepared.append(prepare_image(buffer, digest))
+        if span:
+            span.set(images=len(prepared), bytes_in=sum(image.bytes_in for image in prepared),
+                     bytes_out=sum(image.bytes_out for image in prepared))
+    return prepared
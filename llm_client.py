@@ -0,0 +1,261 @@
+import asyncio
+import json
+import random
+import statistics
+import threading
+import time
+from collections import deque
+
+import httpx
+
+OPENAI_BASE_URL = "https://api.openai.com/v1"
+GROQ_BASE_URL = "https://api.groq.com/openai/v1"
+
+# List prices per 1M tokens: (input, cached input, output)
+PRICES = {
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "llama3-70b-8192": (0.59, 0.59, 0.79),
+}
+
+# Status codes worth retrying: rate limiting and upstream failures
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# Cap on in-flight upstream requests across every session in this process
+MAX_CONCURRENT_REQUESTS = 8
+
+_process_semaphore = threading.BoundedSemaphore(MAX_CONCURRENT_REQUESTS)
+
+
+class LLMError(Exception):
+    pass
+
+
+# Rolling time-to-first-token and total latency of recent calls, in seconds
+class LatencyStats:
+    def __init__(self, window=500):
+        self._lock = threading.Lock()
+        self.first_token = deque(maxlen=window)
+        self.total = deque(maxlen=window)
+
+    def record(self, total, first_token=None):
+        with self._lock:
+            self.total.append(total)
+            if first_token is not None:
+                self.first_token.append(first_token)
+
+    def report(self):
+        with self._lock:
+            def percentiles(values):
+                if not values:
+                    return 0.0, 0.0
+                ordered = sorted(values)
+                return statistics.median(ordered), ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+            ttft_p50, ttft_p95 = percentiles(self.first_token)
+            total_p50, total_p95 = percentiles(self.total)
+            return {
+                "calls": len(self.total),
+                "ttft_p50_ms": ttft_p50 * 1000,
+                "ttft_p95_ms": ttft_p95 * 1000,
+                "total_p50_ms": total_p50 * 1000,
+                "total_p95_ms": total_p95 * 1000,
+            }
+
+
+# One streamed completion: iterate for content deltas, then read text, usage and timings
+class ChatStream:
+    def __init__(self, client, payload, timeout, path):
+        self._client = client
+        self._payload = dict(payload, stream=True)
+        self._timeout = timeout
+        self._path = path
+        self.text = ""
+        self.usage = None
+        self.error = None
+        self.finish_reason = None
+        self.first_token_seconds = None
+        self.total_seconds = None
+
+    def __iter__(self):
+        start = time.perf_counter()
+        chunks = []
+        try:
+            for chunk in self._client._stream_chunks(self._payload, self._timeout, self._path, self):
+                if self.first_token_seconds is None:
+                    self.first_token_seconds = time.perf_counter() - start
+                chunks.append(chunk)
+                yield chunk
+        finally:
+            self.text = "".join(chunks)
+            self.total_seconds = time.perf_counter() - start
+            self._client.latency.record(self.total_seconds, self.first_token_seconds)
+
+    # Same shape as a non-streamed chat completion, so callers and caches can treat both alike
+    def as_response(self):
+        if self.error is not None:
+            return {"error": self.error}
+        response = {"choices": [{"index": 0, "message": {"role": "assistant", "content": self.text},
+                                 "finish_reason": self.finish_reason or "stop"}]}
+        if self.usage is not None:
+            response["usage"] = self.usage
+        return response
+
+
+# Chat completions client for OpenAI-compatible endpoints (OpenAI and Groq) with one pooled
+# keep-alive connection set per process, per-call timeouts and exponential-backoff retries.
+class LLMClient:
+    def __init__(self, api_key, base_url=OPENAI_BASE_URL, timeout=30.0, connect_timeout=5.0,
+                 max_retries=3, backoff_seconds=0.5, max_backoff_seconds=8.0, max_concurrency=None, max_connections=20):
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.max_concurrency = max_concurrency or MAX_CONCURRENT_REQUESTS
+        self.semaphore = threading.BoundedSemaphore(max_concurrency) if max_concurrency else _process_semaphore
+        self.retries = 0
+        self.latency = LatencyStats()
+        self._headers = {"Content-Type": "application/json"}
+        if api_key:
+            self._headers["Authorization"] = f"Bearer {api_key}"
+        self._timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._client = httpx.Client(headers=self._headers, timeout=self._timeout, limits=self._limits)
+        self._async_clients = {}
+
+    # Non-JSON error pages (e.g. from a proxy) are turned into an OpenAI-style error body
+    @staticmethod
+    def _decode(response):
+        try:
+            return response.json()
+        except ValueError:
+            return {"error": {"message": f"HTTP {response.status_code}: {response.text[:200]}", "status": response.status_code}}
+
+    def _url(self, path):
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def _delay(self, attempt, response=None):
+        if response is not None and response.headers.get("retry-after"):
+            try:
+                return min(float(response.headers["retry-after"]), self.max_backoff_seconds)
+            except ValueError:
+                pass
+        delay = min(self.backoff_seconds * 2 ** attempt, self.max_backoff_seconds)
+        return delay * (0.5 + random.random() / 2)
+
+    def _should_retry(self, attempt, response=None):
+        retry = attempt < self.max_retries and (response is None or response.status_code in RETRY_STATUS_CODES)
+        if retry:
+            self.retries += 1
+        return retry
+
+    # Returns the decoded JSON body of the last response, like requests.post(...).json() did
+    def chat(self, payload, timeout=None, path="chat/completions"):
+        start = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.semaphore:
+                    response = self._client.post(self._url(path), json=payload, timeout=timeout or self._timeout)
+            except httpx.TransportError as e:
+                if not self._should_retry(attempt):
+                    raise LLMError(f"Request to {self.base_url} failed: {e}") from e
+                time.sleep(self._delay(attempt))
+                continue
+            if self._should_retry(attempt, response):
+                time.sleep(self._delay(attempt, response))
+                continue
+            self.latency.record(time.perf_counter() - start)
+            return self._decode(response)
+
+    # Streamed completion (server-sent events); retries only happen before the first byte
+    def stream_chat(self, payload, timeout=None, path="chat/completions"):
+        return ChatStream(self, payload, timeout or self._timeout, path)
+
+    def _stream_chunks(self, payload, timeout, path, stream):
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self.semaphore, self._client.stream("POST", self._url(path), json=payload, timeout=timeout) as response:
+                    if response.status_code != 200:
+                        response.read()
+                        if self._should_retry(attempt, response):
+                            delay = self._delay(attempt, response)
+                        else:
+                            stream.error = self._decode(response).get("error", {"message": f"HTTP {response.status_code}"})
+                            return
+                    else:
+                        for line in response.iter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[len("data:"):].strip()
+                            if data == "[DONE]":
+                                return
+                            event = json.loads(data)
+                            if event.get("usage"):
+                                stream.usage = event["usage"]
+                            for choice in event.get("choices") or []:
+                                if choice.get("finish_reason"):
+                                    stream.finish_reason = choice["finish_reason"]
+                                content = (choice.get("delta") or {}).get("content")
+                                if content:
+                                    yield content
+                        return
+            except httpx.TransportError as e:
+                if stream.first_token_seconds is not None or not self._should_retry(attempt):
+                    raise LLMError(f"Request to {self.base_url} failed: {e}") from e
+                delay = self._delay(attempt)
+            time.sleep(delay)
+
+    # The asyncio client is bound to the event loop that uses it; callers running their own loop
+    # (asyncio.run) close it with aclose() before the loop ends. Clients of loops that ended without that
+    # are dropped here: their connections went with the loop.
+    def _async_client(self):
+        loop = asyncio.get_running_loop()
+        for stale in [other for other in self._async_clients if other.is_closed()]:
+            del self._async_clients[stale]
+        if loop not in self._async_clients:
+            self._async_clients[loop] = httpx.AsyncClient(headers=self._headers, timeout=self._timeout, limits=self._limits)
+        return self._async_clients[loop]
+
+    # Coroutines take the same in-flight slots as threads (the process-wide cap unless max_concurrency was
+    # given), polling for a free one so that no event loop thread ever blocks on it
+    async def _acquire_slot(self):
+        delay = 0.005
+        while not self.semaphore.acquire(blocking=False):
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.05)
+
+    async def achat(self, payload, timeout=None, path="chat/completions"):
+        client = self._async_client()
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self._acquire_slot()
+                try:
+                    response = await client.post(self._url(path), json=payload, timeout=timeout or self._timeout)
+                finally:
+                    self.semaphore.release()
+            except httpx.TransportError as e:
+                if not self._should_retry(attempt):
+                    raise LLMError(f"Request to {self.base_url} failed: {e}") from e
+                await asyncio.sleep(self._delay(attempt))
+                continue
+            if self._should_retry(attempt, response):
+                await asyncio.sleep(self._delay(attempt, response))
+                continue
+            return self._decode(response)
+
+    async def aclose(self):
+        client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    def close(self):
+        self._client.close()
+
+
+# Dollars for one completion's usage, or None for a model without a list price
+def cost(model, usage):
+    if model not in PRICES:
+        return None
+    price_input, price_cached, price_output = PRICES[model]
+    cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    return ((usage.get("prompt_tokens", 0) - cached) * price_input + cached * price_cached
+            + usage.get("completion_tokens", 0) * price_output) / 1e6
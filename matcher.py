@@ -0,0 +1,169 @@
+import re
+import threading
+import time
+
+import numpy as np
+
+from catalog_store import positional
+from retrieval import tokenize
+
+# Filler phrases stripped from lookups like "HS code for stainless hose clamp 20mm"
+QUERY_FILLER = re.compile(
+    r"\b(?:what\s+is|what's|whats|the|please|give\s+me|find|lookup|look\s+up|hs\s*codes?|code|for|of|an?)\b"
+)
+DIMENSION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)\s*(mm|cm|m|in|inch|bar|kg|kw|v)\b")
+
+# A fuzzy match must reach this score, and no other HS code may score within the margin of it
+MIN_SCORE = 0.6
+AMBIGUITY_MARGIN = 0.05
+
+
+def normalize(text):
+    text = str(text).lower()
+    text = re.sub(r"#\S*", " ", text)
+    text = DIMENSION_PATTERN.sub(lambda match: f" {match.group(1)}{match.group(2)} ", text)
+    return " ".join(tokenize(text))
+
+
+def normalize_query(text):
+    return " ".join(QUERY_FILLER.sub(" ", normalize(text)).split())
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def dimensions(text):
+    return {f"{value}{unit}" for value, unit in DIMENSION_PATTERN.findall(str(text).lower())}
+
+
+class Match:
+    __slots__ = ("row", "hs_code", "score", "method", "confident")
+
+    def __init__(self, row, hs_code, score, method, confident):
+        self.row = row
+        self.hs_code = hs_code
+        self.score = score
+        self.method = method
+        self.confident = confident
+
+
+class ProductMatcher:
+    def __init__(self, data):
+        self.data = positional(data)
+        names = self.data.get("Product Name", []).fillna("").astype(str) if len(self.data) else []
+        self.names = [normalize(name) for name in names]
+
+        # Exact lookup on the normalized product name
+        self.exact = {}
+        for position, name in enumerate(self.names):
+            self.exact.setdefault(name, []).append(position)
+
+        # Trigram postings for fuzzy matching
+        self.trigram_rows = {}
+        for position, name in enumerate(self.names):
+            for gram in trigrams(name):
+                self.trigram_rows.setdefault(gram, []).append(position)
+        self.trigram_rows = {gram: np.array(rows, dtype=np.int32) for gram, rows in self.trigram_rows.items()}
+        self.trigram_counts = np.array([len(trigrams(name)) for name in self.names], dtype=np.float32)
+
+        # Material and dimension tokens per row, used as hard filters
+        materials = self.data["Material"].fillna("").astype(str) if "Material" in self.data else [""] * len(self.names)
+        self.row_materials = [set(tokenize(material)) for material in materials]
+        self.material_vocabulary = set().union(*self.row_materials) if self.row_materials else set()
+        specifications = self.data["Specifications"].fillna("").astype(str) if "Specifications" in self.data else [""] * len(self.names)
+        self.row_dimensions = [dimensions(f"{name} {spec}") for name, spec in zip(names, specifications)]
+
+    def _hs_code(self, position):
+        return str(self.data.at[position, "HS Code"])
+
+    def _passes_filters(self, position, query_materials, query_dimensions):
+        return query_materials <= self.row_materials[position] and query_dimensions <= self.row_dimensions[position]
+
+    def _resolve(self, positions, scores, method):
+        best = positions[0]
+        best_code = self._hs_code(best)
+        contenders = {self._hs_code(position) for position in positions if scores[position] >= scores[best] - AMBIGUITY_MARGIN}
+        confident = bool(scores[best] >= MIN_SCORE) and contenders == {best_code}
+        return Match(self.data.iloc[best], best_code, float(scores[best]), method, confident)
+
+    # Best local match for a query, or None when nothing in the sheet resembles it
+    def match(self, query):
+        if not self.names:
+            return None
+        normalized = normalize_query(query)
+        if not normalized:
+            return None
+
+        query_tokens = set(normalized.split())
+        query_materials = query_tokens & self.material_vocabulary
+        query_dimensions = dimensions(normalized)
+
+        exact = self.exact.get(normalized)
+        if exact:
+            scores = np.ones(len(self.names), dtype=np.float32)
+            return self._resolve(exact, scores, "exact")
+
+        query_grams = trigrams(normalized)
+        postings = [self.trigram_rows[gram] for gram in query_grams if gram in self.trigram_rows]
+        if not postings:
+            return None
+
+        shared = np.bincount(np.concatenate(postings), minlength=len(self.names)).astype(np.float32)
+        positions = np.flatnonzero(shared)
+        shared = shared[positions]
+        # Average of query containment and Dice similarity, so short queries can still match long names
+        containment = shared / len(query_grams)
+        dice = 2 * shared / (len(query_grams) + self.trigram_counts[positions])
+        scores = np.zeros(len(self.names), dtype=np.float32)
+        scores[positions] = (containment + dice) / 2
+
+        candidates = [int(position) for position in positions[np.argsort(-scores[positions], kind="stable")]
+                      if self._passes_filters(int(position), query_materials, query_dimensions)]
+        if not candidates:
+            return None
+        return self._resolve(candidates, scores, "fuzzy")
+
+
+def format_match(match):
+    row = match.row
+    return (f"HS Code: {match.hs_code} - {row.get('Product Name', '')} "
+            f"(Material: {row.get('Material', '')}; Specifications: {row.get('Specifications', '')}) "
+            f"[answered from the product sheet, {match.method} match]")
+
+
+# Process-wide counters of how many queries the local matcher answered without the API
+class MatchStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.hit_seconds = 0.0
+        self.miss_seconds = 0.0
+
+    def record(self, hit, seconds):
+        with self._lock:
+            if hit:
+                self.hits += 1
+                self.hit_seconds += seconds
+            else:
+                self.misses += 1
+                self.miss_seconds += seconds
+
+    def report(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "queries": total,
+                "local_hits": self.hits,
+                "hit_rate": self.hits / total if total else 0.0,
+                "avg_hit_ms": self.hit_seconds / self.hits * 1000 if self.hits else 0.0,
+                "avg_miss_ms": self.miss_seconds / self.misses * 1000 if self.misses else 0.0,
+            }
+
+
+def timed_match(matcher, query):
+    start = time.perf_counter()
+    match = matcher.match(query)
+    return match, time.perf_counter() - start
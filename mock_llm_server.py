@@ -0,0 +1,170 @@
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Local stand-in for the OpenAI/Groq chat completions endpoint, for offline load tests.
+# The reply is either a fixed string or a function of the decoded request body.
+
+# Simulated provider-side prompt caching, like OpenAI's: prefixes of at least ~1024 tokens, in ~128-token steps
+PREFIX_CACHE_MIN_CHARS = 4096
+PREFIX_CACHE_STEP_CHARS = 512
+
+
+class MockLLMConfig:
+    def __init__(self, latency_ms=300.0, jitter_ms=50.0, error_rate=0.0, rate_limit_rate=0.0, reply="HS Code: 7326.90.99", seed=None,
+                 token_delay_ms=20.0, spike_rate=0.0, spike_ms=0.0, prefix_cache=False, prefill_ms_per_1k_tokens=0.0):
+        self.latency_ms = latency_ms
+        self.token_delay_ms = token_delay_ms
+        self.jitter_ms = jitter_ms
+        # Share of requests that take spike_ms longer, for tail-latency tests
+        self.spike_rate = spike_rate
+        self.spike_ms = spike_ms
+        self.prefix_cache = prefix_cache
+        self.prefixes = set()
+        # Extra latency per 1000 uncached prompt tokens, so larger payloads answer later
+        self.prefill_ms_per_1k_tokens = prefill_ms_per_1k_tokens
+        self.bytes_received = 0
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.reply = reply
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.lock = threading.Lock()
+
+
+# Length in tokens of the longest previously seen prefix of the serialized messages
+def cached_prefix_tokens(config, text):
+    if not config.prefix_cache:
+        return 0
+    encoded = text.encode("utf-8")
+    digest = hashlib.sha1()
+    cached = 0
+    position = 0
+    with config.lock:
+        for end in range(PREFIX_CACHE_MIN_CHARS, len(encoded) + 1, PREFIX_CACHE_STEP_CHARS):
+            digest.update(encoded[position:end])
+            position = end
+            key = digest.copy().digest()
+            if key in config.prefixes:
+                cached = end
+            else:
+                config.prefixes.add(key)
+    return cached // 4
+
+
+def completion(model, content, prompt_tokens, completion_tokens, cached_tokens=0):
+    return {
+        "id": "chatcmpl-mock",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens,
+                  "prompt_tokens_details": {"cached_tokens": cached_tokens}},
+    }
+
+
+def make_handler(config):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, body, headers=None):
+            encoded = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(encoded)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(encoded)
+
+        # Server-sent events, one word per chunk, followed by a usage chunk and [DONE]
+        def _send_stream(self, model, content, prompt_tokens, cached_tokens):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            words = content.split(" ")
+            for i, word in enumerate(words):
+                delta = {"content": word if i == 0 else f" {word}"}
+                event = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "model": model,
+                         "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+                self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                time.sleep(config.token_delay_ms / 1000)
+            usage = completion(model, content, prompt_tokens, len(content) // 4, cached_tokens)["usage"]
+            final = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "model": model, "choices": [], "usage": usage}
+            self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            messages = json.dumps(request.get("messages", []))
+            prompt_tokens = len(messages) // 4
+            cached_tokens = cached_prefix_tokens(config, messages)
+            with config.lock:
+                config.requests += 1
+                config.bytes_received += length
+                roll = config.random.random()
+                delay = max(0.0, config.latency_ms + config.random.uniform(-config.jitter_ms, config.jitter_ms)) / 1000
+                if config.spike_rate and config.random.random() < config.spike_rate:
+                    delay += config.spike_ms / 1000
+            delay += (prompt_tokens - cached_tokens) / 1000 * config.prefill_ms_per_1k_tokens / 1000
+            time.sleep(delay)
+
+            if roll < config.rate_limit_rate:
+                self._send_json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit"}}, {"Retry-After": "0.1"})
+                return
+            if roll < config.rate_limit_rate + config.error_rate:
+                self._send_json(503, {"error": {"message": "Service unavailable", "type": "server_error"}})
+                return
+
+            reply = config.reply(request) if callable(config.reply) else config.reply
+            if request.get("stream"):
+                self._send_stream(request.get("model", "mock"), reply, prompt_tokens, cached_tokens)
+                return
+            self._send_json(200, completion(request.get("model", "mock"), reply, prompt_tokens, len(reply) // 4, cached_tokens))
+
+    return Handler
+
+
+# Start the mock in a background thread; returns the server and its OpenAI-style base URL
+def start_mock_server(config=None, host="127.0.0.1", port=0):
+    config = config or MockLLMConfig()
+    server = ThreadingHTTPServer((host, port), make_handler(config))
+    server.daemon_threads = True
+    server.config = config
+    threading.Thread(target=server.serve_forever, name="mock-llm", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=300.0)
+    parser.add_argument("--jitter-ms", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--spike-rate", type=float, default=0.0)
+    parser.add_argument("--spike-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    config = MockLLMConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit_rate,
+                           spike_rate=args.spike_rate, spike_ms=args.spike_ms)
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(config))
+    print(f"Mock LLM listening on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
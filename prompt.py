@@ -0,0 +1,98 @@
+import ast
+import hashlib
+import threading
+from collections import OrderedDict
+
+from retrieval import catalog_version
+from tracing import tracer
+
+try:
+    import tiktoken
+except ImportError:  # token counts fall back to a characters-per-token estimate
+    tiktoken = None
+
+# Row templates used in the product list: (separator before each field, field labels)
+ROW_TEMPLATES = {
+    # app.py: one line per product
+    "english": ("", "* Definition: ", "* Material: ", "* HS Code: ", "* Specifications: ", "\n"),
+    # 13july.py / 14july.py / 19julybackup.py: one field per line
+    "indonesian": ("\n", "\n* Definisi: ", "\n* Bahan: ", "\n* HS Code: ", "\n* Specifications: ", "\n"),
+}
+ROW_COLUMNS = ["Product Name", "Definition", "Material", "HS Code", "Specifications"]
+
+# Compiled prompts kept per process, keyed on catalog version, header and template
+MAX_COMPILED_PROMPTS = 8
+
+
+def count_tokens(text, encoding_name="o200k_base"):
+    if tiktoken is None:
+        return len(text) // 4
+    return len(_encoding(encoding_name).encode(text, disallowed_special=()))
+
+
+_encodings = {}
+
+
+def _encoding(name):
+    if name not in _encodings:
+        _encodings[name] = tiktoken.get_encoding(name)
+    return _encodings[name]
+
+
+# Product list for the given rows, rendered column-wise instead of row by row.
+# With with_ids each product starts with its catalog row id in brackets, for answers that refer to rows.
+def render_catalog(rows, template="english", with_ids=False):
+    if rows.empty:
+        return ""
+    prefix, *labels, suffix = ROW_TEMPLATES[template]
+    columns = [rows[column].astype(object).map(str) for column in ROW_COLUMNS]
+    if with_ids:
+        prefix = prefix + "[" + rows.index.map(str).to_series(index=rows.index) + "] "
+    rendered = prefix + columns[0]
+    for label, column in zip(labels, columns[1:]):
+        rendered = rendered + label + column
+    return "".join((rendered + suffix).tolist())
+
+
+class CompiledPrompt:
+    __slots__ = ("text", "catalog_version", "token_count")
+
+    def __init__(self, text, catalog_version, token_count):
+        self.text = text
+        self.catalog_version = catalog_version
+        self.token_count = token_count
+
+
+_compiled = OrderedDict()
+_compiled_lock = threading.Lock()
+
+
+# Header followed by the whole catalog, built once per catalog version and shared by every session
+def compile_system_prompt(header, data, template="english", version=None, with_ids=False):
+    version = version or catalog_version(data)
+    key = (version, hashlib.sha1(header.encode("utf-8")).hexdigest(), template, with_ids)
+    with _compiled_lock:
+        if key in _compiled:
+            _compiled.move_to_end(key)
+            return _compiled[key]
+
+    with tracer.span("prompt.compile", rows=len(data)) as span:
+        text = header + render_catalog(data, template, with_ids)
+        compiled = CompiledPrompt(text, version, count_tokens(text))
+        span.set(tokens=compiled.token_count)
+    with _compiled_lock:
+        _compiled[key] = compiled
+        while len(_compiled) > MAX_COMPILED_PROMPTS:
+            _compiled.popitem(last=False)
+    return compiled
+
+
+# The system message text a script builds before appending the product list
+def script_header(path, name):
+    with open(path) as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and isinstance(node.value, ast.Constant) and \
+                any(isinstance(target, ast.Name) and target.id == name for target in node.targets):
+            return node.value.value
+    raise ValueError(f"{name} not found in {path}")
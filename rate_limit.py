@@ -0,0 +1,96 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+
+
+# Token bucket: `rate` tokens per second, bursts up to `capacity`.
+# acquire() waits for a token instead of failing, so callers queue rather than get rejected.
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    # Take `tokens` now if available; otherwise return how long to wait before trying again
+    def _reserve(self, tokens):
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+            return (tokens - self._tokens) / self.rate
+
+    def try_acquire(self, tokens=1.0):
+        return self._reserve(tokens) == 0.0
+
+    def acquire(self, tokens=1.0):
+        while True:
+            wait = self._reserve(tokens)
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens=1.0):
+        while True:
+            wait = self._reserve(tokens)
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+
+# One token bucket per caller (a Streamlit session, an API key), created on first use. Callers over their rate
+# wait for a token instead of being rejected; the least recently seen buckets are dropped beyond max_keys.
+class KeyedLimiter:
+    def __init__(self, rate, capacity=None, max_keys=10000):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.queued = 0
+        self.wait_seconds = 0.0
+
+    def bucket(self, key):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate, self.capacity)
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            self._buckets.move_to_end(key)
+            return bucket
+
+    def _record(self, waited):
+        with self._lock:
+            self.acquired += 1
+            if waited > 0.001:
+                self.queued += 1
+                self.wait_seconds += waited
+
+    # Seconds spent waiting for the token
+    def acquire(self, key, tokens=1.0):
+        start = time.monotonic()
+        self.bucket(key).acquire(tokens)
+        waited = time.monotonic() - start
+        self._record(waited)
+        return waited
+
+    async def acquire_async(self, key, tokens=1.0):
+        start = time.monotonic()
+        await self.bucket(key).acquire_async(tokens)
+        waited = time.monotonic() - start
+        self._record(waited)
+        return waited
+
+    def report(self):
+        with self._lock:
+            return {"callers": len(self._buckets), "acquired": self.acquired, "queued": self.queued,
+                    "avg_wait_ms": self.wait_seconds / self.queued * 1000 if self.queued else 0.0}
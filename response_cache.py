@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from matcher import normalize
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+# Cache key: normalized question, hash of each image's bytes, model name and hash of the system prompt
+def cache_key(text, image_hashes, model, system_prompt):
+    parts = [normalize(text or ""), ",".join(image_hashes), model, content_hash(system_prompt.encode("utf-8"))]
+    return content_hash("\x1f".join(parts).encode("utf-8"))
+
+
+# Two-tier response cache: in-memory LRU in front of a SQLite file.
+# Entries carry the catalog version so a sheet change drops every stale answer.
+class ResponseCache:
+    def __init__(self, path, catalog_version, ttl_seconds=24 * 3600, memory_entries=512, disk_entries=50000):
+        self.ttl_seconds = ttl_seconds
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.catalog_version = catalog_version
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, catalog_version TEXT, created REAL, accessed REAL, value TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+        self._db.commit()
+        self.set_catalog_version(catalog_version)
+
+    # Drop everything cached against an older version of the sheet
+    def set_catalog_version(self, catalog_version):
+        with self._lock:
+            self.catalog_version = catalog_version
+            self._memory.clear()
+            self._db.execute("DELETE FROM responses WHERE catalog_version != ?", (catalog_version,))
+            self._db.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created, value = entry
+                if now - created < self.ttl_seconds:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._memory[key]
+
+            row = self._db.execute(
+                "SELECT created, value FROM responses WHERE key = ? AND catalog_version = ?",
+                (key, self.catalog_version),
+            ).fetchone()
+            if row is not None and now - row[0] < self.ttl_seconds:
+                self._db.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+                self._db.commit()
+                value = json.loads(row[1])
+                self._remember(key, row[0], value)
+                self.disk_hits += 1
+                return value
+            if row is not None:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._db.commit()
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, catalog_version, created, accessed, value) VALUES (?, ?, ?, ?, ?)",
+                (key, self.catalog_version, now, now, json.dumps(value)),
+            )
+            self._evict_disk(now)
+            self._db.commit()
+
+    def _remember(self, key, created, value):
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict_disk(self, now):
+        self._db.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+        (count,) = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()
+        if count > self.disk_entries:
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed LIMIT ?)",
+                (count - self.disk_entries,),
+            )
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / total if total else 0.0,
+                "memory_entries": len(self._memory),
+            }
@@ -0,0 +1,138 @@
+import hashlib
+import math
+import re
+import zlib
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+
+from catalog_store import positional
+
+# Columns that are searched when picking candidate rows for a query
+SEARCH_COLUMNS = ["Product Name", "Definition", "Material", "Specifications"]
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+# Stable content hash of the sheet, used to rebuild the index only when the sheet changes
+def catalog_version(data, row_hashes=None):
+    if data.empty:
+        return "empty"
+    if row_hashes is None:
+        row_hashes = pd.util.hash_pandas_object(data, index=False).values
+    digest = hashlib.sha1()
+    digest.update("|".join(map(str, data.columns)).encode("utf-8"))
+    digest.update(row_hashes.tobytes())
+    return digest.hexdigest()[:16]
+
+
+def _row_documents(data):
+    columns = [column for column in SEARCH_COLUMNS if column in data.columns]
+    if not columns:
+        return pd.Series([""] * len(data))
+    return data[columns].fillna("").astype(str).agg(" ".join, axis=1)
+
+
+# Hashing-trick embedding: words and character trigrams folded into a fixed number of buckets.
+# crc32 is used instead of hash() so vectors are identical across processes.
+def _hashed_features(tokens):
+    features = list(tokens)
+    for token in tokens:
+        padded = f"#{token}#"
+        features.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return features
+
+
+def _embed(tokens, dim):
+    vector = np.zeros(dim, dtype=np.float32)
+    for feature in _hashed_features(tokens):
+        bucket = zlib.crc32(feature.encode("utf-8"))
+        vector[bucket % dim] += 1.0 if bucket & 0x80000000 else -1.0
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector
+
+
+class CatalogIndex:
+    def __init__(self, data, use_embeddings=True, dim=512, k1=1.5, b=0.75, embedding_weight=0.3):
+        self.data = positional(data)
+        self.version = catalog_version(data)
+        self.k1 = k1
+        self.b = b
+        self.dim = dim
+        self.embedding_weight = embedding_weight if use_embeddings else 0.0
+
+        documents = [tokenize(text) for text in _row_documents(self.data)]
+        self.doc_lengths = np.array([len(tokens) for tokens in documents], dtype=np.float32)
+        self.avg_length = float(self.doc_lengths.mean()) if len(documents) else 0.0
+
+        # Inverted index: term -> (row positions, term frequencies)
+        postings = defaultdict(lambda: ([], []))
+        for position, tokens in enumerate(documents):
+            for term, frequency in Counter(tokens).items():
+                rows, frequencies = postings[term]
+                rows.append(position)
+                frequencies.append(frequency)
+
+        total = len(documents)
+        self.postings = {}
+        for term, (rows, frequencies) in postings.items():
+            idf = math.log(1 + (total - len(rows) + 0.5) / (len(rows) + 0.5))
+            self.postings[term] = (np.array(rows, dtype=np.int32), np.array(frequencies, dtype=np.float32), idf)
+
+        self.embeddings = None
+        if use_embeddings and total:
+            self.embeddings = np.vstack([_embed(tokens, dim) for tokens in documents])
+
+    def __len__(self):
+        return len(self.data)
+
+    def bm25_scores(self, query):
+        scores = np.zeros(len(self.data), dtype=np.float32)
+        if not len(self.data):
+            return scores
+        norms = self.k1 * (1 - self.b + self.b * self.doc_lengths / (self.avg_length or 1.0))
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            rows, frequencies, idf = self.postings[term]
+            scores[rows] += idf * frequencies * (self.k1 + 1) / (frequencies + norms[rows])
+        return scores
+
+    def scores(self, query):
+        scores = self.bm25_scores(query)
+        if scores.max(initial=0.0) > 0:
+            scores = scores / scores.max()
+        if self.embeddings is not None and self.embedding_weight:
+            similarity = self.embeddings @ _embed(tokenize(query), self.dim)
+            scores = (1 - self.embedding_weight) * scores + self.embedding_weight * np.clip(similarity, 0, None)
+        return scores
+
+    # Row positions of the k best matching products and their scores, best first; rows restricts the
+    # search to a subset of positions (one HS chapter, say)
+    def ranked(self, query, k=20, rows=None):
+        if not len(self.data) or not tokenize(query):
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32)
+        scores = self.scores(query)
+        positions = np.arange(len(scores)) if rows is None else np.asarray(rows, dtype=np.int64)
+        subset = scores[positions]
+        k = min(k, len(subset))
+        if not k:
+            return positions[:0], subset[:0]
+        top = np.argpartition(-subset, k - 1)[:k]
+        top = top[np.argsort(-subset[top], kind="stable")]
+        top = top[subset[top] > 0]
+        return positions[top], subset[top]
+
+    # Row positions of the k best matching products, best first
+    def search(self, query, k=20, rows=None):
+        return [int(position) for position in self.ranked(query, k, rows)[0]]
+
+    def top_rows(self, query, k=20, rows=None):
+        return self.data.iloc[self.search(query, k, rows)]
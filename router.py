@@ -0,0 +1,278 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from llm_client import LatencyStats, LLMError
+
+# Calls a provider needs before its p95 is trusted for hedging
+MIN_HEDGE_SAMPLES = 5
+# Never hedge earlier than this, even behind a very fast provider
+MIN_HEDGE_SECONDS = 0.5
+
+
+def has_images(payload):
+    return any(isinstance(message.get("content"), list) and
+               any(part.get("type") == "image_url" for part in message["content"] if isinstance(part, dict))
+               for message in payload.get("messages", []))
+
+
+# One backend (an LLMClient and the model to ask for) with its rolling latency and error rate
+class Provider:
+    def __init__(self, name, client, model=None, vision=False, json_schema=True, window=100, max_failures=3,
+                 max_error_rate=0.5, cooldown_seconds=30.0):
+        self.name = name
+        self.client = client
+        self.model = model
+        self.vision = vision
+        self.json_schema = json_schema
+        self.max_failures = max_failures
+        self.max_error_rate = max_error_rate
+        self.cooldown_seconds = cooldown_seconds
+        self.latency = LatencyStats(window)
+        self.outcomes = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        self._lock = threading.Lock()
+
+    def supports(self, payload):
+        return self.vision or not has_images(payload)
+
+    # The request as this provider expects it: its own model, and json_object where strict schemas are unsupported
+    def payload(self, payload):
+        payload = dict(payload)
+        if self.model:
+            payload["model"] = self.model
+        if not self.json_schema and (payload.get("response_format") or {}).get("type") == "json_schema":
+            payload["response_format"] = {"type": "json_object"}
+        return payload
+
+    def record(self, seconds, ok):
+        with self._lock:
+            self.outcomes.append(ok)
+            if ok:
+                self.consecutive_failures = 0
+                self.latency.record(seconds)
+                return
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.max_failures or (len(self.outcomes) >= 10 and self.error_rate > self.max_error_rate):
+                self.unhealthy_until = time.monotonic() + self.cooldown_seconds
+
+    @property
+    def healthy(self):
+        return time.monotonic() >= self.unhealthy_until
+
+    @property
+    def error_rate(self):
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    # Unmeasured providers sort first so that every backend gets a latency estimate
+    def p50_seconds(self):
+        return self.latency.report()["total_p50_ms"] / 1000
+
+    def hedge_seconds(self):
+        report = self.latency.report()
+        if report["calls"] < MIN_HEDGE_SAMPLES:
+            return None
+        return max(MIN_HEDGE_SECONDS, report["total_p95_ms"] / 1000)
+
+    def report(self):
+        latency = self.latency.report()
+        return {
+            "provider": self.name,
+            "model": self.model,
+            "calls": len(self.outcomes),
+            "error_rate": self.error_rate,
+            "p50_ms": latency["total_p50_ms"],
+            "p95_ms": latency["total_p95_ms"],
+            "healthy": self.healthy,
+        }
+
+
+# Streamed completion that fails over to the next provider when one errors before the first token
+class RouterStream:
+    def __init__(self, router, providers, payload, timeout):
+        self._router = router
+        self._providers = providers
+        self._payload = payload
+        self._timeout = timeout
+        self._stream = None
+        self._error = None
+        self.provider = None
+
+    def __iter__(self):
+        start = time.perf_counter()
+        for provider in self._providers:
+            self.provider = provider
+            self._stream = provider.client.stream_chat(provider.payload(self._payload), self._timeout)
+            self._error = None
+            provider_start = time.perf_counter()
+            started = False
+            try:
+                for chunk in self._stream:
+                    started = True
+                    yield chunk
+            except LLMError as e:
+                provider.record(time.perf_counter() - provider_start, False)
+                if started:
+                    raise
+                self._error = {"message": str(e)}
+                self._router.failovers += 1
+                continue
+            ok = self._stream.error is None
+            provider.record(time.perf_counter() - provider_start, ok)
+            if ok or started:
+                self._router.latency.record(time.perf_counter() - start, self._stream.first_token_seconds)
+                return
+            self._router.failovers += 1
+
+    def __getattr__(self, name):
+        if name in ("text", "usage", "error", "first_token_seconds", "total_seconds"):
+            return getattr(self._stream, name) if self._stream is not None else None
+        raise AttributeError(name)
+
+    def as_response(self):
+        if self._error is not None:
+            return {"error": self._error}
+        if self._stream is None:
+            return {"error": {"message": "No LLM provider available"}}
+        return self._stream.as_response()
+
+
+# Drop-in replacement for LLMClient that spreads requests over several providers: text-only requests go to
+# the fastest healthy provider, requests with images only to vision-capable ones. When the chosen provider
+# takes longer than its own p95 the request is hedged on the next one and the first good answer wins;
+# errors fail over immediately. Hedged requests cost a second upstream call, so hedge=False turns them off.
+class ProviderRouter:
+    def __init__(self, providers, hedge=True, max_workers=16):
+        self.providers = list(providers)
+        self.hedge = hedge
+        self.hedges = 0
+        self.failovers = 0
+        self.latency = LatencyStats()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-router")
+
+    @property
+    def retries(self):
+        return sum(client.retries for client in self._clients())
+
+    def _clients(self):
+        return list({id(provider.client): provider.client for provider in self.providers}.values())
+
+    # Healthy providers fastest first, then unhealthy ones as a last resort
+    def candidates(self, payload):
+        providers = [provider for provider in self.providers if provider.supports(payload)]
+        if not providers:
+            raise LLMError("No LLM provider can handle this request")
+        healthy = sorted((p for p in providers if p.healthy), key=lambda p: p.p50_seconds())
+        return healthy + sorted((p for p in providers if not p.healthy), key=lambda p: p.unhealthy_until)
+
+    def _hedge_delay(self, provider, remaining):
+        return provider.hedge_seconds() if self.hedge and remaining else None
+
+    def _call(self, provider, payload, timeout):
+        start = time.perf_counter()
+        try:
+            response = provider.client.chat(provider.payload(payload), timeout=timeout)
+        except LLMError as e:
+            provider.record(time.perf_counter() - start, False)
+            return None, e
+        provider.record(time.perf_counter() - start, "error" not in response)
+        return response, None
+
+    def _result(self, response, error):
+        if response is not None:
+            return response
+        raise error
+
+    def chat(self, payload, timeout=None, path="chat/completions"):
+        start = time.perf_counter()
+        queue = self.candidates(payload)
+        pending = {}
+        last = (None, LLMError("No LLM provider available"))
+
+        def launch():
+            provider = queue.pop(0)
+            pending[self._executor.submit(self._call, provider, payload, timeout)] = provider
+            return provider
+
+        current = launch()
+        while pending:
+            done, _ = wait(pending, timeout=self._hedge_delay(current, queue), return_when=FIRST_COMPLETED)
+            if not done:
+                self.hedges += 1
+                current = launch()
+                continue
+            for future in done:
+                pending.pop(future)
+                response, error = future.result()
+                if response is not None and "error" not in response:
+                    self.latency.record(time.perf_counter() - start)
+                    return response
+                last = (response, error)
+            if not pending and queue:
+                self.failovers += 1
+                current = launch()
+        return self._result(*last)
+
+    def stream_chat(self, payload, timeout=None, path="chat/completions"):
+        return RouterStream(self, self.candidates(payload), payload, timeout)
+
+    async def _acall(self, provider, payload, timeout):
+        start = time.perf_counter()
+        try:
+            response = await provider.client.achat(provider.payload(payload), timeout=timeout)
+        except LLMError as e:
+            provider.record(time.perf_counter() - start, False)
+            return None, e
+        provider.record(time.perf_counter() - start, "error" not in response)
+        return response, None
+
+    async def achat(self, payload, timeout=None, path="chat/completions"):
+        start = time.perf_counter()
+        queue = self.candidates(payload)
+        pending = set()
+        last = (None, LLMError("No LLM provider available"))
+
+        def launch():
+            provider = queue.pop(0)
+            pending.add(asyncio.ensure_future(self._acall(provider, payload, timeout)))
+            return provider
+
+        current = launch()
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, timeout=self._hedge_delay(current, queue), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.hedges += 1
+                    current = launch()
+                    continue
+                for task in done:
+                    pending.discard(task)
+                    response, error = task.result()
+                    if response is not None and "error" not in response:
+                        self.latency.record(time.perf_counter() - start)
+                        return response
+                    last = (response, error)
+                if not pending and queue:
+                    self.failovers += 1
+                    current = launch()
+        finally:
+            # The losing side of a hedge is not needed any more
+            for task in pending:
+                task.cancel()
+        return self._result(*last)
+
+    def report(self):
+        return {"providers": [provider.report() for provider in self.providers], "hedges": self.hedges,
+                "failovers": self.failovers}
+
+    async def aclose(self):
+        for client in self._clients():
+            await client.aclose()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        for client in self._clients():
+            client.close()
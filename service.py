@@ -0,0 +1,126 @@
+import threading
+import time
+
+from tracing import tracer
+
+# One warm lookup engine per process, shared by every session or request. start() returns at once: the catalog
+# (Parquet snapshot, or the sheet on a first run), the retrieval index, the matcher and the compiled prompt are
+# built on a background thread, together with the pandas/numpy imports they pull in, so the UI or the server is
+# up before the catalog is. Callers that need the engine wait for it; the rest can show a "catalog warming" state.
+
+
+class LookupService:
+    # make_sync returns a started CatalogSync; the other arguments are passed on to LookupEngine
+    def __init__(self, make_sync, llm_client, response_cache_path, model, timeout=60, image_index_path=None, rate_limiter=None):
+        self.make_sync = make_sync
+        self.llm_client = llm_client
+        self.response_cache_path = response_cache_path
+        self.model = model
+        self.timeout = timeout
+        self.image_index_path = image_index_path
+        self.rate_limiter = rate_limiter
+        self.sync = None
+        self.response_cache = None
+        self.image_index = None
+        self.match_stats = None
+        self.engine = None
+        self.error = None
+        # Why the last rebuild for a new catalog version failed; the previous engine keeps serving meanwhile
+        self.rebuild_error = None
+        self._failed_version = None
+        self.warm_seconds = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._rebuild = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._warm, name="catalog-warmup", daemon=True)
+            self._thread.start()
+        return self
+
+    def _warm(self):
+        start = time.perf_counter()
+        try:
+            with tracer.trace("warmup"):
+                from matcher import MatchStats
+                from response_cache import ResponseCache
+
+                self.match_stats = MatchStats()
+                self.sync = self.make_sync()
+                self.response_cache = ResponseCache(self.response_cache_path, self.sync.version)
+                if self.image_index_path:
+                    from image_index import ImageIndex
+
+                    self.image_index = ImageIndex(self.image_index_path)
+                data, version = self.sync.current()
+                self._install(self._build(data, version))
+        except Exception as e:
+            self.error = e
+        finally:
+            self.warm_seconds = time.perf_counter() - start
+            self._ready.set()
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    # True once warm (False on timeout); re-raises whatever stopped the catalog from loading
+    def wait(self, timeout=None):
+        if not self._ready.wait(timeout):
+            return False
+        if self.error is not None:
+            raise self.error
+        return True
+
+    def _build(self, data, version):
+        from engine import LookupEngine
+
+        return LookupEngine(data, self.llm_client, self.response_cache, self.match_stats,
+                            model=self.model, timeout=self.timeout, version=version,
+                            image_index=self.image_index, rate_limiter=self.rate_limiter)
+
+    # The response cache follows the engine that serves: switching it to the new version while the old engine
+    # still answers would miss every entry and file the old prompt's answers under the new version
+    def _install(self, engine):
+        self.engine = engine
+        if self.response_cache.catalog_version != engine.version:
+            self.response_cache.set_catalog_version(engine.version)
+
+    # A new catalog version gets its engine (index, matcher, HS tree, compiled prompt: seconds on a large sheet)
+    # on a background thread, one rebuild at a time; callers keep the previous engine until it is ready
+    def _rebuild_in_background(self, data, version):
+        with self._lock:
+            # A version that failed to build is tried again only once the catalog changes again
+            if (self._rebuild is not None and self._rebuild.is_alive()) or version == self._failed_version:
+                return
+            self._rebuild = threading.Thread(target=self._rebuild_engine, args=(data, version),
+                                             name="engine-rebuild", daemon=True)
+            self._rebuild.start()
+
+    def _rebuild_engine(self, data, version):
+        try:
+            with tracer.trace("engine.rebuild", rows=len(data)):
+                engine = self._build(data, version)
+            self._install(engine)
+            self.rebuild_error = None
+        except Exception as e:
+            self.rebuild_error = e
+            self._failed_version = version
+
+    # Engine for the latest catalog version that has one; waits for the warm-up if it is still running
+    def current(self):
+        self.wait()
+        data, version = self.sync.current()
+        if self.engine.version != version:
+            self._rebuild_in_background(data, version)
+        return self.engine
+
+    def stop(self):
+        if self._thread is not None:
+            self._thread.join()
+        if self._rebuild is not None:
+            self._rebuild.join()
+        if self.sync is not None:
+            self.sync.stop()
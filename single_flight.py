@@ -0,0 +1,90 @@
+import asyncio
+import threading
+
+# In-flight request coalescing: while one caller is fetching the answer for a key, callers asking for the same
+# key wait for that result instead of making their own upstream call. Nothing is kept once the call returns;
+# the response cache takes over from there.
+
+
+class _Call:
+    __slots__ = ("done", "result", "failed")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.failed = False
+
+
+class SingleFlight:
+    # With enabled=False every caller makes its own call (evaluation runs, where each item stands for a
+    # separate request)
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._tasks = {}
+        self.leaders = 0
+        self.followers = 0
+
+    # (result, shared): shared is True when the result came from another caller's call. A leader that raises
+    # (anything, including a Streamlit rerun stopping its session mid-stream) takes its exception with it; the
+    # callers waiting on it try again, one of them as the new leader.
+    def do(self, key, function):
+        if not self.enabled:
+            with self._lock:
+                self.leaders += 1
+            return function(), False
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.followers += 1
+        if not leader:
+            call.done.wait()
+            if call.failed:
+                with self._lock:
+                    self.followers -= 1
+                return self.do(key, function)
+            return call.result, True
+        try:
+            call.result = function()
+        except BaseException:
+            call.failed = True
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    # Same for coroutines: followers await the leader's task (shielded, so a cancelled follower does not
+    # cancel the call the others are waiting for)
+    async def ado(self, key, coroutine_function):
+        if not self.enabled:
+            with self._lock:
+                self.leaders += 1
+            return await coroutine_function(), False
+        key = (id(asyncio.get_running_loop()), key)
+        with self._lock:
+            task = self._tasks.get(key)
+            leader = task is None
+            if leader:
+                task = self._tasks[key] = asyncio.ensure_future(coroutine_function())
+                task.add_done_callback(lambda _: self._forget(key))
+                self.leaders += 1
+            else:
+                self.followers += 1
+        return await asyncio.shield(task), not leader
+
+    def _forget(self, key):
+        with self._lock:
+            self._tasks.pop(key, None)
+
+    def report(self):
+        with self._lock:
+            calls = self.leaders + self.followers
+            return {"upstream_calls": self.leaders, "coalesced": self.followers,
+                    "coalesced_share": self.followers / calls if calls else 0.0}
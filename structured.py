@@ -0,0 +1,111 @@
+import json
+import re
+
+# Compact answer format requested from the model instead of free text
+MAX_CANDIDATES = 5
+RESPONSE_SCHEMA = {
+    "name": "hs_code_candidates",
+    "strict": True,
+    "schema": {
+        "type": "object",
+        "properties": {
+            "candidates": {
+                "type": "array",
+                "items": {
+                    "type": "object",
+                    "properties": {
+                        "row": {"type": "integer"},
+                        "hs_code": {"type": "string"},
+                        "confidence": {"type": "number"},
+                    },
+                    "required": ["row", "hs_code", "confidence"],
+                    "additionalProperties": False,
+                },
+            },
+            "note": {"type": "string"},
+        },
+        "required": ["candidates", "note"],
+        "additionalProperties": False,
+    },
+}
+RESPONSE_FORMAT = {"type": "json_schema", "json_schema": RESPONSE_SCHEMA}
+
+STRUCTURED_INSTRUCTIONS = f"""
+Reply only with JSON: {{"candidates": [{{"row": <number in [brackets] before the product>, "hs_code": "<HS Code>", "confidence": <0 to 1>}}], "note": "<one short sentence>"}}.
+List at most {MAX_CANDIDATES} candidates, most likely first. Use the note to ask for the missing material or dimension when candidates differ only in that.
+"""
+
+# Output budget: about 20 tokens per candidate plus the note and JSON overhead
+MAX_TOKENS = 20 * MAX_CANDIDATES + 60
+
+CANDIDATE_OBJECT = re.compile(r"\{[^{}]*\}")
+
+
+class Candidate:
+    __slots__ = ("row", "hs_code", "product_name", "confidence")
+
+    def __init__(self, row, hs_code, product_name, confidence):
+        self.row = row
+        self.hs_code = hs_code
+        self.product_name = product_name
+        self.confidence = confidence
+
+    def as_dict(self):
+        return {"row": self.row, "hs_code": self.hs_code, "product_name": self.product_name, "confidence": self.confidence}
+
+
+class StructuredAnswer:
+    __slots__ = ("candidates", "note")
+
+    def __init__(self, candidates, note=""):
+        self.candidates = candidates
+        self.note = note
+
+    def text(self):
+        lines = [f"HS Code {c.hs_code} - {c.product_name} ({c.confidence:.0%})" for c in self.candidates]
+        if self.note:
+            lines.append(self.note)
+        return "<br>".join(lines) if lines else "No matching product in the list."
+
+    # What goes back into chat history: codes and row ids only
+    def compact(self):
+        return json.dumps({"candidates": [{"row": c.row, "hs_code": c.hs_code} for c in self.candidates]}, separators=(",", ":"))
+
+
+# Validate raw candidates against the catalog: unknown rows are dropped, the HS code always comes from the sheet
+def _candidates(raw, data):
+    candidates = []
+    seen = set()
+    for entry in raw:
+        try:
+            row = int(entry["row"])
+            confidence = min(1.0, max(0.0, float(entry.get("confidence", 0))))
+        except (KeyError, TypeError, ValueError):
+            continue
+        if row in seen or row not in data.index:
+            continue
+        seen.add(row)
+        record = data.loc[row]
+        candidates.append(Candidate(row, str(record.get("HS Code")), str(record.get("Product Name")), confidence))
+    return candidates[:MAX_CANDIDATES]
+
+
+def parse_answer(content, data):
+    try:
+        parsed = json.loads(content)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(parsed, dict) or not isinstance(parsed.get("candidates"), list):
+        return None
+    return StructuredAnswer(_candidates(parsed["candidates"], data), str(parsed.get("note", ""))[:300])
+
+
+# Candidates that are complete so far in a partially streamed reply
+def parse_partial(content, data):
+    raw = []
+    for match in CANDIDATE_OBJECT.finditer(content):
+        try:
+            raw.append(json.loads(match.group(0)))
+        except ValueError:
+            continue
+    return StructuredAnswer(_candidates(raw, data))
@@ -0,0 +1,41 @@
+import random
+
+import pandas as pd
+
+# Synthetic product sheet with the same columns as the Google Sheet, used by the benchmarks
+PRODUCT_TYPES = [
+    ("Hose Clamp", "7326.90.99", "Band clamp used to fasten hoses onto fittings"),
+    ("Conveyor Belt", "4010.11.00", "Continuous belt used to carry goods along a production line"),
+    ("Machine Screw", "7318.15.90", "Threaded fastener for metal parts"),
+    ("Centrifugal Pump", "8413.70.91", "Pump that moves liquids by rotational energy"),
+    ("O-Ring", "4016.93.20", "Ring seal fitted into a groove"),
+    ("Ball Valve", "8481.80.63", "Valve controlling flow with a rotating ball"),
+    ("Flat Washer", "7318.22.00", "Thin plate used to distribute the load of a fastener"),
+    ("Pipe Elbow", "7307.93.10", "Fitting that changes the direction of a pipe run"),
+    ("Gear Motor", "8501.52.10", "Electric motor with an integrated gearbox"),
+    ("Bearing", "8482.10.00", "Ball bearing supporting a rotating shaft"),
+]
+MATERIALS = ["Stainless Steel 304", "Stainless Steel 316", "Carbon Steel", "Brass", "Aluminium", "NBR Rubber", "EPDM", "PVC", "Cast Iron", "Nylon"]
+
+
+def make_catalog(n_rows, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n_rows):
+        name, hs_code, definition = PRODUCT_TYPES[i % len(PRODUCT_TYPES)]
+        material = rng.choice(MATERIALS)
+        size = rng.choice([6, 8, 10, 12, 16, 20, 25, 32, 40, 50, 65, 80, 100])
+        rows.append({
+            "Product Name": f"{name} {size}mm {material} #{i}",
+            "Definition": definition,
+            "Material": material,
+            "HS Code": hs_code,
+            "Specifications": f"Size {size}mm, pressure {rng.choice([6, 10, 16, 25])} bar, model {rng.randint(1000, 9999)}",
+        })
+    return pd.DataFrame(rows, columns=["Product Name", "Definition", "Material", "HS Code", "Specifications"])
+
+
+def sample_queries(data, n_queries, seed=0):
+    rng = random.Random(seed)
+    names = data["Product Name"].tolist()
+    return [f"HS code for {rng.choice(names).split('#')[0].strip().lower()}" for _ in range(n_queries)]
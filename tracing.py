@@ -0,0 +1,170 @@
+import contextvars
+import itertools
+import json
+import threading
+import time
+from collections import deque
+
+# Lightweight spans around the hot path (sheet read, prompt build, image encode, LLM call, rendering),
+# kept in a ring buffer per process. Disabled by default: a disabled span is one attribute check and a
+# shared no-op context manager, so instrumented code costs next to nothing until the admin panel turns it on.
+
+SPAN_BUFFER_SIZE = 5000
+METRIC_PREFIX = "hscode"
+
+_current_trace = contextvars.ContextVar("trace_id", default=None)
+_trace_ids = itertools.count(1)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __bool__(self):
+        return False
+
+    def set(self, **attributes):
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Span:
+    __slots__ = ("tracer", "name", "trace_id", "started", "seconds", "attributes", "error", "_root", "_token", "_start")
+
+    def __init__(self, tracer, name, attributes, root=False):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = None
+        self.started = None
+        self.seconds = None
+        self.attributes = attributes
+        self.error = None
+        self._root = root
+        self._token = None
+
+    def __enter__(self):
+        if self._root and _current_trace.get() is None:
+            self._token = _current_trace.set(next(_trace_ids))
+        self.trace_id = _current_trace.get()
+        self.started = time.time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self._start
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        if self._token is not None:
+            _current_trace.reset(self._token)
+        self.tracer._record(self)
+        return False
+
+    def __bool__(self):
+        return True
+
+    # Numbers (token counts, payload bytes) and short labels attached to the span
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def as_dict(self):
+        return {"trace": self.trace_id, "span": self.name, "start": round(self.started, 6),
+                "ms": round(self.seconds * 1000, 3), "error": self.error, **self.attributes}
+
+
+def _percentile(ordered, share):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+
+class Tracer:
+    def __init__(self, capacity=SPAN_BUFFER_SIZE, enabled=False):
+        self.enabled = enabled
+        self.spans = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    # with tracer.span("llm.request", model=...) as span: ... span.set(prompt_tokens=...)
+    def span(self, name, **attributes):
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, attributes)
+
+    # Like span(), but starts a new trace that the spans inside it belong to (or joins the enclosing one)
+    def trace(self, name, **attributes):
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, attributes, root=True)
+
+    def _record(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def clear(self):
+        with self._lock:
+            self.spans.clear()
+
+    def _snapshot(self):
+        with self._lock:
+            return list(self.spans)
+
+    # Per stage: count, p50/p95/max in ms, errors, and the sum of every numeric attribute
+    def report(self):
+        stages = {}
+        for span in self._snapshot():
+            stages.setdefault(span.name, []).append(span)
+        report = {}
+        for name, spans in sorted(stages.items()):
+            ordered = sorted(span.seconds for span in spans)
+            totals = {}
+            for span in spans:
+                for key, value in span.attributes.items():
+                    if isinstance(value, (int, float)) and not isinstance(value, bool):
+                        totals[key] = totals.get(key, 0) + value
+            report[name] = {
+                "count": len(spans),
+                "p50_ms": _percentile(ordered, 0.5) * 1000,
+                "p95_ms": _percentile(ordered, 0.95) * 1000,
+                "max_ms": ordered[-1] * 1000,
+                "total_ms": sum(ordered) * 1000,
+                "errors": sum(span.error is not None for span in spans),
+                "totals": totals,
+            }
+        return report
+
+    # The last n traces, newest first, each as its list of spans in start order
+    def recent_traces(self, n=20):
+        traces = {}
+        for span in self._snapshot():
+            if span.trace_id is not None:
+                traces.setdefault(span.trace_id, []).append(span)
+        newest = sorted(traces, reverse=True)[:n]
+        return [sorted((span.as_dict() for span in traces[trace_id]), key=lambda span: span["start"]) for trace_id in newest]
+
+    def export_jsonl(self):
+        return "".join(json.dumps(span.as_dict()) + "\n" for span in self._snapshot())
+
+    # Prometheus text exposition: a summary per stage plus totals of the numeric attributes, all computed
+    # over the spans still in the ring buffer
+    def export_prometheus(self):
+        lines = [f"# TYPE {METRIC_PREFIX}_stage_seconds summary",
+                 f"# TYPE {METRIC_PREFIX}_stage_errors gauge",
+                 f"# TYPE {METRIC_PREFIX}_stage_attribute_sum gauge"]
+        for name, stage in self.report().items():
+            label = f'stage="{name}"'
+            lines.append(f'{METRIC_PREFIX}_stage_seconds{{{label},quantile="0.5"}} {stage["p50_ms"] / 1000:.6f}')
+            lines.append(f'{METRIC_PREFIX}_stage_seconds{{{label},quantile="0.95"}} {stage["p95_ms"] / 1000:.6f}')
+            lines.append(f'{METRIC_PREFIX}_stage_seconds_sum{{{label}}} {stage["total_ms"] / 1000:.6f}')
+            lines.append(f'{METRIC_PREFIX}_stage_seconds_count{{{label}}} {stage["count"]}')
+            lines.append(f'{METRIC_PREFIX}_stage_errors{{{label}}} {stage["errors"]}')
+            for key, value in sorted(stage["totals"].items()):
+                lines.append(f'{METRIC_PREFIX}_stage_attribute_sum{{{label},attribute="{key}"}} {value}')
+        return "\n".join(lines) + "\n"
+
+
+# Process-wide tracer shared by the app, the API and the batch runner
+tracer = Tracer()